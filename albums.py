@@ -0,0 +1,145 @@
+"""
+Склейка альбомов: несколько сообщений с общим grouped_id — одно сообщение.
+
+Альбом (несколько фото или файлов) приходит отдельными событиями NewMessage
+с общим grouped_id, а подпись обычно есть только у одной части. Части
+копятся в памяти, пока новые приходят чаще, чем раз в ALBUM_WINDOW секунд
+(но не больше ALBUM_MAX_PARTS — больше частей в альбоме не бывает), затем
+альбом обрабатывается одним событием с объединённой подписью: один раз
+запрашиваются чат и автор, один раз проверяются правила и уходит одно
+уведомление со ссылкой на первую часть.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Больше частей в альбоме Telegram не бывает: альбом обрабатывается сразу
+ALBUM_MAX_PARTS = 10
+
+
+class AlbumMessage:
+    """Сообщение альбома в виде event.message (то, что читает обработчик воркера)."""
+
+    def __init__(self, messages: List[Any]):
+        self.parts = messages
+        first = messages[0]
+        self.id = first.id
+        self.date = getattr(first, 'date', None)
+        self.grouped_id = getattr(first, 'grouped_id', None)
+        # Подписи частей по порядку, без повторов (у одной части — обычно одна подпись)
+        captions: List[str] = []
+        for message in messages:
+            text = (getattr(message, 'text', None) or "").strip()
+            if text and text not in captions:
+                captions.append(text)
+        self.text = "\n".join(captions)
+
+
+class AlbumEvent:
+    """Событие альбома: чат и автор берутся из первой части."""
+
+    def __init__(self, events: List[Any]):
+        events = sorted(events, key=lambda event: event.message.id)
+        self._first = events[0]
+        self.chat_id = self._first.chat_id
+        self.sender_id = getattr(self._first, 'sender_id', None)
+        self.message = AlbumMessage([event.message for event in events])
+
+    async def get_sender(self):
+        return await self._first.get_sender()
+
+    async def get_chat(self):
+        return await self._first.get_chat()
+
+
+@dataclass
+class _PendingAlbum:
+    """Части альбома, пришедшие к этому моменту."""
+    events: List[Any] = field(default_factory=list)
+    last_part: float = 0.0
+    flush_task: Optional[asyncio.Task] = None
+
+
+class AlbumCollector:
+    """Буфер частей альбомов: (чат, grouped_id) → события частей."""
+
+    def __init__(self, handle: Callable[[AlbumEvent], Awaitable[None]],
+                 window: float = config.ALBUM_WINDOW):
+        """
+        Args:
+            handle: Обработчик альбома (вызывается один раз на альбом)
+            window: Сколько секунд ждать следующую часть (0 — не склеивать)
+        """
+        self.handle = handle
+        self.window = window
+        self._albums: Dict[Tuple[int, int], _PendingAlbum] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.parts = 0
+
+    def add(self, event) -> bool:
+        """
+        Отложить часть альбома.
+
+        Returns:
+            False, если сообщение не из альбома и его нужно обработать сразу
+        """
+        grouped_id = getattr(event.message, 'grouped_id', None)
+        if not grouped_id or self.window <= 0:
+            return False
+        key = (event.chat_id, grouped_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = _PendingAlbum()
+            album.flush_task = self._spawn(self._flush_later(key))
+        album.events.append(event)
+        album.last_part = time.monotonic()
+        self.parts += 1
+        if len(album.events) >= ALBUM_MAX_PARTS:
+            album.flush_task.cancel()
+            self._spawn(self._flush(key))
+        return True
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # Ссылки на задачи держим сами: цикл событий хранит только слабые
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def pending(self) -> int:
+        """Сколько альбомов ждут оставшиеся части."""
+        return len(self._albums)
+
+    async def _flush_later(self, key: Tuple[int, int]):
+        # Окно отсчитывается от последней пришедшей части
+        while True:
+            album = self._albums.get(key)
+            if album is None:
+                return
+            delay = album.last_part + self.window - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple[int, int]):
+        album = self._albums.pop(key, None)
+        if album is None:
+            return
+        try:
+            await self.handle(AlbumEvent(album.events))
+        except Exception as e:
+            logger.error("Ошибка при обработке альбома %s в чате %s: %s", key[1], key[0], e)
+
+    async def stop(self):
+        """Обработать накопленные альбомы, не дожидаясь окна (при остановке воркера)."""
+        for key, album in list(self._albums.items()):
+            album.flush_task.cancel()
+            await self._flush(key)
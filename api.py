@@ -0,0 +1,166 @@
+"""
+Локальный HTTP API только для чтения (aiohttp).
+
+Запускается из run.py, если задан API_PORT. Даёт дашбордам данные без бота:
+- GET /api/leads — лиды постранично (фильтры: since, until, chat_id, sender_id, q, tenant_id;
+  страница: limit, cursor — id, с которого продолжить);
+- GET /api/config — текущие настройки парсера;
+- GET /api/workers — счётчики воркеров и состояние очереди уведомлений;
+- GET /metrics — счётчики и гистограммы задержек воркеров в формате Prometheus.
+
+Ответы кэшируются на API_CACHE_TTL секунд и отдаются с ETag: повторный опрос
+с If-None-Match получает 304 без обращения к SQLite. Соединения держатся
+открытыми (keep-alive).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Callable, Dict, Tuple, Union
+
+from aiohttp import web
+
+import config
+from database import Database
+from metrics import render_prometheus
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер страницы лидов
+MAX_PAGE_SIZE = 500
+# Ключи конфига, которые не отдаются наружу (служебные, по пользователям бота)
+_HIDDEN_CONFIG_PREFIXES = ("current_tenant:",)
+
+
+class ResponseCache:
+    """Кэш ответов: ключ запроса → (срок, тело, ETag)."""
+
+    def __init__(self, ttl: float, max_items: int = 1000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items: Dict[str, Tuple[float, bytes, str]] = {}
+
+    def get(self, key: str):
+        item = self._items.get(key)
+        if item and item[0] > time.monotonic():
+            return item
+        return None
+
+    def put(self, key: str, body: bytes) -> Tuple[float, bytes, str]:
+        if len(self._items) >= self.max_items:
+            now = time.monotonic()
+            self._items = {k: v for k, v in self._items.items() if v[0] > now}
+            if len(self._items) >= self.max_items:
+                self._items.clear()
+        item = (time.monotonic() + self.ttl, body, f'"{hashlib.sha1(body).hexdigest()}"')
+        self._items[key] = item
+        return item
+
+
+def _int_param(request: web.Request, name: str):
+    value = request.query.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"Параметр {name} должен быть числом")
+
+
+def create_app(db: Database) -> web.Application:
+    """
+    Создать приложение API.
+
+    Args:
+        db: База данных
+
+    Returns:
+        aiohttp Application
+    """
+    cache = ResponseCache(config.API_CACHE_TTL)
+
+    def leads(request: web.Request) -> Dict:
+        limit = _int_param(request, "limit")
+        if limit is not None and limit < 1:
+            # LIMIT -1 в SQLite — без ограничения: вернулась бы вся таблица logs
+            raise web.HTTPBadRequest(text="Параметр limit должен быть больше нуля")
+        limit = min(limit or 50, MAX_PAGE_SIZE)
+        rows = db.query_logs(
+            since=request.query.get("since") or None,
+            until=request.query.get("until") or None,
+            chat_id=_int_param(request, "chat_id"),
+            user_id=_int_param(request, "sender_id"),
+            text=request.query.get("q") or None,
+            tenant_id=_int_param(request, "tenant_id"),
+            before_id=_int_param(request, "cursor"),
+            limit=limit,
+        )
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return {"leads": rows, "next_cursor": next_cursor}
+
+    def config_view(request: web.Request) -> Dict:
+        conf = db.get_all_config()
+        return {
+            key: value for key, value in conf.items()
+            if not key.startswith(_HIDDEN_CONFIG_PREFIXES)
+        }
+
+    def workers(request: web.Request) -> Dict:
+        return {"workers": db.get_worker_stats(), "queue": db.get_queue_stats()}
+
+    def prometheus(request: web.Request) -> str:
+        return render_prometheus(db.get_worker_stats(), db.get_queue_stats())
+
+    def cached(build: Callable[[web.Request], Union[Dict, str]], content_type: str = "application/json"):
+        async def handler(request: web.Request) -> web.Response:
+            key = request.path_qs
+            item = cache.get(key)
+            if item is None:
+                # Запрос к SQLite — в отдельном потоке, чтобы не блокировать цикл событий
+                data = await asyncio.to_thread(build, request)
+                if isinstance(data, str):
+                    body = data.encode("utf-8")
+                else:
+                    body = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+                item = cache.put(key, body)
+            _, body, etag = item
+            headers = {"ETag": etag, "Cache-Control": f"max-age={int(config.API_CACHE_TTL)}"}
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers=headers)
+            return web.Response(body=body, content_type=content_type, charset="utf-8", headers=headers)
+        return handler
+
+    @web.middleware
+    async def auth(request: web.Request, handler):
+        if config.API_TOKEN and request.headers.get("Authorization") != f"Bearer {config.API_TOKEN}":
+            raise web.HTTPUnauthorized()
+        return await handler(request)
+
+    app = web.Application(middlewares=[auth])
+    app.router.add_get("/api/leads", cached(leads))
+    app.router.add_get("/api/config", cached(config_view))
+    app.router.add_get("/api/workers", cached(workers))
+    app.router.add_get("/metrics", cached(prometheus, content_type="text/plain"))
+    return app
+
+
+async def main():
+    """Запустить API и работать до остановки процесса."""
+    db = Database(config.DATABASE_PATH)
+    runner = web.AppRunner(create_app(db), keepalive_timeout=75)
+    await runner.setup()
+    site = web.TCPSite(runner, config.API_HOST, config.API_PORT)
+    await site.start()
+    logger.info(f"API запущен: http://{config.API_HOST}:{config.API_PORT}/api/leads")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging("api")
+    asyncio.run(main())
@@ -0,0 +1,400 @@
+"""
+Бэктест правил: прогон архива сообщений через текущие и изменённые правила.
+
+Перед правкой ключ-слов или стоп-слов можно узнать, какие лиды изменение
+добавило бы и какие потеряло. Каждое сообщение архива проходит те же
+шаги, что и в воркере (нормализация, ключ-слова, чёрный список,
+стоп-слова — RuleSet.match) дважды: с текущим снимком правил из базы и
+с изменённым. Дубли не проверяются — они зависят от истории отправок.
+
+Архивы:
+- экспорт чата из Telegram Desktop (result.json, один чат или весь аккаунт);
+- JSONL: по объекту на строку с полем text (и sender_id/user_id, chat_id,
+  message_id, date, если есть) — например, журнал приёмника jsonl;
+- история лидов из базы (--logs): только то, что уже было лидом,
+  поэтому видны в основном потерянные лиды.
+
+Сообщения проверяются пачками в нескольких процессах, расхождения
+выводятся сразу, по мере проверки (JSONL: change = gained / lost),
+итог по профилям и правилам — в конце.
+
+    python backtest.py export/result.json --add-keyword "куплю айфон" --remove-keyword ремонт
+    python backtest.py --logs --days 30 --keywords-file new_keywords.txt --output diff.jsonl
+"""
+
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from normalizer import normalize_text
+from ruleset import RuleSet
+
+# Сообщений в одной пачке для процесса
+CHUNK_SIZE = 2000
+# Сколько символов текста писать в расхождение
+TEXT_PREVIEW = 300
+# Как часто печатать прогресс (сообщений)
+PROGRESS_EVERY = 50_000
+
+
+# ==================== АРХИВЫ ====================
+
+def _export_text(text) -> str:
+    """Текст сообщения экспорта Telegram: строка или список фрагментов с разметкой."""
+    if isinstance(text, str):
+        return text
+    return "".join(part if isinstance(part, str) else part.get('text', '') for part in text or [])
+
+
+def _export_sender(from_id) -> int:
+    """'user123' → 123; каналы и неизвестные авторы → 0."""
+    if isinstance(from_id, str) and from_id.startswith("user") and from_id[4:].isdigit():
+        return int(from_id[4:])
+    return 0
+
+
+def read_telegram_export(path: str) -> Iterator[Dict]:
+    """Сообщения экспорта Telegram Desktop (JSON одного чата или всего аккаунта)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    chats = data.get('chats', {}).get('list', []) if 'chats' in data else [data]
+    for chat in chats:
+        for message in chat.get('messages', []):
+            if message.get('type') != 'message':
+                continue
+            text = _export_text(message.get('text'))
+            if text:
+                yield {
+                    'text': text,
+                    'sender_id': _export_sender(message.get('from_id')),
+                    'chat_id': chat.get('id'),
+                    'chat_title': chat.get('name'),
+                    'message_id': message.get('id'),
+                    'date': message.get('date'),
+                }
+
+
+def read_jsonl(path: str) -> Iterator[Dict]:
+    """Сообщения из JSONL (поле text обязательно)."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get('text'):
+                yield {
+                    'text': item['text'],
+                    'sender_id': item.get('sender_id') or item.get('user_id') or 0,
+                    'chat_id': item.get('chat_id'),
+                    'chat_title': item.get('chat_title') or item.get('source_chat'),
+                    'message_id': item.get('message_id'),
+                    'date': item.get('date') or item.get('timestamp'),
+                }
+
+
+def read_logs(db, days: Optional[int] = None, tenant_ids: Optional[List[int]] = None) -> Iterator[Dict]:
+    """Сообщения из истории лидов (лид нескольких профилей — одно сообщение)."""
+    seen = set()
+    for row in db.iter_logs(days, tenant_ids):
+        key = (row['chat_id'], row['message_id'])
+        if key in seen or not row['text']:
+            continue
+        seen.add(key)
+        yield {
+            'text': row['text'],
+            'sender_id': row['user_id'] or 0,
+            'chat_id': row['chat_id'],
+            'chat_title': row['source_chat'],
+            'message_id': row['message_id'],
+            'date': row['timestamp'],
+        }
+
+
+def read_archive(path: str) -> Iterator[Dict]:
+    """Архив по расширению: .jsonl — JSONL, иначе экспорт Telegram."""
+    return read_jsonl(path) if path.endswith(".jsonl") else read_telegram_export(path)
+
+
+# ==================== ПРАВИЛА ====================
+
+def apply_edits(snapshot: Dict[int, Dict], tenant_id: int,
+                add_keywords: Iterable[str] = (), remove_keywords: Iterable[str] = (),
+                add_stopwords: Iterable[str] = (), remove_stopwords: Iterable[str] = (),
+                keywords: Optional[List[str]] = None, stopwords: Optional[List[str]] = None) -> Dict[int, Dict]:
+    """
+    Изменённый снимок правил (исходный не меняется).
+
+    Args:
+        snapshot: Database.get_rules_snapshot()
+        tenant_id: Профиль, к которому применяются правки
+        add_keywords / remove_keywords: Добавить / убрать ключ-слова
+        add_stopwords / remove_stopwords: Добавить / убрать стоп-слова
+        keywords / stopwords: Заменить список целиком (до добавлений и удалений)
+
+    Returns:
+        Новый снимок
+    """
+    if tenant_id not in snapshot:
+        raise ValueError(f"Профиль {tenant_id} не найден")
+    candidate = copy.deepcopy(snapshot)
+    data = candidate[tenant_id]
+    for key, replace, add, remove in (('keywords', keywords, add_keywords, remove_keywords),
+                                      ('stopwords', stopwords, add_stopwords, remove_stopwords)):
+        rules = list(replace) if replace is not None else data[key]
+        removed = {rule.strip() for rule in remove}
+        rules = [rule for rule in rules if rule not in removed]
+        for rule in add:
+            rule = rule.strip()
+            if rule and rule not in rules:
+                rules.append(rule)
+        data[key] = rules
+    return candidate
+
+
+# ==================== ПРОГОН ====================
+
+# Правила в процессе-исполнителе (строятся один раз в initializer)
+_rules: Optional[Tuple[RuleSet, RuleSet]] = None
+
+
+def _init_rules(baseline: Dict[int, Dict], candidate: Dict[int, Dict], use_lemmas: bool):
+    global _rules
+    _rules = (RuleSet(baseline, use_lemmas), RuleSet(candidate, use_lemmas))
+
+
+def compare_message(baseline: RuleSet, candidate: RuleSet, message: Dict) -> Tuple[Dict, Dict]:
+    """
+    Прогнать сообщение через оба набора правил.
+
+    Returns:
+        Tuple (профиль → ключ-слова по текущим правилам, то же по изменённым)
+    """
+    normalized = normalize_text(message['text'])
+    sender_id = int(message.get('sender_id') or 0)
+    before, _ = baseline.match(normalized, sender_id)
+    after, _ = candidate.match(normalized, sender_id)
+    return before, after
+
+
+def _diff(message: Dict, before: Dict, after: Dict) -> List[Dict]:
+    changes = []
+    for change, tenants, rules in (('gained', set(after) - set(before), after),
+                                   ('lost', set(before) - set(after), before)):
+        for tid in sorted(tenants):
+            changes.append({
+                'change': change,
+                'tenant_id': tid,
+                'rules': rules[tid],
+                'chat_id': message.get('chat_id'),
+                'chat_title': message.get('chat_title'),
+                'message_id': message.get('message_id'),
+                'sender_id': message.get('sender_id'),
+                'date': message.get('date'),
+                'text': message['text'][:TEXT_PREVIEW],
+            })
+    return changes
+
+
+def _check_chunk(chunk: List[Dict]) -> Tuple[int, Counter, Counter, List[Dict]]:
+    """Проверить пачку: (сообщений, лиды до по профилям, лиды после, расхождения)."""
+    baseline, candidate = _rules
+    leads_before: Counter = Counter()
+    leads_after: Counter = Counter()
+    changes: List[Dict] = []
+    for message in chunk:
+        before, after = compare_message(baseline, candidate, message)
+        leads_before.update(before.keys())
+        leads_after.update(after.keys())
+        if before.keys() != after.keys():
+            changes.extend(_diff(message, before, after))
+    return len(chunk), leads_before, leads_after, changes
+
+
+def _chunks(messages: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    iterator = iter(messages)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class BacktestResult:
+    """Итог бэктеста (заполняется по мере прогона)."""
+
+    def __init__(self):
+        self.messages = 0
+        self.leads_before: Counter = Counter()
+        self.leads_after: Counter = Counter()
+        self.gained: Counter = Counter()
+        self.lost: Counter = Counter()
+        # (профиль, правило) → сколько лидов правило добавило / сколько потеряно при нём
+        self.gained_rules: Counter = Counter()
+        self.lost_rules: Counter = Counter()
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, count: int, before: Counter, after: Counter, changes: List[Dict]):
+        self.messages += count
+        self.leads_before.update(before)
+        self.leads_after.update(after)
+        for change in changes:
+            tid = change['tenant_id']
+            if change['change'] == 'gained':
+                self.gained[tid] += 1
+                self.gained_rules.update((tid, rule) for rule in change['rules'])
+            else:
+                self.lost[tid] += 1
+                self.lost_rules.update((tid, rule) for rule in change['rules'])
+        self.elapsed = time.perf_counter() - self.started
+
+    def to_dict(self, top: int = 20) -> Dict:
+        tenants = sorted(set(self.leads_before) | set(self.leads_after) | set(self.gained) | set(self.lost))
+        return {
+            'messages': self.messages,
+            'seconds': round(self.elapsed, 2),
+            'messages_per_sec': round(self.messages / self.elapsed, 1) if self.elapsed else 0.0,
+            'tenants': {
+                str(tid): {
+                    'leads_before': self.leads_before[tid],
+                    'leads_after': self.leads_after[tid],
+                    'gained': self.gained[tid],
+                    'lost': self.lost[tid],
+                }
+                for tid in tenants
+            },
+            'top_gained_rules': [[tid, rule, count] for (tid, rule), count in self.gained_rules.most_common(top)],
+            'top_lost_rules': [[tid, rule, count] for (tid, rule), count in self.lost_rules.most_common(top)],
+        }
+
+
+def run_backtest(messages: Iterable[Dict], baseline: Dict[int, Dict], candidate: Dict[int, Dict],
+                 use_lemmas: bool = False, processes: int = 1,
+                 chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[BacktestResult, List[Dict]]]:
+    """
+    Прогнать архив через текущие и изменённые правила.
+
+    Args:
+        messages: Сообщения ({'text', 'sender_id', ...})
+        baseline: Текущий снимок правил
+        candidate: Изменённый снимок правил
+        use_lemmas: Режим поиска по леммам
+        processes: Сколько процессов (1 — в текущем)
+        chunk_size: Сообщений в пачке
+
+    Yields:
+        Tuple (итог на текущий момент, расхождения очередной пачки) — по мере проверки
+    """
+    result = BacktestResult()
+    chunks = _chunks(messages, chunk_size)
+    if processes <= 1:
+        _init_rules(baseline, candidate, use_lemmas)
+        for chunk in chunks:
+            count, before, after, changes = _check_chunk(chunk)
+            result.add(count, before, after, changes)
+            yield result, changes
+        return
+    with multiprocessing.Pool(processes, _init_rules, (baseline, candidate, use_lemmas)) as pool:
+        for count, before, after, changes in pool.imap(_check_chunk, chunks):
+            result.add(count, before, after, changes)
+            yield result, changes
+
+
+# ==================== CLI ====================
+
+def _read_rules(path: str) -> List[str]:
+    """Правила из файла: по одному на строку, пустые строки и # — пропускаются."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def summary(result: BacktestResult, tenants: Dict[int, Dict], top: int = 10) -> str:
+    """Итог для терминала."""
+    data = result.to_dict(top)
+    lines = [f"Сообщений: {data['messages']} за {data['seconds']} с ({data['messages_per_sec']:.0f} сообщ/с)"]
+    for tid, counts in data['tenants'].items():
+        name = tenants.get(int(tid), {}).get('name') or tid
+        lines.append(f"  [{tid}] {name}: лидов {counts['leads_before']} → {counts['leads_after']}  "
+                     f"(+{counts['gained']} / -{counts['lost']})")
+    for title, rules in (("Добавили лиды", data['top_gained_rules']),
+                         ("Потерянные лиды (ключ-слова)", data['top_lost_rules'])):
+        if rules:
+            lines.append(f"{title}:")
+            lines.extend(f"  [{tid}] {rule}: {count}" for tid, rule, count in rules)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бэктест изменённых правил на архиве сообщений")
+    parser.add_argument("archive", nargs="?", help="экспорт Telegram (result.json) или .jsonl")
+    parser.add_argument("--logs", action="store_true", help="прогнать историю лидов из базы")
+    parser.add_argument("--days", type=int, help="для --logs: только за последние N дней")
+    parser.add_argument("--tenant", type=int, default=1, help="профиль, к которому применяются правки")
+    parser.add_argument("--add-keyword", action="append", default=[], metavar="ПРАВИЛО")
+    parser.add_argument("--remove-keyword", action="append", default=[], metavar="ПРАВИЛО")
+    parser.add_argument("--add-stopword", action="append", default=[], metavar="ПРАВИЛО")
+    parser.add_argument("--remove-stopword", action="append", default=[], metavar="ПРАВИЛО")
+    parser.add_argument("--keywords-file", help="заменить ключ-слова профиля списком из файла")
+    parser.add_argument("--stopwords-file", help="заменить стоп-слова профиля списком из файла")
+    parser.add_argument("--lemmas", action=argparse.BooleanOptionalAction, default=None,
+                        help="поиск по леммам (по умолчанию — как в настройках бота)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--output", help="куда писать расхождения (JSONL, по умолчанию — stdout)")
+    parser.add_argument("--summary", help="куда записать итог (JSON)")
+    args = parser.parse_args(argv)
+    if bool(args.archive) == args.logs:
+        parser.error("укажите архив или --logs")
+
+    import config
+    from database import Database
+
+    db = Database(config.DATABASE_PATH)
+    baseline = db.get_rules_snapshot()
+    try:
+        candidate = apply_edits(
+            baseline, args.tenant,
+            args.add_keyword, args.remove_keyword, args.add_stopword, args.remove_stopword,
+            _read_rules(args.keywords_file) if args.keywords_file else None,
+            _read_rules(args.stopwords_file) if args.stopwords_file else None,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    use_lemmas = args.lemmas
+    if use_lemmas is None:
+        use_lemmas = db.get_config('morphology_enabled') == 'true'
+
+    messages = read_logs(db, args.days) if args.logs else read_archive(args.archive)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    result = BacktestResult()
+    reported = 0
+    try:
+        for result, changes in run_backtest(messages, baseline, candidate, use_lemmas,
+                                            args.processes, args.chunk_size):
+            for change in changes:
+                output.write(json.dumps(change, ensure_ascii=False) + "\n")
+            output.flush()
+            if result.messages - reported >= PROGRESS_EVERY:
+                reported = result.messages
+                print(f"... {result.messages} сообщений, +{sum(result.gained.values())} / "
+                      f"-{sum(result.lost.values())}", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(summary(result, {tid: data['tenant'] for tid, data in baseline.items()}), file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(result.to_dict(), f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+"""
+Бенчмарки фильтрации сообщений.
+
+    python -m benchmarks.filter_bench --output bench.json
+    python -m benchmarks.filter_bench --compare bench.json
+    python -m benchmarks.load_bench --rate 200 --duration 30
+    python -m benchmarks.storage_bench --rows 1000000 --readers 4 --writers 2
+
+corpus — синтетический корпус русских сообщений и наборы правил,
+reference — исходный движок на регексах (эталон для сверки),
+filter_bench — замеры скорости и памяти, сверка движков, вывод в JSON,
+load_bench — нагрузочный прогон воркера с заглушками Telegram,
+storage_bench — методы Database под нагрузкой из нескольких процессов.
+"""
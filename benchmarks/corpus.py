@@ -0,0 +1,178 @@
+"""
+Синтетический корпус сообщений из чатов и наборы правил для бенчмарков.
+
+Всё генерируется детерминированно из seed, поэтому результаты разных
+коммитов сравнимы. Сообщения похожи на объявления и болтовню в чатах:
+слова в разных формах (падежи, приставки глаголов, окончания
+прилагательных), цифры, эмодзи, «ё», латинские буквы-двойники.
+Правила покрывают все формы: существительные, глаголы, прилагательные,
+наречия, _строгое_ слово и комбинации a+b.
+"""
+
+import json
+import random
+from typing import List
+
+import matcher
+
+NOUNS = [
+    "айфон", "ноутбук", "телефон", "диван", "велосипед", "холодильник", "самокат",
+    "ремонт", "маникюр", "репетитор", "грузчик", "дизайн", "сайт", "чат", "аккаунт",
+    "гараж", "участок", "дом", "шкаф", "стол", "монитор", "принтер", "пылесос",
+    "кредит", "заказ", "клиент", "офис", "склад", "бот", "курс",
+]
+VERBS = [
+    "купить", "продать", "снять", "сдать", "найти", "отдать", "заказать", "починить",
+    "обменять", "арендовать", "настроить", "сделать", "помочь", "забрать", "доставить",
+]
+# Формы глаголов, которые правилами-инфинитивами не ловятся (первое лицо и т.п.)
+VERB_FORMS = [
+    "куплю", "продам", "сниму", "сдам", "ищу", "отдам", "закажу", "починю",
+    "обменяю", "арендую", "настрою", "сделаю", "помогите", "заберу", "доставим",
+]
+ADJECTIVES = ["новый", "срочный", "дешевый", "хороший", "рабочий", "большой", "б/у", "целый"]
+ADVERBS = ["срочно", "недорого", "дешево", "быстро", "выгодно", "качественно"]
+STOP_WORDS = [
+    "реклама", "казино", "ставки", "подписывайтесь", "розыгрыш", "заработок",
+    "инвестиции", "крипта", "бесплатно", "гарантия", "пассивный", "скидка",
+]
+FILLER = [
+    "привет", "всем", "добрый", "день", "ребят", "подскажите", "кто", "знает", "где",
+    "можно", "в", "на", "по", "за", "очень", "нужно", "есть", "пишите", "в лс", "цена",
+    "район", "центр", "москва", "спб", "сегодня", "завтра", "спасибо", "всё", "ещё",
+]
+EMOJI = ["🔥", "‼️", "👉", "✅", "💰", "📦", "🚗", "🏠", "😊"]
+SYLLABLES = ["ка", "ро", "ми", "ту", "ла", "не", "за", "во", "пи", "де", "су", "ря", "го", "лу", "те"]
+# Латинские буквы-двойники кириллических (для проверки нормализации)
+HOMOGLYPHS = str.maketrans("аеосрх", "aeocpx")
+
+
+def _noun_form(rng: random.Random, word: str) -> str:
+    endings = matcher.NOUN_ALLOWED_ENDINGS + ("ами", "ой", "")
+    return word + rng.choice(endings)
+
+
+def _verb_form(rng: random.Random, index: int) -> str:
+    roll = rng.random()
+    if roll < 0.4:
+        return VERB_FORMS[index]
+    if roll < 0.6:
+        return rng.choice(sorted(matcher.VERB_PREFIXES)) + VERBS[index]
+    return VERBS[index]
+
+
+def _adjective_form(rng: random.Random, word: str) -> str:
+    base = word
+    for suffix in matcher.ADJ_BASE_SUFFIXES:
+        if word.endswith(suffix):
+            base = word[: -len(suffix)]
+            break
+    return base + rng.choice(matcher.ADJ_ALLOWED_ENDINGS + ("ого", "ому"))
+
+
+def generate_message(rng: random.Random) -> str:
+    """Одно сообщение: объявление, вопрос или болтовня."""
+    words: List[str] = [rng.choice(FILLER) for _ in range(rng.randint(0, 3))]
+    kind = rng.random()
+    if kind < 0.55:
+        # Объявление: глагол + прилагательное + существительное + наречие
+        index = rng.randrange(len(VERBS))
+        words.append(_verb_form(rng, index))
+        if rng.random() < 0.5:
+            words.append(_adjective_form(rng, rng.choice(ADJECTIVES)))
+        words.append(_noun_form(rng, rng.choice(NOUNS)))
+        if rng.random() < 0.5:
+            words.append(rng.choice(ADVERBS))
+        if rng.random() < 0.4:
+            words.append(f"{rng.randint(1, 200) * 500} руб")
+    elif kind < 0.7:
+        # Спам
+        words.extend(rng.choice(STOP_WORDS) for _ in range(rng.randint(1, 3)))
+        words.append(_noun_form(rng, rng.choice(NOUNS)))
+    words.extend(rng.choice(FILLER) for _ in range(rng.randint(2, 12)))
+    rng.shuffle(words) if rng.random() < 0.2 else None
+    text = " ".join(words)
+    if rng.random() < 0.3:
+        text = text.capitalize() + rng.choice(["!", "?", ".", "!!!", ""])
+    if rng.random() < 0.3:
+        text = f"{rng.choice(EMOJI)} {text}"
+    if rng.random() < 0.05:
+        text = text.translate(HOMOGLYPHS)
+    if rng.random() < 0.1:
+        # Длинное сообщение: несколько абзацев
+        text = "\n\n".join([text] + [generate_message(rng) for _ in range(rng.randint(2, 5))])
+    return text
+
+
+def generate_corpus(count: int, seed: int = 42) -> List[str]:
+    """Сгенерировать count сообщений."""
+    rng = random.Random(seed)
+    return [generate_message(rng) for _ in range(count)]
+
+
+def load_corpus(path: str) -> List[str]:
+    """
+    Загрузить корпус из файла.
+
+    Args:
+        path: .jsonl (поле text у каждой строки, например журнал лидов) или текст, сообщение на строку
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line)["text"] for line in f if line.strip()]
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def _pseudo_word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def _pseudo_rule(rng: random.Random) -> str:
+    """Правило из несуществующих слов (для наборов в тысячи правил)."""
+    stem = _pseudo_word(rng)
+    form = rng.random()
+    if form < 0.35:
+        return stem + "к"                     # существительное
+    if form < 0.55:
+        return stem + "ть"                    # глагол
+    if form < 0.7:
+        return stem + "ный"                   # прилагательное
+    if form < 0.8:
+        return stem + "о"                     # наречие
+    if form < 0.9:
+        return f"_{stem}_"                    # строгое слово
+    return f"{stem}ть+{_pseudo_word(rng)}к"   # комбинация
+
+
+def generate_rules(count: int, seed: int = 42, stopwords: bool = False) -> List[str]:
+    """
+    Набор правил: сначала реальные слова корпуса во всех формах, затем псевдослова.
+
+    Args:
+        count: Размер набора
+        seed: Seed генератора
+        stopwords: Набор стоп-слов (из спам-слов) вместо ключевых
+    """
+    rng = random.Random(seed * 7919 + count)
+    if stopwords:
+        real = STOP_WORDS + [f"_{word}_" for word in STOP_WORDS[:4]] + ["подписывайтесь+канал"]
+    else:
+        real = (
+            NOUNS + VERBS + ADVERBS + [a for a in ADJECTIVES if "/" not in a]
+            + [f"_{word}_" for word in NOUNS[:5]]
+            + [f"{verb}+{noun}" for verb, noun in zip(VERBS, NOUNS)]
+        )
+    rng.shuffle(real)
+    rules: List[str] = []
+    seen = set()
+    for rule in real:
+        if len(rules) >= count:
+            break
+        rules.append(rule)
+        seen.add(rule)
+    while len(rules) < count:
+        rule = _pseudo_rule(rng)
+        if rule not in seen:
+            seen.add(rule)
+            rules.append(rule)
+    return rules
@@ -0,0 +1,282 @@
+"""
+Бенчмарк фильтрации: скорость и память проверки ключ-слов и стоп-слов.
+
+Для каждого движка и размера набора правил (по умолчанию 10, 1 000 и
+10 000) замеряются:
+- build_ms — компиляция набора правил;
+- messages_per_sec, p50_us, p99_us, max_us — проверка одного сообщения
+  (каждый вызов по time.perf_counter_ns, нормализация текста входит в замер);
+- retained_kib и peak_kib — память скомпилированного набора и пик во
+  время компиляции и проверки (tracemalloc, отдельным проходом, чтобы
+  трассировка не искажала время).
+
+Движки (ENGINES; новый движок — ещё одна фабрика «правила → функция»):
+- check_keywords — MessageFilter.check_keywords воркера: get_matcher(tuple(rules))
+  и нормализация на каждом вызове (worker импортируется без базы — она
+  открывается только в worker.init());
+- matcher — заранее скомпилированный RuleMatcher, как в снимке правил воркера;
+- lemmas — RuleMatcher в режиме лемм (если установлен pymorphy2);
+- regex — исходный движок на регексах (benchmarks.reference).
+
+Сверка (differential): на каждом наборе правил множества сработавших
+правил matcher и regex сравниваются на каждом сообщении; расхождения
+попадают в отчёт с примерами, а код выхода становится 1.
+
+    python -m benchmarks.filter_bench --output bench.json
+    python -m benchmarks.filter_bench --compare bench.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Union
+
+import matcher
+import morphology
+from benchmarks.corpus import generate_corpus, generate_rules, load_corpus
+from benchmarks.reference import RegexEngine
+from normalizer import normalize_text
+
+# Формат JSON с результатами (увеличивать при несовместимых изменениях)
+RESULTS_VERSION = 1
+DEFAULT_SIZES = (10, 1000, 10000)
+# Сколько примеров расхождений сохранять на набор правил
+DIFF_EXAMPLES = 10
+# Сколько сообщений проверять под tracemalloc
+MEMORY_MESSAGES = 300
+
+# Проверка: текст → сработавшее правило (check_keywords — True) или None
+Check = Callable[[str], Union[str, bool, None]]
+
+
+def _check_keywords(rules: List[str]) -> Check:
+    # Импорт здесь: load_bench импортирует этот модуль до того, как настроит config для worker
+    from worker import MessageFilter
+
+    def check(text: str) -> Optional[bool]:
+        return MessageFilter.check_keywords(text, rules) or None
+    return check
+
+
+def _compiled(use_lemmas: bool) -> Callable[[List[str]], Check]:
+    def factory(rules: List[str]) -> Check:
+        compiled = matcher.RuleMatcher(rules, use_lemmas)
+        return lambda text: compiled.first_match(normalize_text(text))
+    return factory
+
+
+def _regex(rules: List[str]) -> Check:
+    return RegexEngine(rules).first_match
+
+
+# Движок → фабрика: по набору правил возвращает проверку (см. Check)
+ENGINES: Dict[str, Callable[[List[str]], Check]] = {
+    'check_keywords': _check_keywords,
+    'matcher': _compiled(False),
+    'lemmas': _compiled(True),
+    'regex': _regex,
+}
+
+
+def _percentile(sorted_values: List[int], q: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _build(engine: str, rules: List[str]) -> Check:
+    # Пустой кэш get_matcher, чтобы компиляция попадала в замер каждый раз
+    matcher.get_matcher.cache_clear()
+    check = ENGINES[engine](rules)
+    if engine == 'check_keywords':
+        check("")
+    return check
+
+
+def measure(engine: str, rules: List[str], messages: List[str]) -> Dict:
+    """
+    Замерить один движок на одном наборе правил.
+
+    Args:
+        engine: Имя движка из ENGINES
+        rules: Набор правил
+        messages: Сообщения
+
+    Returns:
+        Словарь с замерами (см. описание модуля)
+    """
+    started = time.perf_counter()
+    check = _build(engine, rules)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    timings: List[int] = []
+    hits = 0
+    perf = time.perf_counter_ns
+    for text in messages:
+        before = perf()
+        rule = check(text)
+        timings.append(perf() - before)
+        hits += rule is not None
+    total_ns = sum(timings) or 1
+    timings.sort()
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        check = _build(engine, rules)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        for text in messages[:MEMORY_MESSAGES]:
+            check(text)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    matcher.get_matcher.cache_clear()
+
+    return {
+        'messages': len(messages),
+        'hits': hits,
+        'build_ms': round(build_ms, 3),
+        'messages_per_sec': round(len(messages) / (total_ns / 1e9), 1),
+        'p50_us': round(_percentile(timings, 0.5) / 1000, 2),
+        'p99_us': round(_percentile(timings, 0.99) / 1000, 2),
+        'max_us': round(timings[-1] / 1000, 2),
+        'retained_kib': round(retained / 1024, 1),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def differential(rules: List[str], messages: List[str]) -> Dict:
+    """
+    Сравнить сработавшие правила нового (matcher) и исходного (regex) движков.
+
+    Returns:
+        {'messages', 'mismatches', 'examples': [{'text', 'only_matcher', 'only_regex'}]}
+    """
+    new = matcher.RuleMatcher(rules)
+    old = RegexEngine(rules)
+    mismatches = 0
+    examples = []
+    for text in messages:
+        fired_new = set(new.matches(normalize_text(text)))
+        fired_old = set(old.matches(text))
+        if fired_new != fired_old:
+            mismatches += 1
+            if len(examples) < DIFF_EXAMPLES:
+                examples.append({
+                    'text': text,
+                    'only_matcher': sorted(fired_new - fired_old),
+                    'only_regex': sorted(fired_old - fired_new),
+                })
+    return {'messages': len(messages), 'mismatches': mismatches, 'examples': examples}
+
+
+def git_commit() -> Optional[str]:
+    """Короткий хэш текущего коммита (None вне git)."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict:
+    """Прогнать все замеры и сверку, вернуть результаты для JSON."""
+    if args.corpus:
+        messages = load_corpus(args.corpus)[:args.messages]
+    else:
+        messages = generate_corpus(args.messages, args.seed)
+    engines = [name for name in args.engines if name != 'lemmas' or morphology.is_available()]
+    skipped = sorted(set(args.engines) - set(engines))
+    if skipped:
+        print(f"Пропущены движки: {', '.join(skipped)} (нет pymorphy2)", file=sys.stderr)
+
+    results = []
+    diffs = []
+    for size in args.sizes:
+        for check, stopwords in (('keywords', False), ('stopwords', True)):
+            rules = generate_rules(size, args.seed, stopwords=stopwords)
+            for engine in engines:
+                sample = messages[:args.regex_messages] if engine == 'regex' else messages
+                print(f"{check:9} {size:>6} правил  {engine:14}", end=" ", flush=True, file=sys.stderr)
+                result = {'engine': engine, 'check': check, 'rules': size, **measure(engine, rules, sample)}
+                print(f"{result['messages_per_sec']:>10.0f} сообщ/с  p99 {result['p99_us']:>9.1f} мкс  "
+                      f"{result['retained_kib']:>8.0f} КиБ", file=sys.stderr)
+                results.append(result)
+            if not args.no_diff:
+                diff = differential(rules, messages[:args.diff_messages])
+                diffs.append({'check': check, 'rules': size, **diff})
+                print(f"{check:9} {size:>6} правил  сверка matcher/regex: "
+                      f"расхождений {diff['mismatches']} из {diff['messages']}", file=sys.stderr)
+
+    return {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'created_at': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'corpus': {'source': args.corpus or "synthetic", 'messages': len(messages)},
+        'results': results,
+        'differential': diffs,
+    }
+
+
+def compare(old: Dict, new: Dict) -> str:
+    """Таблица изменений скорости и p99 относительно прошлого запуска."""
+    previous = {(r['engine'], r['check'], r['rules']): r for r in old.get('results', [])}
+    lines = [f"Сравнение с {old.get('commit') or '?'} → {new.get('commit') or '?'}"]
+    if (old.get('seed'), old.get('corpus')) != (new['seed'], new['corpus']):
+        lines.append("Внимание: корпус или seed отличаются — цифры несравнимы")
+    for result in new['results']:
+        before = previous.get((result['engine'], result['check'], result['rules']))
+        if not before:
+            continue
+        speed = (result['messages_per_sec'] / before['messages_per_sec'] - 1) * 100
+        p99 = (result['p99_us'] / before['p99_us'] - 1) * 100 if before['p99_us'] else 0.0
+        lines.append(
+            f"{result['check']:9} {result['rules']:>6} {result['engine']:14} "
+            f"сообщ/с {speed:+7.1f}%  p99 {p99:+7.1f}%"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк фильтрации сообщений")
+    parser.add_argument("--messages", type=int, default=5000, help="размер корпуса")
+    parser.add_argument("--corpus", help="корпус из файла (.jsonl с полем text или текст построчно)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")],
+                        default=list(DEFAULT_SIZES), help="размеры наборов правил через запятую")
+    parser.add_argument("--engines", type=lambda s: s.split(","), default=list(ENGINES),
+                        help=f"движки через запятую ({', '.join(ENGINES)})")
+    parser.add_argument("--regex-messages", type=int, default=200,
+                        help="сколько сообщений проверять движком regex (он медленный)")
+    parser.add_argument("--diff-messages", type=int, default=500, help="сколько сообщений сверять")
+    parser.add_argument("--no-diff", action="store_true", help="без сверки движков")
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию — в stdout)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    unknown = sorted(set(args.engines) - set(ENGINES))
+    if unknown:
+        parser.error(f"неизвестные движки: {', '.join(unknown)}")
+
+    results = run(args)
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), results), file=sys.stderr)
+    return 1 if any(diff['mismatches'] for diff in results['differential']) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,584 @@
+"""
+Нагрузочный прогон воркера целиком, без Telegram.
+
+TelegramParser.handle_new_message получает синтетические события: у них
+есть event.message (id, text, date), event.chat_id, event.sender_id,
+get_sender() и get_chat(), которые возвращают настоящие типы Telethon
+(User, Chat, Channel) и с вероятностью --entity-miss «идут в сеть» с
+задержкой --rpc-latency (как промах кэша сущностей Telethon). Кэш
+сущностей воркера (entitycache.py) начинает прогон пустым. Уведомления уходят
+в заглушку бота: она записывает отправки, отвечает с задержкой
+--send-latency и с вероятностью --flood-rate бросает FloodWaitError.
+
+Всё остальное настоящее: фильтры и правила, очередь уведомлений в
+SQLite, диспетчер с ограничением скорости, склейка кросс-постов,
+счётчики и метрики воркера. База создаётся во временном каталоге
+(или --db), рабочая parser.db не затрагивается.
+
+Сообщения приходят пуассоновским потоком с частотой --rate в течение
+--duration секунд из чатов --chats (популярность чатов — по закону Ципфа).
+Отчёт (JSON, как у filter_bench):
+- пропускная способность: предложенная и обработанная частота сообщений;
+- задержка обработчика (от прихода события до конца handle_new_message)
+  и задержка лида от прихода до подтверждённой отправки, p50/p95/p99/max;
+- этапы из метрик воркера, задержка цикла событий и медленные шаги;
+- SQLite: время каждого метода Database (вызовы блокируют цикл событий),
+  доля времени цикла в базе и ошибки «database is locked»; --writers
+  добавляет потоки, которые параллельно пишут в ту же базу (как бот и
+  другие воркеры);
+- память процесса (RSS) в начале, в конце и пик под нагрузкой.
+
+    python -m benchmarks.load_bench --rate 200 --duration 30 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+from telethon.tl.types import Channel, Chat, ChatPhotoEmpty, User
+
+import config
+from benchmarks.corpus import generate_corpus, generate_rules
+from benchmarks.filter_bench import git_commit
+
+# Формат JSON с результатами (увеличивать при несовместимых изменениях)
+RESULTS_VERSION = 1
+# Виды чатов: channel — канал, group — супергруппа, chat — обычная группа, private — личный диалог
+CHAT_KINDS = ("group", "channel", "chat", "private")
+# Сколько разных текстов в пуле сообщений (дальше тексты повторяются, как в жизни)
+CORPUS_SIZE = 5000
+# Как часто снимать RSS, секунды
+RSS_INTERVAL = 0.5
+
+
+# ==================== ЗАГЛУШКИ TELEGRAM ====================
+
+class FakeMessage:
+    """Сообщение с полями, которые читает воркер."""
+
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.text = text
+        self.date = datetime.now(timezone.utc)
+
+
+class FakeEvent:
+    """Событие NewMessage: сущности отдаются с задержкой при промахе кэша."""
+
+    def __init__(self, load: "LoadGenerator", chat_id: int, chat, sender, message: FakeMessage):
+        self._load = load
+        self.chat_id = chat_id
+        self.sender_id = sender.id
+        self.message = message
+        self._chat = chat
+        self._sender = sender
+        # Сущности, уже полученные для события (Telethon тоже кэширует их на событии)
+        self._resolved = set()
+        self.received = time.perf_counter()
+
+    async def _entity(self, name: str, value):
+        if name not in self._resolved:
+            self._resolved.add(name)
+            await self._load.rpc()
+        return value
+
+    async def get_sender(self):
+        return await self._entity('sender', self._sender)
+
+    async def get_chat(self):
+        return await self._entity('chat', self._chat)
+
+
+class FakeBotClient:
+    """Клиент отправки уведомлений: записывает отправки, имитирует задержку и FloodWait."""
+
+    def __init__(self, rng: random.Random, latency: float, flood_rate: float, flood_seconds: int):
+        self.rng = rng
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.sent = 0
+        self.flood_waits = 0
+        self.per_chat: Counter = Counter()
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.latency > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.latency))
+        if self.rng.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise FloodWaitError(None, capture=self.flood_seconds)
+        self.sent += 1
+        self.per_chat[chat_id] += 1
+
+    async def disconnect(self):
+        pass
+
+
+# ==================== ЗАМЕРЫ ====================
+
+def _percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """p50/p95/p99/max в миллисекундах (значения в секундах)."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        'count': len(values),
+        'p50_ms': round(pick(0.5) * scale, 3),
+        'p95_ms': round(pick(0.95) * scale, 3),
+        'p99_ms': round(pick(0.99) * scale, 3),
+        'max_ms': round(values[-1] * scale, 3),
+    }
+
+
+class DatabaseProbe:
+    """Время каждого метода Database и ошибки блокировки SQLite."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}
+        self.locked: Counter = Counter()
+        # Время внешних вызовов (методы Database вызывают друг друга — вложенные не суммируются)
+        self.outer = 0.0
+        self._depth = 0
+
+    def instrument(self, db):
+        """Обернуть публичные методы экземпляра db замерами."""
+        for name in dir(type(db)):
+            if name.startswith('_') or name == 'get_connection':
+                continue
+            method = getattr(db, name)
+            if callable(method) and hasattr(method, '__self__'):
+                setattr(db, name, self._wrap(name, method))
+
+    def _wrap(self, name: str, method):
+        timings = self.timings.setdefault(name, [])
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            self._depth += 1
+            try:
+                return method(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e):
+                    self.locked[name] += 1
+                raise
+            finally:
+                self._depth -= 1
+                elapsed = time.perf_counter() - started
+                timings.append(elapsed)
+                if not self._depth:
+                    self.outer += elapsed
+        return timed
+
+    def report(self) -> Dict:
+        methods = {
+            name: {**_percentiles(values), 'total_ms': round(sum(values) * 1000, 1),
+                   'locked': self.locked.get(name, 0)}
+            for name, values in self.timings.items() if values
+        }
+        return dict(sorted(methods.items(), key=lambda item: -item[1]['total_ms']))
+
+
+class ExternalWriters:
+    """Потоки, которые пишут в ту же базу своими подключениями (бот и другие воркеры)."""
+
+    def __init__(self, db_path: str, count: int, interval: float):
+        self.db_path = db_path
+        self.count = count
+        self.interval = interval
+        self.timings: List[float] = []
+        self.locked = 0
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _run(self, index: int):
+        from database import Database
+        db = Database(self.db_path)
+        started_at = time.time()
+        writes = 0
+        while not self._stop.wait(self.interval):
+            writes += 1
+            started = time.perf_counter()
+            try:
+                db.save_worker_stats(f"load-writer-{index}", started_at, {'messages': writes})
+                db.add_hourly_counters({(db.current_hour(), -index): (1, 0)}, {})
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e):
+                    self.locked += 1
+            self.timings.append(time.perf_counter() - started)
+
+    def start(self):
+        for index in range(self.count):
+            thread = threading.Thread(target=self._run, args=(index + 1,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        return {'threads': self.count, 'interval': self.interval,
+                'writes': _percentiles(self.timings), 'locked': self.locked}
+
+
+def _rss() -> Optional[int]:
+    """Текущий RSS процесса в байтах (Linux) или пиковый (ru_maxrss) на других системах."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        try:
+            import resource
+        except ImportError:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+# ==================== ГЕНЕРАТОР НАГРУЗКИ ====================
+
+def parse_chats(value: str) -> Dict[str, int]:
+    """'group=50,channel=10' → {'group': 50, 'channel': 10}."""
+    chats = {}
+    for item in value.split(","):
+        kind, _, count = item.partition("=")
+        kind = kind.strip()
+        if kind not in CHAT_KINDS:
+            raise argparse.ArgumentTypeError(f"неизвестный вид чата: {kind} ({', '.join(CHAT_KINDS)})")
+        chats[kind] = int(count or 1)
+    return chats
+
+
+class LoadGenerator:
+    """Чаты, авторы и сообщения для синтетических событий."""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.rpc_latency = args.rpc_latency
+        self.entity_miss = args.entity_miss
+        self.texts = generate_corpus(CORPUS_SIZE, args.seed)
+        self.chats: List[Tuple[int, object]] = []
+        for kind, count in args.chats.items():
+            for _ in range(count):
+                self.chats.append(self._make_chat(kind, len(self.chats) + 1))
+        # Популярность чатов по закону Ципфа: несколько чатов дают основной поток
+        self.weights = [1 / rank for rank in range(1, len(self.chats) + 1)]
+        self.rng.shuffle(self.weights)
+        self.senders = [
+            User(id=10_000 + i, bot=self.rng.random() < args.bot_share, first_name=f"user{i}")
+            for i in range(args.senders)
+        ]
+        self._message_ids: Counter = Counter()
+
+    @staticmethod
+    def _make_chat(kind: str, index: int) -> Tuple[int, object]:
+        title = f"Нагрузка {kind} {index}"
+        if kind == "private":
+            return 500_000 + index, User(id=500_000 + index, first_name=title)
+        if kind == "chat":
+            return -index, Chat(id=index, title=title, photo=ChatPhotoEmpty(),
+                                participants_count=100, date=None, version=1)
+        username = f"load_{kind}_{index}" if index % 2 else None
+        return -1_000_000_000_000 - index, Channel(
+            id=index, title=title, photo=ChatPhotoEmpty(), date=None,
+            broadcast=kind == "channel", megagroup=kind == "group", username=username
+        )
+
+    async def rpc(self):
+        """Промах кэша сущностей: запрос к Telegram с задержкой."""
+        if self.rpc_latency > 0 and self.rng.random() < self.entity_miss:
+            await asyncio.sleep(self.rng.expovariate(1 / self.rpc_latency))
+
+    def next_event(self) -> FakeEvent:
+        chat_id, chat = self.rng.choices(self.chats, self.weights)[0]
+        self._message_ids[chat_id] += 1
+        message = FakeMessage(self._message_ids[chat_id], self.rng.choice(self.texts))
+        return FakeEvent(self, chat_id, chat, self.rng.choice(self.senders), message)
+
+
+# ==================== ПРОГОН ====================
+
+def configure(args):
+    """Настроить config до импорта worker (значения по умолчанию берутся из config при импорте)."""
+    if 'worker' in sys.modules:
+        raise RuntimeError("worker уже импортирован — настройки прогона не применятся")
+    workdir = tempfile.mkdtemp(prefix="load-bench-")
+    config.DATABASE_PATH = args.db or os.path.join(workdir, "load.db")
+    config.LEAD_LOG_DIR = os.path.join(workdir, "leads")
+    config.ENTITY_CACHE_DIR = os.path.join(workdir, "entities")
+    config.LEAD_SINKS = args.sinks
+    config.LOG_LEVEL = "INFO" if args.verbose else "WARNING"
+    if args.notify_rate is not None:
+        config.NOTIFY_RATE_PER_MINUTE = args.notify_rate
+    from logsetup import setup_logging
+    setup_logging(args.worker)
+
+
+def seed_database(db, args, notification_chats: List[int]):
+    """Профили, их чаты уведомлений и правила."""
+    from database import DEFAULT_TENANT_ID
+    tenant_ids = [DEFAULT_TENANT_ID]
+    for index in range(2, args.tenants + 1):
+        name = f"Нагрузка {index}"
+        tenant_id = db.add_tenant(name)
+        if tenant_id is None:
+            tenant_id = next(t['id'] for t in db.get_tenants() if t['name'] == name)
+        tenant_ids.append(tenant_id)
+    keywords = generate_rules(args.rules, args.seed)
+    stopwords = generate_rules(args.stopwords, args.seed, stopwords=True)
+    conn = db.get_connection()
+    for position, tenant_id in enumerate(tenant_ids):
+        # У профилей пересекающиеся, но разные наборы ключ-слов
+        offset = position * len(keywords) // (2 * len(tenant_ids))
+        conn.executemany("INSERT OR IGNORE INTO keywords (tenant_id, text) VALUES (?, ?)",
+                         [(tenant_id, text) for text in keywords[offset:] + keywords[:offset // 2]])
+        conn.executemany("INSERT OR IGNORE INTO stopwords (tenant_id, text) VALUES (?, ?)",
+                         [(tenant_id, text) for text in stopwords])
+    conn.commit()
+    conn.close()
+    for tenant_id, chat_id in zip(tenant_ids, notification_chats):
+        db.set_tenant_chat(tenant_id, str(chat_id))
+    db.set_config('working_status', 'true')
+    db.set_config('ignore_duplicates', 'true' if args.dedupe else 'false')
+    db.set_config('digest_enabled', 'true' if args.digest else 'false')
+    db.set_config('morphology_enabled', 'true' if args.lemmas else 'false')
+
+
+async def run(args) -> Dict:
+    """Прогнать нагрузку и собрать отчёт."""
+    configure(args)
+    import worker
+    from metrics import STAGES, stage_order
+
+    notification_chats = [-1_009_000_000_000 - i for i in range(args.tenants)]
+    seed_database(worker.init(), args, notification_chats)
+    load = LoadGenerator(args)
+    bot = FakeBotClient(random.Random(args.seed + 1), args.send_latency, args.flood_rate, args.flood_seconds)
+
+    parser = worker.TelegramParser(args.worker)
+    parser.client = parser.bot_client = bot
+    probe = DatabaseProbe()
+    probe.instrument(worker.db)
+    writers = ExternalWriters(config.DATABASE_PATH, args.writers, args.writer_interval)
+
+    # Задержка лида: от прихода сообщения до подтверждённой отправки
+    arrivals: Dict[Tuple[int, int], float] = {}
+    lead_latency: List[float] = []
+    submit = parser.send_lead_notification
+    confirm = parser._on_notification_sent
+
+    async def send_lead(event: FakeEvent, hits, reason: str = ""):
+        arrivals[(event.chat_id, event.message.id)] = event.received
+        await submit(event, hits, reason)
+
+    def on_sent(row: Dict):
+        received = arrivals.pop((row['chat_id'], row['message_id']), None)
+        if received is not None:
+            lead_latency.append(time.perf_counter() - received)
+        confirm(row)
+    parser.send_lead_notification = send_lead
+    parser._on_notification_sent = on_sent
+
+    handler_latency: List[float] = []
+
+    async def handle(event: FakeEvent):
+        await parser.handle_new_message(event)
+        handler_latency.append(time.perf_counter() - event.received)
+
+    rss: List[int] = []
+
+    async def sample_rss():
+        while True:
+            value = _rss()
+            if value is not None:
+                rss.append(value)
+            await asyncio.sleep(RSS_INTERVAL)
+
+    # Фоновые задачи — как в TelegramParser.start, но без подключения к Telegram
+    parser._outbox_task = asyncio.create_task(parser.deliver_outbox())
+    for sink in parser.sinks:
+        await sink.start()
+    parser._stats_task = asyncio.create_task(parser.flush_stats())
+    parser.loop_monitor.start()
+    rss_task = asyncio.create_task(sample_rss())
+    writers.start()
+
+    print(f"Нагрузка: {args.rate:g} сообщ/с, {args.duration:g} с, чатов {len(load.chats)}, "
+          f"база {config.DATABASE_PATH}", file=sys.stderr)
+    tasks = set()
+    generated = 0
+    started = time.perf_counter()
+    next_at = started
+    deadline = started + args.duration
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(handle(load.next_event()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        generated += 1
+        next_at += load.rng.expovariate(args.rate)
+    generation_time = time.perf_counter() - started
+
+    # Дожидаемся обработчиков и доставки (не дольше --drain секунд)
+    drain_deadline = time.perf_counter() + args.drain
+    while tasks and time.perf_counter() < drain_deadline:
+        await asyncio.sleep(0.05)
+    processing_time = time.perf_counter() - started
+    while time.perf_counter() < drain_deadline:
+        if not worker.db.get_queue_stats()['pending'] and not parser.dispatcher.pending():
+            break
+        await asyncio.sleep(0.2)
+    wall = time.perf_counter() - started
+
+    queue = worker.db.get_queue_stats()
+    unfinished = len(tasks)
+    for task in list(tasks):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    rss_task.cancel()
+    external = writers.stop()
+    db_time = probe.outer
+    await parser.stop()
+
+    stages = {}
+    for stage in stage_order(parser.metrics.histograms):
+        histogram = parser.metrics.histograms[stage]
+        stages[stage] = {
+            'label': STAGES.get(stage, stage),
+            'count': histogram.count,
+            'p50_ms': round(histogram.quantile(0.5) * 1000, 3),
+            'p99_ms': round(histogram.quantile(0.99) * 1000, 3),
+        }
+
+    return {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'created_at': int(time.time()),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose')},
+        'throughput': {
+            'generated': generated,
+            'offered_per_sec': round(generated / generation_time, 1),
+            'handled': len(handler_latency),
+            'handled_per_sec': round(len(handler_latency) / processing_time, 1),
+            'unfinished_handlers': unfinished,
+            'wall_seconds': round(wall, 2),
+        },
+        'handler_latency': _percentiles(handler_latency),
+        'lead_latency': _percentiles(lead_latency),
+        'counters': dict(parser.counters),
+        'notifications': {
+            'sent': bot.sent,
+            'flood_waits': bot.flood_waits,
+            'per_chat': {str(chat): count for chat, count in bot.per_chat.items()},
+            'queue_pending': queue['pending'],
+            'queue_failed': queue['failed'],
+            'queue_oldest_age': round(queue['oldest_age'], 1),
+        },
+        'stages': stages,
+        'loop': {'slow_callbacks': parser.loop_monitor.slow_callbacks},
+        'sqlite': {
+            'loop_share': round(db_time / wall, 4),
+            'locked': sum(probe.locked.values()),
+            'methods': probe.report(),
+            'external_writers': external,
+        },
+        'memory': {
+            'rss_start_mb': round(rss[0] / 2 ** 20, 1) if rss else None,
+            'rss_end_mb': round(rss[-1] / 2 ** 20, 1) if rss else None,
+            'rss_peak_mb': round(max(rss) / 2 ** 20, 1) if rss else None,
+        },
+    }
+
+
+def summary(result: Dict) -> str:
+    """Короткая сводка для терминала."""
+    throughput = result['throughput']
+    handler = result['handler_latency']
+    lead = result['lead_latency']
+    notifications = result['notifications']
+    sqlite = result['sqlite']
+    memory = result['memory']
+    lines = [
+        f"Сообщений: {throughput['generated']} ({throughput['offered_per_sec']} сообщ/с), "
+        f"обработано {throughput['handled']} ({throughput['handled_per_sec']} сообщ/с), "
+        f"не завершено {throughput['unfinished_handlers']}",
+        f"Обработчик: p50 {handler.get('p50_ms')} мс, p99 {handler.get('p99_ms')} мс, max {handler.get('max_ms')} мс",
+        f"Лиды: {result['counters'].get('leads', 0)}, отправлено {notifications['sent']}, "
+        f"FloodWait {notifications['flood_waits']}, в очереди {notifications['queue_pending']}; "
+        f"от прихода до отправки p50 {lead.get('p50_ms')} мс, p99 {lead.get('p99_ms')} мс",
+        f"SQLite: {sqlite['loop_share'] * 100:.1f}% времени цикла, «database is locked»: {sqlite['locked']} "
+        f"(сторонние писатели: {sqlite['external_writers']['locked']})",
+    ]
+    for name, item in list(sqlite['methods'].items())[:5]:
+        lines.append(f"  {name}: {item['count']} вызовов, {item['total_ms']} мс, p99 {item['p99_ms']} мс")
+    lines.append("Этапы (p50 / p99, мс):")
+    for stage, item in result['stages'].items():
+        lines.append(f"  {item['label']}: {item['p50_ms']} / {item['p99_ms']}")
+    lines.append(f"Медленные шаги цикла: {result['loop']['slow_callbacks']}; "
+                 f"RSS: {memory['rss_start_mb']} → {memory['rss_end_mb']} МБ (пик {memory['rss_peak_mb']})")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон воркера без Telegram")
+    parser.add_argument("--rate", type=float, default=100, help="сообщений в секунду")
+    parser.add_argument("--duration", type=float, default=30, help="длительность нагрузки, секунды")
+    parser.add_argument("--drain", type=float, default=30,
+                        help="сколько ждать обработки и доставки после нагрузки, секунды")
+    parser.add_argument("--chats", type=parse_chats, default=parse_chats("group=60,channel=20,chat=10,private=10"),
+                        help="виды и число чатов: group=60,channel=20,chat=10,private=10")
+    parser.add_argument("--senders", type=int, default=2000, help="число авторов")
+    parser.add_argument("--bot-share", type=float, default=0.02, help="доля авторов-ботов")
+    parser.add_argument("--rules", type=int, default=1000, help="ключ-слов на профиль")
+    parser.add_argument("--stopwords", type=int, default=100, help="стоп-слов на профиль")
+    parser.add_argument("--tenants", type=int, default=1, help="число профилей")
+    parser.add_argument("--lemmas", action="store_true", help="режим лемм (pymorphy2)")
+    parser.add_argument("--no-dedupe", dest="dedupe", action="store_false", help="не проверять дубли")
+    parser.add_argument("--digest", action="store_true", help="сводка при всплеске")
+    parser.add_argument("--rpc-latency", type=float, default=0.05,
+                        help="средняя задержка запроса сущности к Telegram, секунды")
+    parser.add_argument("--entity-miss", type=float, default=0.05,
+                        help="вероятность промаха кэша сущностей на get_sender/get_chat")
+    parser.add_argument("--send-latency", type=float, default=0.1, help="средняя задержка отправки, секунды")
+    parser.add_argument("--flood-rate", type=float, default=0.01, help="вероятность FloodWait на отправке")
+    parser.add_argument("--flood-seconds", type=int, default=3, help="длительность FloodWait, секунды")
+    parser.add_argument("--notify-rate", type=float,
+                        help="лимит уведомлений в минуту на чат (по умолчанию NOTIFY_RATE_PER_MINUTE)")
+    parser.add_argument("--sinks", type=lambda s: [x.strip() for x in s.split(",") if x.strip()],
+                        default=["telegram"], help="приёмники лидов (как LEAD_SINKS)")
+    parser.add_argument("--writers", type=int, default=0, help="сторонних потоков-писателей в базу")
+    parser.add_argument("--writer-interval", type=float, default=0.05,
+                        help="пауза между записями писателя, секунды")
+    parser.add_argument("--db", help="файл базы (по умолчанию — во временном каталоге)")
+    parser.add_argument("--worker", default="load-bench", help="имя воркера")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию — в stdout)")
+    parser.add_argument("--verbose", action="store_true", help="логи воркера уровня INFO")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    print(summary(result), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Исходный движок фильтрации на регексах (MessageFilter до появления matcher).
+
+Правила и логика перенесены без изменений: для каждого правила строится
+регекс по буквальным правилам (приставки глаголов, окончания
+прилагательных и существительных), «+» — все части, _слово_ — строгое
+слово. Регексы компилируются один раз при создании движка, а текст
+сворачивается так же, как в новом движке (normalizer.fold_text), —
+сверка сравнивает именно сопоставление правил, а не нормализацию.
+"""
+
+import re
+from typing import List, Optional
+
+import matcher
+from normalizer import fold_text
+
+
+def build_keyword_pattern(raw_keyword: str) -> re.Pattern:
+    """Построить регекс по буквальным правилам (без морфологии)."""
+    k = raw_keyword.strip()
+    pos = matcher.detect_pos_simple(k)
+    if pos == "verb":
+        # Разрешаем приставки, но запрещаем иные окончания/изменения
+        prefixes = "|".join(sorted(matcher.VERB_PREFIXES, key=len, reverse=True))
+        prefix_group = f"(?:{prefixes})?" if prefixes else ""
+        return re.compile(rf"(?i)\b{prefix_group}{re.escape(k)}\b")
+    if pos == "adj":
+        base = k
+        for suf in matcher.ADJ_BASE_SUFFIXES:
+            if k.endswith(suf):
+                base = k[: -len(suf)]
+                break
+        endings = "|".join(matcher.ADJ_ALLOWED_ENDINGS)
+        return re.compile(rf"(?i)\b{re.escape(base)}(?:{endings})\b")
+    if pos == "adv":
+        return re.compile(rf"(?i)\b{re.escape(k)}\b")
+    # Существительное по умолчанию
+    endings = "|".join(matcher.NOUN_ALLOWED_ENDINGS)
+    return re.compile(rf"(?i)\b{re.escape(k)}(?:{endings})?\b")
+
+
+def compile_rule(keyword: str) -> List[re.Pattern]:
+    """Регексы правила: все должны найтись в тексте (пустой список — правило не срабатывает)."""
+    keyword = fold_text(keyword).strip()
+    if '+' in keyword:
+        words = [w.strip() for w in keyword.split('+') if w.strip()]
+        patterns = [compile_rule(w) for w in words]
+        if not words or not all(patterns):
+            return []
+        return [pattern for part in patterns for pattern in part]
+    if keyword.startswith('_') and keyword.endswith('_'):
+        word = keyword[1:-1].strip()
+        if not word:
+            return []
+        return [re.compile(rf"(?i)\b{re.escape(word)}\b")]
+    if not keyword:
+        return []
+    return [build_keyword_pattern(keyword)]
+
+
+class RegexEngine:
+    """Набор правил на регексах с интерфейсом matcher.RuleMatcher (first_match / matches)."""
+
+    def __init__(self, rules: List[str]):
+        self.rules = list(rules)
+        self._compiled = [(rule, compile_rule(rule)) for rule in self.rules]
+
+    def _fired(self, text: str):
+        folded = fold_text(text)
+        for rule, patterns in self._compiled:
+            if patterns and all(pattern.search(folded) for pattern in patterns):
+                yield rule
+
+    def first_match(self, text: str) -> Optional[str]:
+        """Первое сработавшее правило или None."""
+        return next(self._fired(text), None)
+
+    def matches(self, text: str) -> List[str]:
+        """Все сработавшие правила."""
+        return list(self._fired(text))
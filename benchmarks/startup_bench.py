@@ -0,0 +1,364 @@
+"""
+Бенчмарк запуска: время импорта модулей и время до первого обработанного сообщения.
+
+Два замера:
+
+- импорт: каждый модуль (--modules) импортируется в свежем интерпретаторе
+  --repeat раз; в отчёте медиана и минимум, а также какие тяжёлые
+  зависимости (Telethon, aiogram, aiohttp, pymorphy2) загрузил импорт;
+- запуск воркеров: родитель, как run.py, запускает --workers процессов.
+  Каждый импортирует worker, создаёт TelegramParser (открывает базу) и
+  проходит настоящий TelegramParser.start: загрузка Telethon при
+  подключении клиента, кэш сущностей, морфология (--lemmas), источники,
+  регистрация обработчика. Вместо сети — заглушка клиента: как только
+  обработчик зарегистрирован, она передаёт ему одно сообщение с
+  ключ-словом, и замер заканчивается, когда обработчик вернулся (лид
+  поставлен в очередь). По каждому воркеру — время от Process.start до
+  первого обработанного сообщения и его составляющие.
+
+--preload импортирует bot и worker в родителе до запуска процессов — так
+запускал процессы прежний run.py; сравнение двух прогонов показывает,
+сколько стоит ленивая загрузка в дочерних процессах. База и кэши
+создаются во временном каталоге, рабочая parser.db не затрагивается.
+
+    python -m benchmarks.startup_bench --workers 4 --output startup.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.filter_bench import git_commit
+
+# Формат JSON с результатами (увеличивать при несовместимых изменениях)
+RESULTS_VERSION = 1
+DEFAULT_MODULES = ["config", "database", "ruleset", "worker", "bot", "api", "backtest", "run"]
+# Тяжёлые зависимости, которые отмечаются в отчёте об импорте
+HEAVY_MODULES = ("telethon", "aiogram", "aiohttp", "pymorphy2")
+# Чат и сообщение первого события (в тексте есть ключ-слово FIRST_KEYWORD)
+FIRST_CHAT_ID = -1_000_000_000_001
+FIRST_TEXT = "Куплю айфон недорого, пишите в личку"
+FIRST_KEYWORD = "айфон"
+# Замер импорта в свежем интерпретаторе: время и загруженные тяжёлые зависимости
+IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "__import__(sys.argv[1])\n"
+    "elapsed = time.perf_counter() - started\n"
+    "heavy = sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[2].split(',')))\n"
+    "print(json.dumps({'seconds': elapsed, 'heavy': heavy}))\n"
+)
+
+
+# ==================== ИМПОРТ ====================
+
+def measure_import(module: str, repeat: int, env: Dict[str, str]) -> Dict:
+    """Импортировать модуль в свежем интерпретаторе repeat раз."""
+    samples = []
+    heavy: List[str] = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE, module, ",".join(HEAVY_MODULES)],
+            capture_output=True, text=True, env=env,
+        )
+        if completed.returncode != 0:
+            error = (completed.stderr.strip().splitlines() or ["?"])[-1]
+            return {'error': error}
+        probe = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(probe['seconds'])
+        heavy = probe['heavy']
+    return {
+        'median_ms': round(statistics.median(samples) * 1000, 1),
+        'min_ms': round(min(samples) * 1000, 1),
+        'heavy': heavy,
+    }
+
+
+# ==================== ЗАПУСК ВОРКЕРА ====================
+
+class FakeMessage:
+    """Сообщение с полями, которые читает воркер."""
+
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.text = text
+        self.date = datetime.now(timezone.utc)
+
+
+class FakeEvent:
+    """Событие NewMessage из супергруппы."""
+
+    def __init__(self, chat, sender, message: FakeMessage):
+        self.chat_id = FIRST_CHAT_ID
+        self.sender_id = sender.id
+        self.message = message
+        self._chat = chat
+        self._sender = sender
+
+    async def get_sender(self):
+        return self._sender
+
+    async def get_chat(self):
+        return self._chat
+
+
+class FakeClient:
+    """Клиент Telethon без сети: передаёт обработчику одно сообщение и «отключается»."""
+
+    def __init__(self):
+        self.handler = None
+        self.handled_at: Optional[float] = None
+        self.registered_at: Optional[float] = None
+
+    def on(self, event_builder):
+        def register(handler):
+            self.handler = handler
+            return handler
+        return register
+
+    async def run_until_disconnected(self):
+        from telethon.tl.types import Channel, ChatPhotoEmpty, User
+        self.registered_at = time.monotonic()
+        chat = Channel(id=1, title="Запуск", photo=ChatPhotoEmpty(), date=None, megagroup=True)
+        sender = User(id=10_001, first_name="user")
+        await self.handler(FakeEvent(chat, sender, FakeMessage(1, FIRST_TEXT)))
+        self.handled_at = time.monotonic()
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        pass
+
+    async def iter_dialogs(self):
+        return
+        yield
+
+    async def iter_messages(self, *args, **kwargs):
+        return
+        yield
+
+    async def disconnect(self):
+        pass
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def run_worker(name: str, settings: Dict, spawned_at: float, results):
+    """
+    Дочерний процесс: запуск воркера до первого обработанного сообщения.
+
+    Время между процессами сравнивается по time.monotonic (общие часы системы).
+    """
+    entered = time.monotonic()
+    import config
+    for key, value in settings.items():
+        setattr(config, key, value)
+    from logsetup import setup_logging
+    setup_logging(name, "WARNING")
+
+    started = time.monotonic()
+    import worker
+    imported = time.monotonic()
+    parser = worker.TelegramParser(name)
+    created = time.monotonic()
+
+    client = FakeClient()
+    telethon = {}
+
+    async def init_client():
+        # Как TelegramParser.init_client, но без подключения: Telethon грузится здесь
+        loading = time.monotonic()
+        from telethon import TelegramClient  # noqa: F401
+        telethon['ms'] = (time.monotonic() - loading) * 1000
+        parser.client = parser.bot_client = client
+    parser.init_client = init_client
+
+    async def first_message():
+        try:
+            await parser.start()
+        finally:
+            await parser.stop()
+
+    error = None
+    try:
+        asyncio.run(first_message())
+    except Exception as e:
+        error = str(e)
+    ms = lambda seconds: round(seconds * 1000, 1)
+    results.put({
+        'worker': name,
+        'error': error,
+        'spawn_ms': ms(entered - spawned_at),
+        'import_ms': ms(imported - started),
+        'init_ms': ms(created - imported),
+        'telethon_ms': round(telethon.get('ms', 0.0), 1),
+        'start_ms': ms(client.registered_at - created) if client.registered_at else None,
+        'first_message_ms': ms(client.handled_at - client.registered_at) if client.handled_at else None,
+        'total_ms': ms(client.handled_at - spawned_at) if client.handled_at else None,
+        'leads': parser.counters.get('leads', 0),
+        'rss_mb': _rss_mb(),
+    })
+
+
+def prepare_database(path: str, rules: int, lemmas: bool, seed: int):
+    """База с ключ-словами первого сообщения и чатом уведомлений профиля по умолчанию."""
+    import sqlite3
+    from benchmarks.corpus import generate_rules
+    from database import DEFAULT_TENANT_ID, Database
+    db = Database(path)
+    conn = sqlite3.connect(path)
+    keywords = [FIRST_KEYWORD] + generate_rules(rules, seed)
+    conn.executemany("INSERT OR IGNORE INTO keywords (tenant_id, text) VALUES (?, ?)",
+                     [(DEFAULT_TENANT_ID, text) for text in keywords])
+    conn.commit()
+    conn.close()
+    db.set_tenant_chat(DEFAULT_TENANT_ID, "-1009000000000")
+    db.set_config('working_status', 'true')
+    db.set_config('groups_enabled', 'true')
+    # Каждый воркер получает то же сообщение — дубли между воркерами не отбрасываются
+    db.set_config('ignore_duplicates', 'false')
+    db.set_config('morphology_enabled', 'true' if lemmas else 'false')
+
+
+def run_workers(args, workdir: str) -> Tuple[float, List[Dict]]:
+    """Запустить воркеры, как run.py, и собрать замеры (и время импорта в родителе, мс)."""
+    settings = {
+        'DATABASE_PATH': os.path.join(workdir, "startup.db"),
+        'ENTITY_CACHE_DIR': os.path.join(workdir, "entities"),
+        'LEAD_LOG_DIR': os.path.join(workdir, "leads"),
+        'LEAD_SINKS': ["telegram"],
+        'LOG_DIR': "",
+    }
+    prepare_database(settings['DATABASE_PATH'], args.rules, args.lemmas, args.seed)
+    preload_started = time.monotonic()
+    if args.preload:
+        import bot  # noqa: F401
+        import worker  # noqa: F401
+        import telethon  # noqa: F401
+    preload_ms = round((time.monotonic() - preload_started) * 1000, 1)
+
+    results = multiprocessing.Queue()
+    processes = []
+    for index in range(args.workers):
+        process = multiprocessing.Process(
+            target=run_worker, args=(f"startup-{index + 1}", settings, time.monotonic(), results), daemon=True
+        )
+        process.start()
+        processes.append(process)
+    collected = [results.get(timeout=args.timeout) for _ in processes]
+    for process in processes:
+        process.join()
+    return preload_ms, sorted(collected, key=lambda item: item['worker'])
+
+
+# ==================== ОТЧЁТ ====================
+
+def run(args) -> Dict:
+    """Замерить импорт модулей и запуск воркеров."""
+    workdir = tempfile.mkdtemp(prefix="startup-bench-")
+    # Импорт не должен трогать рабочую базу
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "import.db"), LOG_LEVEL="WARNING")
+    imports = {module: measure_import(module, args.repeat, env) for module in args.modules}
+    print(f"Импорт замерен, запуск воркеров: {args.workers}, база {workdir}", file=sys.stderr)
+    preload_ms, workers = run_workers(args, workdir)
+    totals = [item['total_ms'] for item in workers if item['total_ms'] is not None]
+    return {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'created_at': int(time.time()),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'imports': imports,
+        'workers': workers,
+        'first_message': {
+            # Воркеры запускаются после импорта в родителе: с --preload он входит в время до первого сообщения
+            'preload_ms': preload_ms,
+            'median_ms': round(statistics.median(totals), 1) if totals else None,
+            'max_ms': round(max(totals), 1) if totals else None,
+        },
+    }
+
+
+def compare(old: Dict, new: Dict) -> str:
+    """Изменения времени импорта и запуска относительно прошлого запуска."""
+    lines = [f"Сравнение с {old.get('commit') or '?'} → {new.get('commit') or '?'}"]
+    if old.get('params') != new.get('params'):
+        lines.append("Внимание: параметры запуска отличаются — цифры несравнимы")
+    for module, item in new['imports'].items():
+        before = old.get('imports', {}).get(module, {})
+        if before.get('median_ms') and item.get('median_ms') is not None:
+            lines.append(f"import {module:10} {before['median_ms']:>8.1f} → {item['median_ms']:>8.1f} мс")
+    before, after = old.get('first_message', {}), new['first_message']
+    if before.get('median_ms') and after['median_ms'] is not None:
+        lines.append(f"первое сообщение (медиана) {before['median_ms']:.1f} → {after['median_ms']:.1f} мс")
+    return "\n".join(lines)
+
+
+def summary(result: Dict) -> str:
+    """Таблицы для терминала."""
+    lines = [f"{'модуль':10} {'медиана мс':>11} {'мин мс':>9}  зависимости"]
+    for module, item in result['imports'].items():
+        if 'error' in item:
+            lines.append(f"{module:10} ошибка: {item['error']}")
+            continue
+        lines.append(f"{module:10} {item['median_ms']:>11.1f} {item['min_ms']:>9.1f}  {', '.join(item['heavy']) or '—'}")
+    lines.append("")
+    lines.append(f"{'воркер':11} {'процесс':>8} {'импорт':>8} {'база':>7} {'telethon':>9} "
+                 f"{'start':>7} {'1-е сообщ':>10} {'итого мс':>9} {'RSS МБ':>7}")
+    for item in result['workers']:
+        if item['error']:
+            lines.append(f"{item['worker']:11} ошибка: {item['error']}")
+            continue
+        lines.append(f"{item['worker']:11} {item['spawn_ms']:>8.1f} {item['import_ms']:>8.1f} {item['init_ms']:>7.1f} "
+                     f"{item['telethon_ms']:>9.1f} {item['start_ms']:>7.1f} {item['first_message_ms']:>10.1f} "
+                     f"{item['total_ms']:>9.1f} {item['rss_mb'] or 0:>7.1f}")
+    first = result['first_message']
+    lines.append(f"Импорт в родителе до запуска процессов: {first['preload_ms']} мс; "
+                 f"первое сообщение: медиана {first['median_ms']} мс, максимум {first['max_ms']} мс")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Время импорта модулей и запуска воркеров до первого сообщения")
+    parser.add_argument("--modules", type=lambda s: [x.strip() for x in s.split(",") if x.strip()],
+                        default=DEFAULT_MODULES, help="модули для замера импорта (через запятую)")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов импорта каждого модуля")
+    parser.add_argument("--workers", type=int, default=2, help="процессов воркеров")
+    parser.add_argument("--rules", type=int, default=1000, help="ключ-слов в профиле")
+    parser.add_argument("--lemmas", action="store_true", help="режим лемм (загрузка pymorphy2 при запуске)")
+    parser.add_argument("--preload", action="store_true",
+                        help="импортировать bot и worker в родителе до запуска процессов (как прежний run.py)")
+    parser.add_argument("--timeout", type=float, default=120, help="сколько ждать воркер, секунды")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию — в stdout)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    print(summary(result), file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), result), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
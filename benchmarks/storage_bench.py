@@ -0,0 +1,304 @@
+"""
+Бенчмарк хранилища: методы Database под нагрузкой из нескольких процессов.
+
+Бот и воркеры — отдельные процессы с одной базой SQLite, и блокировки
+между ними видны только при настоящей параллельной работе. Бенчмарк
+заполняет историю лидов (logs) на --rows строк (от 10 тыс. до 10 млн,
+с датами за последние 30 дней), затем запускает --readers процессов-
+читателей и --writers процессов-писателей, которые одновременно в
+течение --duration секунд вызывают настоящие методы Database:
+
+- читатели (как воркер на каждое сообщение): get_all_config,
+  is_blacklisted, check_duplicate (по отпечатку, часть — с попаданием);
+- писатели: add_log (запись лида с почасовой статистикой),
+  keyword_edit (пачка add_keyword и remove_keyword, как правка списка
+  в боте — каждое слово отдельной транзакцией), set_config.
+
+По каждой операции — операций в секунду, p50/p95/p99/max и доля
+ошибок «database is locked» (Database ждёт блокировку стандартные
+5 секунд sqlite3, затем бросает OperationalError). Результаты — JSON
+с коммитом, --compare показывает изменения относительно прошлого запуска.
+
+    python -m benchmarks.storage_bench --rows 1000000 --readers 4 --writers 2 --output storage.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.filter_bench import git_commit
+
+# Формат JSON с результатами (увеличивать при несовместимых изменениях)
+RESULTS_VERSION = 1
+# Операции по ролям: операция → вес
+READ_OPS = {'get_all_config': 4, 'is_blacklisted': 3, 'check_duplicate': 3}
+WRITE_OPS = {'add_log': 8, 'keyword_edit': 1, 'set_config': 1}
+# Размеры заполняемых таблиц (кроме logs)
+BLACKLIST_ROWS = 10_000
+KEYWORD_ROWS = 1_000
+# Сколько слов в одной правке списка ключ-слов
+KEYWORD_BATCH = 20
+# Отпечатки, которые читатели ищут с попаданием (лежат в истории за последние сутки)
+HOT_FINGERPRINTS = 1_000
+PREFILL_CHUNK = 50_000
+LOCKED_MESSAGE = "locked"
+
+
+def _fingerprint(n: int) -> str:
+    # Формат как у NormalizedText.fingerprint (sha1 в hex), но без хэширования текста
+    return f"{n:040x}"
+
+
+def prefill(path: str, rows: int, seed: int):
+    """Создать базу со схемой Database и заполнить историю лидов, чёрный список и ключ-слова."""
+    from database import DEFAULT_TENANT_ID, Database
+    Database(path)
+    conn = sqlite3.connect(path)
+    existing = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    if existing >= rows:
+        conn.close()
+        return existing
+    rng = random.Random(seed)
+    now = time.time()
+    # Заполнение — не часть замера: без ожидания записи на диск
+    conn.execute("PRAGMA synchronous = OFF")
+    started = time.perf_counter()
+    for offset in range(existing, rows, PREFILL_CHUNK):
+        batch = []
+        for n in range(offset, min(rows, offset + PREFILL_CHUNK)):
+            # Первые HOT_FINGERPRINTS строк — за последние сутки, остальные — за 30 дней
+            age = rng.uniform(0, 20 * 3600) if n < HOT_FINGERPRINTS else rng.uniform(0, 30 * 86400)
+            batch.append((
+                f"Чат {n % 500}", n, f"Синтетический лид {n}: куплю айфон недорого",
+                100_000 + n % 50_000, -1_000_000_000_000 - n % 500, _fingerprint(n),
+                DEFAULT_TENANT_ID, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - age)),
+            ))
+        conn.executemany("""
+            INSERT INTO logs (source_chat, message_id, text, user_id, chat_id, fingerprint, tenant_id, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, batch)
+        conn.commit()
+        print(f"\rЗаполнение logs: {min(rows, offset + PREFILL_CHUNK)}/{rows}", end="", file=sys.stderr)
+    conn.executemany("INSERT OR IGNORE INTO blacklist (tenant_id, user_id) VALUES (?, ?)",
+                     [(DEFAULT_TENANT_ID, 100_000 + n * 5) for n in range(BLACKLIST_ROWS)])
+    conn.executemany("INSERT OR IGNORE INTO keywords (tenant_id, text) VALUES (?, ?)",
+                     [(DEFAULT_TENANT_ID, f"слово{n}") for n in range(KEYWORD_ROWS)])
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"\rЗаполнение logs: {rows} строк за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    return rows
+
+
+def _operations(db, rng: random.Random, role: str, index: int, rows: int):
+    """Операции процесса: имя → функция без аргументов."""
+    counter = iter(range(10 ** 12))
+    user_ids = lambda: 100_000 + rng.randrange(50_000)
+
+    def check_duplicate():
+        # Половина проверок находит дубль среди свежих лидов, половина — нет
+        if rng.random() < 0.5:
+            fingerprint = _fingerprint(rng.randrange(min(rows, HOT_FINGERPRINTS)))
+        else:
+            fingerprint = _fingerprint(10 ** 15 + rng.randrange(10 ** 9))
+        db.check_duplicate("", fingerprint=fingerprint, tenant_id=1)
+
+    def add_log():
+        n = next(counter)
+        db.add_log(f"Чат {n % 500}", n, f"Лид {role}-{index}-{n}", user_ids(),
+                   -1_000_000_000_000 - n % 500, _fingerprint(10 ** 14 + index * 10 ** 10 + n))
+
+    def keyword_edit():
+        words = [f"правка{index}-{next(counter)}" for _ in range(KEYWORD_BATCH)]
+        for word in words:
+            db.add_keyword(word)
+        for word in words:
+            db.remove_keyword(word)
+
+    ops = {
+        'get_all_config': db.get_all_config,
+        'is_blacklisted': lambda: db.is_blacklisted(user_ids()),
+        'check_duplicate': check_duplicate,
+        'add_log': add_log,
+        'keyword_edit': keyword_edit,
+        'set_config': lambda: db.set_config('storage_bench', str(next(counter))),
+    }
+    weights = READ_OPS if role == 'reader' else WRITE_OPS
+    return {name: ops[name] for name in weights}, weights
+
+
+def run_process(path: str, role: str, index: int, rows: int, duration: float, think: float,
+                seed: int, start, results):
+    """Процесс нагрузки: вызывать операции роли до истечения duration."""
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('database').setLevel(logging.ERROR)
+    from database import Database
+    db = Database(path)
+    rng = random.Random(seed * 1000 + index)
+    ops, weights = _operations(db, rng, role, index, rows)
+    names = list(ops)
+    timings: Dict[str, List[float]] = {name: [] for name in names}
+    locked = dict.fromkeys(names, 0)
+    errors = dict.fromkeys(names, 0)
+    start.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, [weights[n] for n in names])[0]
+        started = time.perf_counter()
+        try:
+            ops[name]()
+        except sqlite3.OperationalError as e:
+            if LOCKED_MESSAGE in str(e):
+                locked[name] += 1
+            else:
+                errors[name] += 1
+        except Exception:
+            errors[name] += 1
+        timings[name].append(time.perf_counter() - started)
+        if think > 0:
+            time.sleep(think)
+    results.put({'role': role, 'index': index, 'timings': timings, 'locked': locked, 'errors': errors})
+
+
+def _summarize(timings: List[float], locked: int, errors: int, duration: float) -> Dict:
+    timings = sorted(timings)
+    pick = lambda q: timings[min(len(timings) - 1, int(q * len(timings)))] * 1000 if timings else 0.0
+    return {
+        'ops': len(timings),
+        'ops_per_sec': round(len(timings) / duration, 1),
+        'p50_ms': round(pick(0.5), 3),
+        'p95_ms': round(pick(0.95), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(pick(1.0), 3),
+        'locked': locked,
+        'locked_rate': round(locked / len(timings), 5) if timings else 0.0,
+        'errors': errors,
+    }
+
+
+def run(args) -> Dict:
+    """Заполнить базу, запустить процессы нагрузки и собрать отчёт."""
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="storage-bench-"), "storage.db")
+    rows = prefill(path, args.rows, args.seed)
+    conn = sqlite3.connect(path)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    processes = []
+    roles = [('reader', i) for i in range(args.readers)] + [('writer', i) for i in range(args.writers)]
+    for role, index in roles:
+        process = context.Process(
+            target=run_process,
+            args=(path, role, index, rows, args.duration, args.think / 1000, args.seed, start, results),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    # Процессы стартуют одновременно, когда все импортировали модули и открыли базу
+    time.sleep(1.0)
+    print(f"Нагрузка: читателей {args.readers}, писателей {args.writers}, {args.duration:g} с, "
+          f"база {path} ({rows} строк logs, journal_mode={journal_mode})", file=sys.stderr)
+    start.set()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    operations: Dict[str, Dict] = {}
+    by_role: Dict[str, Dict] = {}
+    for role in ('reader', 'writer'):
+        merged: Dict[str, List[float]] = {}
+        locked: Dict[str, int] = {}
+        errors: Dict[str, int] = {}
+        for item in collected:
+            if item['role'] != role:
+                continue
+            for name, values in item['timings'].items():
+                merged.setdefault(name, []).extend(values)
+                locked[name] = locked.get(name, 0) + item['locked'][name]
+                errors[name] = errors.get(name, 0) + item['errors'][name]
+        for name, values in merged.items():
+            operations[name] = {'role': role, **_summarize(values, locked[name], errors[name], args.duration)}
+        if merged:
+            by_role[role] = _summarize([v for values in merged.values() for v in values],
+                                       sum(locked.values()), sum(errors.values()), args.duration)
+
+    return {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'created_at': int(time.time()),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'db')},
+        'database': {
+            'rows': rows,
+            'size_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+            'journal_mode': journal_mode,
+        },
+        'roles': by_role,
+        'operations': operations,
+    }
+
+
+def compare(old: Dict, new: Dict) -> str:
+    """Изменения операций в секунду, p99 и ошибок блокировки относительно прошлого запуска."""
+    lines = [f"Сравнение с {old.get('commit') or '?'} → {new.get('commit') or '?'}"]
+    if old.get('params') != new.get('params'):
+        lines.append("Внимание: параметры запуска отличаются — цифры несравнимы")
+    for name, item in new['operations'].items():
+        before = old.get('operations', {}).get(name)
+        if not before or not before['ops_per_sec']:
+            continue
+        speed = (item['ops_per_sec'] / before['ops_per_sec'] - 1) * 100
+        p99 = (item['p99_ms'] / before['p99_ms'] - 1) * 100 if before['p99_ms'] else 0.0
+        lines.append(f"{name:16} оп/с {speed:+7.1f}%  p99 {p99:+7.1f}%  "
+                     f"locked {before['locked']} → {item['locked']}")
+    return "\n".join(lines)
+
+
+def summary(result: Dict) -> str:
+    """Таблица для терминала."""
+    lines = [f"{'операция':16} {'оп/с':>9} {'p50 мс':>9} {'p99 мс':>9} {'max мс':>9} {'locked':>7}"]
+    for name, item in result['operations'].items():
+        lines.append(f"{name:16} {item['ops_per_sec']:>9.1f} {item['p50_ms']:>9.2f} {item['p99_ms']:>9.2f} "
+                     f"{item['max_ms']:>9.1f} {item['locked']:>7}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк Database под нагрузкой из нескольких процессов")
+    parser.add_argument("--rows", type=int, default=100_000, help="строк в истории лидов (logs)")
+    parser.add_argument("--readers", type=int, default=4, help="процессов-читателей (как воркеры)")
+    parser.add_argument("--writers", type=int, default=1, help="процессов-писателей (лиды, правки бота)")
+    parser.add_argument("--duration", type=float, default=20, help="длительность нагрузки, секунды")
+    parser.add_argument("--think", type=float, default=0, help="пауза между операциями процесса, мс")
+    parser.add_argument("--db", help="файл базы (переиспользуется, если строк уже достаточно)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию — в stdout)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    payload = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    print(summary(result), file=sys.stderr)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), result), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,33 +4,43 @@ Telegram бот - админ-панель для управления парсе
 """
 
 import asyncio
+import html
 import logging
+import time
 from typing import Optional
 
 from aiogram import Bot, Dispatcher, F, Router
-from aiogram.filters import Command, StateFilter
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import BufferedInputFile, Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
 import config
-from database import Database
+from database import Database, DEFAULT_TENANT_ID
 from accounts import AccountStore
+from loopmon import LoopMonitor
+from metrics import QUANTILES, STAGES, Metrics, load_histograms
+from profiler import PROFILE_KINDS
 
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# Инициализация
-db = Database(config.DATABASE_PATH)
-bot = Bot(token=config.BOT_TOKEN)
+# База и клиент бота открываются в init(), а не при импорте
+db: Optional[Database] = None
+bot: Optional[Bot] = None
 dp = Dispatcher()
 router = Router()
 
 
+def init():
+    """Открыть базу данных и создать клиент бота (повторный вызов ничего не делает)."""
+    global db, bot
+    if db is None:
+        db = Database(config.DATABASE_PATH)
+    if bot is None:
+        bot = Bot(token=config.BOT_TOKEN)
+
+
 # ==================== СОСТОЯНИЯ ====================
 
 class Form(StatesGroup):
@@ -39,25 +49,83 @@ class Form(StatesGroup):
     waiting_stopword = State()
     waiting_blacklist_id = State()
     waiting_chat_id = State()
+    waiting_tenant_name = State()
+    waiting_tenant_admins = State()
+    waiting_source_include = State()
+    waiting_source_exclude = State()
+    waiting_explain_text = State()
+
+
+# ==================== ПРОФИЛИ (ТЕНАНТЫ) ====================
+
+def is_superadmin(user_id: int) -> bool:
+    """Суперадмин управляет всеми профилями (если ADMIN_IDS не задан — все пользователи)."""
+    return not config.ADMIN_IDS or user_id in config.ADMIN_IDS
+
+
+def available_tenants(user_id: int) -> list:
+    """Профили, которыми может управлять пользователь."""
+    if is_superadmin(user_id):
+        return db.get_tenants()
+    return db.get_user_tenants(user_id)
+
+
+def current_tenant(user_id: int) -> Optional[dict]:
+    """Текущий выбранный профиль пользователя (по умолчанию — первый доступный)."""
+    tenants = available_tenants(user_id)
+    if not tenants:
+        return None
+    saved = db.get_config(f"current_tenant:{user_id}")
+    for tenant in tenants:
+        if str(tenant['id']) == saved:
+            return tenant
+    return tenants[0]
+
+
+def current_tenant_id(user_id: int) -> Optional[int]:
+    """ID текущего профиля пользователя."""
+    tenant = current_tenant(user_id)
+    return tenant['id'] if tenant else None
+
+
+async def tenant_or_deny(event) -> Optional[int]:
+    """ID текущего профиля; если профилей нет — ответить отказом и вернуть None."""
+    tenant_id = current_tenant_id(event.from_user.id)
+    if tenant_id is None:
+        if isinstance(event, CallbackQuery):
+            await event.answer("❌ Нет доступа ни к одному профилю", show_alert=True)
+        else:
+            await event.answer("❌ Нет доступа ни к одному профилю")
+    return tenant_id
+
+
+async def superadmin_or_deny(callback: CallbackQuery) -> bool:
+    """Общие настройки (для всех профилей) меняет только суперадмин."""
+    if is_superadmin(callback.from_user.id):
+        return True
+    await callback.answer("❌ Нет доступа", show_alert=True)
+    return False
 
 
 # ==================== КЛАВИАТУРЫ ====================
 
-def main_menu_keyboard() -> InlineKeyboardMarkup:
-    """Главное меню."""
+def main_menu_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Главное меню (аккаунты и источники общие для всех профилей — только суперадмину)."""
+    superadmin = is_superadmin(user_id)
     keyboard = [
-        [InlineKeyboardButton(text="👤 Мои аккаунты", callback_data="accounts")],
+        *([[InlineKeyboardButton(text="👤 Мои аккаунты", callback_data="accounts")]] if superadmin else []),
         [InlineKeyboardButton(text="📊 Парсер / Лидогенератор", callback_data="parser_settings")],
         [InlineKeyboardButton(text="📜 История лидов", callback_data="lead_history")],
-        [InlineKeyboardButton(text="📥 Импорт источников", callback_data="import_sources")],
+        [InlineKeyboardButton(text="📈 Статистика", callback_data="stats:24")],
+        *([[InlineKeyboardButton(text="📥 Источники", callback_data="import_sources")]] if superadmin else []),
         [InlineKeyboardButton(text="📤 Исходящие сообщения", callback_data="outbox")],
         [InlineKeyboardButton(text="❓ Помощь / Инструкция", callback_data="help")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def parser_settings_keyboard() -> InlineKeyboardMarkup:
-    """Клавиатура настроек парсера."""
+def parser_settings_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура настроек парсера (общие тумблеры — только суперадмину)."""
     conf = db.get_all_config()
     
     # Статусы (эмодзи)
@@ -66,7 +134,10 @@ def parser_settings_keyboard() -> InlineKeyboardMarkup:
     channels = "🟢" if conf.get('channels_enabled') == 'true' else "🔴"
     dialogs = "🟢" if conf.get('dialogs_enabled') == 'true' else "🔴"
     duplicates = "🟢" if conf.get('ignore_duplicates') == 'true' else "🔴"
+    morphology = "🟢" if conf.get('morphology_enabled') == 'true' else "🔴"
+    digest = "🟢" if conf.get('digest_enabled') == 'true' else "🔴"
     
+    superadmin = is_superadmin(user_id)
     keyboard = [
         # Статус работы
         [InlineKeyboardButton(text=f"{working} Работает", callback_data="toggle_working")],
@@ -74,21 +145,61 @@ def parser_settings_keyboard() -> InlineKeyboardMarkup:
          InlineKeyboardButton(text=f"{channels} Каналы", callback_data="toggle_channels")],
         [InlineKeyboardButton(text=f"{dialogs} Диалоги (в будущем)", callback_data="toggle_dialogs"),
          InlineKeyboardButton(text=f"{duplicates} Игнор дублей", callback_data="toggle_duplicates")],
+        [InlineKeyboardButton(text=f"{morphology} Морфология (поиск по леммам)", callback_data="toggle_morphology")],
+    ] if superadmin else []
+    keyboard += [
+        # Профиль
+        [InlineKeyboardButton(text="🏢 Профили", callback_data="tenants")],
         # Фильтры
         [InlineKeyboardButton(text="🔑 Ключ-слова", callback_data="keywords")],
         [InlineKeyboardButton(text="⛔ Стоп-слова", callback_data="stopwords")],
         [InlineKeyboardButton(text="🚫 Чёрный список", callback_data="blacklist")],
+        [InlineKeyboardButton(text="🧪 Проверить текст", callback_data="explain")],
         # Доставка
         [InlineKeyboardButton(text="📢 Чат для уведомлений", callback_data="notification_chat")],
+        *([[InlineKeyboardButton(text=f"{digest} Сводка при всплеске", callback_data="toggle_digest")]]
+          if superadmin else []),
+        [InlineKeyboardButton(text="📤 Очередь уведомлений", callback_data="notification_queue")],
         # Навигация
         [InlineKeyboardButton(text="⬅ Назад", callback_data="main_menu")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def keywords_keyboard(page: int = 0, sort_alpha: bool = False) -> InlineKeyboardMarkup:
+# Сортировки ключевых слов: по добавлению, по алфавиту, по стоимости проверки, по пользе
+KW_SORT_ADDED, KW_SORT_ALPHA, KW_SORT_COST, KW_SORT_USEFUL = range(4)
+KW_SORT_TITLES = {
+    KW_SORT_ADDED: "по добавлению",
+    KW_SORT_ALPHA: "по алфавиту",
+    KW_SORT_COST: "по стоимости",
+    KW_SORT_USEFUL: "по пользе",
+}
+
+
+def _keyword_cost_us(stat: dict) -> float:
+    """Среднее время проверки ключевого слова в микросекундах (по выборке)."""
+    return stat['eval_ns'] / stat['eval_count'] / 1000 if stat.get('eval_count') else 0.0
+
+
+def sorted_keywords(sort: int, tenant_id: int) -> tuple:
+    """Ключевые слова профиля в нужном порядке и их статистика."""
+    keywords = db.get_keywords(sort_alpha=sort == KW_SORT_ALPHA, tenant_id=tenant_id)
+    stats = db.get_keyword_stats(tenant_id) if sort in (KW_SORT_COST, KW_SORT_USEFUL) else {}
+    empty = {'hits': 0, 'leads': 0, 'false_positives': 0, 'eval_count': 0, 'eval_ns': 0}
+    if sort == KW_SORT_COST:
+        keywords.sort(key=lambda kw: _keyword_cost_us(stats.get(kw, empty)), reverse=True)
+    elif sort == KW_SORT_USEFUL:
+        # Сначала приносящие лиды без жалоб, в конце — ни разу не сработавшие
+        keywords.sort(key=lambda kw: (
+            stats.get(kw, empty)['leads'] - stats.get(kw, empty)['false_positives'],
+            stats.get(kw, empty)['hits']
+        ), reverse=True)
+    return keywords, stats
+
+
+def keywords_keyboard(page: int = 0, sort: int = KW_SORT_ADDED, tenant_id: int = DEFAULT_TENANT_ID) -> InlineKeyboardMarkup:
     """Клавиатура управления ключевыми словами."""
-    keywords = db.get_keywords(sort_alpha=sort_alpha)
+    keywords, stats = sorted_keywords(sort, tenant_id)
     per_page = 10
     start = page * per_page
     end = start + per_page
@@ -96,26 +207,34 @@ def keywords_keyboard(page: int = 0, sort_alpha: bool = False) -> InlineKeyboard
     
     keyboard = []
     
-    # Кнопки с ключевыми словами
+    # Кнопки с ключевыми словами (в режимах статистики — с цифрами)
     for kw in page_keywords:
+        label = f"❌ {kw}"
+        if sort in (KW_SORT_COST, KW_SORT_USEFUL):
+            stat = stats.get(kw)
+            if stat:
+                label += f" · 🔥{stat['leads']} ⚠{stat['false_positives']} ⏱{_keyword_cost_us(stat):.1f}"
+            else:
+                label += " · 💤"
         keyboard.append([InlineKeyboardButton(
-            text=f"❌ {kw}", 
+            text=label, 
             callback_data=f"del_kw:{kw}"
         )])
     
     # Навигация по страницам
     nav_row = []
     if page > 0:
-        nav_row.append(InlineKeyboardButton(text="◀", callback_data=f"kw_page:{page-1}:{int(sort_alpha)}"))
+        nav_row.append(InlineKeyboardButton(text="◀", callback_data=f"kw_page:{page-1}:{sort}"))
     if end < len(keywords):
-        nav_row.append(InlineKeyboardButton(text="▶", callback_data=f"kw_page:{page+1}:{int(sort_alpha)}"))
+        nav_row.append(InlineKeyboardButton(text="▶", callback_data=f"kw_page:{page+1}:{sort}"))
     
     if nav_row:
         keyboard.append(nav_row)
     
-    # Управление
+    # Управление: сортировка переключается по кругу
+    next_sort = (sort + 1) % len(KW_SORT_TITLES)
     keyboard.append([
-        InlineKeyboardButton(text="🔤 Сортировать", callback_data=f"kw_sort:{page}:{int(not sort_alpha)}")
+        InlineKeyboardButton(text=f"🔤 Сортировать {KW_SORT_TITLES[next_sort]}", callback_data=f"kw_sort:{page}:{next_sort}")
     ])
     keyboard.append([
         InlineKeyboardButton(text="🧾 Скопировать все", callback_data="kw_copy_all"),
@@ -128,9 +247,9 @@ def keywords_keyboard(page: int = 0, sort_alpha: bool = False) -> InlineKeyboard
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def stopwords_keyboard(page: int = 0, sort_alpha: bool = False) -> InlineKeyboardMarkup:
+def stopwords_keyboard(page: int = 0, sort_alpha: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> InlineKeyboardMarkup:
     """Клавиатура управления стоп-словами."""
-    stopwords = db.get_stopwords(sort_alpha=sort_alpha)
+    stopwords = db.get_stopwords(sort_alpha=sort_alpha, tenant_id=tenant_id)
     per_page = 10
     start = page * per_page
     end = start + per_page
@@ -170,9 +289,9 @@ def stopwords_keyboard(page: int = 0, sort_alpha: bool = False) -> InlineKeyboar
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def blacklist_keyboard(page: int = 0, sort_numeric: bool = False) -> InlineKeyboardMarkup:
+def blacklist_keyboard(page: int = 0, sort_numeric: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> InlineKeyboardMarkup:
     """Клавиатура управления черным списком."""
-    blacklist = db.get_blacklist(sort_numeric=sort_numeric)
+    blacklist = db.get_blacklist(sort_numeric=sort_numeric, tenant_id=tenant_id)
     per_page = 10
     start = page * per_page
     end = start + per_page
@@ -249,6 +368,9 @@ def accounts_keyboard() -> InlineKeyboardMarkup:
 @router.callback_query(F.data == "accounts")
 async def show_accounts(callback: CallbackQuery, state: FSMContext):
     await state.clear()
+    # Аккаунты Telethon обслуживают все профили — управляет только суперадмин
+    if not await superadmin_or_deny(callback):
+        return
     # Автодобавление дефолтной сессии, если аккаунтов нет
     AccountStore.ensure_default_account()
     current = AccountStore.get_current_account()
@@ -266,12 +388,18 @@ class AccForm(StatesGroup):
 
 @router.callback_query(F.data == "acc_add")
 async def add_account_start(callback: CallbackQuery, state: FSMContext):
+    if not await superadmin_or_deny(callback):
+        return
     await state.set_state(AccForm.waiting_phone)
     await callback.message.edit_text("Введите номер телефона аккаунта (в формате +7...):", reply_markup=back_to_main_keyboard())
     await callback.answer()
 
 @router.message(StateFilter(AccForm.waiting_phone))
 async def add_account_phone(message: Message, state: FSMContext):
+    if not is_superadmin(message.from_user.id):
+        await state.clear()
+        await message.answer("❌ Нет доступа")
+        return
     phone = message.text.strip()
     await state.update_data(phone=phone)
     await state.set_state(AccForm.waiting_session)
@@ -279,6 +407,10 @@ async def add_account_phone(message: Message, state: FSMContext):
 
 @router.message(StateFilter(AccForm.waiting_session))
 async def add_account_finish(message: Message, state: FSMContext):
+    if not is_superadmin(message.from_user.id):
+        await state.clear()
+        await message.answer("❌ Нет доступа")
+        return
     data = await state.get_data()
     phone = data.get("phone")
     session_file = message.text.strip()
@@ -292,6 +424,8 @@ async def add_account_finish(message: Message, state: FSMContext):
 
 @router.callback_query(F.data.startswith("acc_toggle:"))
 async def acc_toggle(callback: CallbackQuery):
+    if not await superadmin_or_deny(callback):
+        return
     acc_id = callback.data.split(":",1)[1]
     acc = AccountStore.get_account(acc_id)
     if not acc:
@@ -303,6 +437,8 @@ async def acc_toggle(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("acc_del:"))
 async def acc_delete(callback: CallbackQuery):
+    if not await superadmin_or_deny(callback):
+        return
     acc_id = callback.data.split(":",1)[1]
     AccountStore.remove_account(acc_id)
     await callback.message.edit_reply_markup(reply_markup=accounts_keyboard())
@@ -310,6 +446,8 @@ async def acc_delete(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("acc_open:"))
 async def acc_open(callback: CallbackQuery):
+    if not await superadmin_or_deny(callback):
+        return
     # Упрощаем: нажатие по аккаунту сразу делает его текущим
     acc_id = callback.data.split(":",1)[1]
     AccountStore.set_current_id(acc_id)
@@ -322,6 +460,8 @@ async def acc_open(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("acc_set_current:"))
 async def acc_set_current(callback: CallbackQuery):
+    if not await superadmin_or_deny(callback):
+        return
     acc_id = callback.data.split(":",1)[1]
     AccountStore.set_current_id(acc_id)
     await callback.message.edit_text(
@@ -334,12 +474,13 @@ async def acc_set_current(callback: CallbackQuery):
 
 # ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
-def get_parser_status_text() -> str:
+def get_parser_status_text(user_id: int) -> str:
     """Получить текст карточки статуса парсера."""
-    conf = db.get_all_config()
-    keywords_count = len(db.get_keywords())
-    stopwords_count = len(db.get_stopwords())
-    notification_chat = conf.get('notification_chat_id', 'не установлен')
+    tenant = current_tenant(user_id) or {}
+    tenant_id = tenant.get('id', DEFAULT_TENANT_ID)
+    keywords_count = len(db.get_keywords(tenant_id=tenant_id))
+    stopwords_count = len(db.get_stopwords(tenant_id=tenant_id))
+    notification_chat = tenant.get('notification_chat_id') or 'не установлен'
 
     AccountStore.ensure_default_account()
     current = AccountStore.get_current_account()
@@ -348,37 +489,84 @@ def get_parser_status_text() -> str:
     else:
         phone = 'не выбран'
 
+    queue = db.get_queue_stats()
+    latency = get_latency_text() if is_superadmin(user_id) else ""
+
     text = (
         "⚙️ <b>НАСТРОЙКА ПАРСЕРА</b>\n\n"
         f"📱 Аккаунт: <code>{phone}</code>\n"
+        f"🏢 Профиль: <b>{tenant.get('name', 'нет доступа')}</b>\n"
         f"📢 ID чата для уведомлений: <code>{notification_chat}</code>\n"
         f"🔑 Кол-во ключевых слов: <b>{keywords_count}</b>\n"
-        f"⛔ Кол-во стоп-слов: <b>{stopwords_count}</b>\n\n"
+        f"⛔ Кол-во стоп-слов: <b>{stopwords_count}</b>\n"
+        f"📤 В очереди уведомлений: <b>{queue['pending']}</b>"
+        f"{' (ошибок: ' + str(queue['failed']) + ')' if queue['failed'] else ''}\n"
+        f"{latency}\n"
         "Выберите действие:"
     )
     return text
 
 
-def get_keywords_text(page: int = 0, sort_alpha: bool = False) -> str:
+def get_latency_text() -> str:
+    """Задержки по процессам (с их запуска): p50/p95/p99 обработки, самый медленный этап, задержка цикла."""
+    text = ""
+    for item in db.get_worker_stats():
+        histograms = load_histograms(item['latency'])
+        parts = []
+        total = histograms.get('total')
+        if total and total.count:
+            p50, p95, p99 = (total.quantile(q) * 1000 for q in QUANTILES)
+            parts.append(f"p50 {p50:.1f} · p95 {p95:.1f} · p99 {p99:.1f} мс")
+            stages = {stage: h.quantile(0.95) for stage, h in histograms.items()
+                      if stage not in ('total', 'send', 'loop_lag') and h.count}
+            if stages:
+                slowest = max(stages, key=stages.get)
+                parts.append(f"дольше всего: {STAGES.get(slowest, slowest)}")
+        loop_lag = histograms.get('loop_lag')
+        if loop_lag and loop_lag.count:
+            parts.append(f"задержка цикла p99 {loop_lag.quantile(0.99) * 1000:.1f} мс")
+        for key, title in (('flood_waits', "FloodWait"), ('slow_callbacks', "блокировок цикла")):
+            if item['counters'].get(key):
+                parts.append(f"{title}: {item['counters'][key]}")
+        if parts:
+            text += f"⏱ <code>{html.escape(item['worker'])}</code>: {', '.join(parts)}\n"
+    return text
+
+
+def get_keywords_text(page: int = 0, sort: int = KW_SORT_ADDED, tenant_id: int = DEFAULT_TENANT_ID) -> str:
     """Получить текст для модуля ключевых слов."""
-    keywords = db.get_keywords(sort_alpha=sort_alpha)
+    keywords = db.get_keywords(tenant_id=tenant_id)
     count = len(keywords)
     
+    stats_text = ""
+    if sort in (KW_SORT_COST, KW_SORT_USEFUL):
+        stats = db.get_keyword_stats(tenant_id)
+        never = sum(1 for kw in keywords if not stats.get(kw, {}).get('hits'))
+        stats_text = (
+            f"Сортировка: <b>{KW_SORT_TITLES[sort]}</b>\n"
+            f"💤 Ни разу не сработали: <b>{never}</b>\n"
+            "<i>🔥 лидов · ⚠ ложных (автор потом в чёрном списке) · "
+            "⏱ среднее время проверки, мкс</i>\n\n"
+        )
+    
     text = (
         f"🔑 <b>КЛЮЧЕВЫЕ СЛОВА</b>\n\n"
         f"Кол-во ключ-слов: <b>{count}</b>\n\n"
+        f"{stats_text}"
         "Для удаления нажмите на слово.\n"
         "Чтобы добавить — отправьте его в чат.\n\n"
         "<i>_слово_ = искать слово как отдельное\n"
         "+ = обязательные несколько слов\n"
+        "\"фраза\" = слова подряд\n"
+        "слово1 NEAR/3 слово2 = слова рядом (не дальше 3 слов)\n"
         "Пример: продам+айфон</i>"
     )
     return text
 
 
-def get_stopwords_text(page: int = 0, sort_alpha: bool = False) -> str:
+def get_stopwords_text(page: int = 0, sort_alpha: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> str:
     """Получить текст для модуля стоп-слов."""
-    stopwords = db.get_stopwords(sort_alpha=sort_alpha)
+    stopwords = db.get_stopwords(sort_alpha=sort_alpha, tenant_id=tenant_id)
     count = len(stopwords)
     
     text = (
@@ -388,14 +576,15 @@ def get_stopwords_text(page: int = 0, sort_alpha: bool = False) -> str:
         "Для удаления нажмите на слово.\n"
         "Чтобы добавить — отправьте его в чат.\n\n"
         "<i>_слово_ = искать как отдельное\n"
-        "+ = комбинация слов</i>"
+        "+ = комбинация слов\n"
+        "\"фраза\" = слова подряд, NEAR/N = слова рядом</i>"
     )
     return text
 
 
-def get_blacklist_text(page: int = 0, sort_numeric: bool = False) -> str:
+def get_blacklist_text(page: int = 0, sort_numeric: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> str:
     """Получить текст для модуля черного списка."""
-    blacklist = db.get_blacklist(sort_numeric=sort_numeric)
+    blacklist = db.get_blacklist(sort_numeric=sort_numeric, tenant_id=tenant_id)
     count = len(blacklist)
     
     text = (
@@ -422,7 +611,53 @@ async def cmd_start(message: Message, state: FSMContext):
         "Выберите действие из меню ниже:"
     )
     
-    await message.answer(text, reply_markup=main_menu_keyboard(), parse_mode="HTML")
+    await message.answer(text, reply_markup=main_menu_keyboard(message.from_user.id), parse_mode="HTML")
+
+
+@router.message(Command("explain"))
+async def cmd_explain(message: Message, state: FSMContext, command: CommandObject):
+    """Обработчик команды /explain текст — разбор проверки текста (см. «Проверить текст»)."""
+    if not command.args:
+        await state.set_state(Form.waiting_explain_text)
+        await message.answer("Отправьте текст или перешлите сообщение для проверки.")
+        return
+    # Сборка правил и проверка — в потоке, чтобы не блокировать остальных пользователей бота
+    await message.answer(
+        await asyncio.to_thread(get_explain_text, command.args, 0, message.from_user.id),
+        reply_markup=back_to_parser_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("backtest"))
+async def cmd_backtest(message: Message, command: CommandObject):
+    """Обработчик команды /backtest правки — какие лиды правки добавили бы или убрали."""
+    edits = parse_backtest_edits(command.args or "")
+    if not any(edits.values()):
+        await message.answer(BACKTEST_HELP, parse_mode="HTML")
+        return
+    tenant_id = current_tenant_id(message.from_user.id)
+    if tenant_id is None:
+        await message.answer("❌ Нет доступа ни к одному профилю")
+        return
+    status = await message.answer("⏳ Прогоняю историю лидов…")
+    text = await asyncio.to_thread(get_backtest_text, edits, tenant_id, message.from_user.id)
+    await status.edit_text(text, parse_mode="HTML")
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Обработчик команды /profile [секунды] — профилирование работающего воркера."""
+    if not is_superadmin(message.from_user.id):
+        await message.answer("❌ Нет доступа")
+        return
+    try:
+        seconds = float(command.args) if command.args else config.PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await message.answer("❌ Укажите длительность в секундах: /profile 30")
+        return
+    seconds = max(1, min(seconds, config.PROFILE_MAX_SECONDS))
+    await message.answer(get_profile_text(seconds), reply_markup=profile_keyboard(seconds), parse_mode="HTML")
 
 
 # ==================== ГЛАВНОЕ МЕНЮ ====================
@@ -439,7 +674,7 @@ async def show_main_menu(callback: CallbackQuery, state: FSMContext):
     
     await callback.message.edit_text(
         text,
-        reply_markup=main_menu_keyboard(),
+        reply_markup=main_menu_keyboard(callback.from_user.id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -452,11 +687,14 @@ async def show_parser_settings(callback: CallbackQuery, state: FSMContext):
     """Показать настройки парсера."""
     await state.clear()
     
-    text = get_parser_status_text()
+    if await tenant_or_deny(callback) is None:
+        return
+    
+    text = get_parser_status_text(callback.from_user.id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=parser_settings_keyboard(),
+        reply_markup=parser_settings_keyboard(callback.from_user.id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -465,7 +703,9 @@ async def show_parser_settings(callback: CallbackQuery, state: FSMContext):
 # Тумблеры статусов
 @router.callback_query(F.data.startswith("toggle_"))
 async def toggle_setting(callback: CallbackQuery):
-    """Переключить настройку."""
+    """Переключить настройку (общая для всех профилей — только суперадмин)."""
+    if not await superadmin_or_deny(callback):
+        return
     setting = callback.data.split("_", 1)[1]
     
     setting_map = {
@@ -473,7 +713,9 @@ async def toggle_setting(callback: CallbackQuery):
         "groups": "groups_enabled",
         "channels": "channels_enabled",
         "dialogs": "dialogs_enabled",
-        "duplicates": "ignore_duplicates"
+        "duplicates": "ignore_duplicates",
+        "morphology": "morphology_enabled",
+        "digest": "digest_enabled"
     }
     
     config_key = setting_map.get(setting)
@@ -482,10 +724,10 @@ async def toggle_setting(callback: CallbackQuery):
         status = "включено" if new_value == "true" else "выключено"
         
         # Обновить клавиатуру
-        text = get_parser_status_text()
+        text = get_parser_status_text(callback.from_user.id)
         await callback.message.edit_text(
             text,
-            reply_markup=parser_settings_keyboard(),
+            reply_markup=parser_settings_keyboard(callback.from_user.id),
             parse_mode="HTML"
         )
         await callback.answer(f"✅ {status.capitalize()}")
@@ -498,13 +740,16 @@ async def toggle_setting(callback: CallbackQuery):
 @router.callback_query(F.data == "keywords")
 async def show_keywords(callback: CallbackQuery, state: FSMContext):
     """Показать модуль ключевых слов."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     await state.set_state(Form.waiting_keyword)
     
-    text = get_keywords_text()
+    text = get_keywords_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=keywords_keyboard(),
+        reply_markup=keywords_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -513,15 +758,18 @@ async def show_keywords(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("kw_page:"))
 async def keywords_page(callback: CallbackQuery):
     """Переключить страницу ключевых слов."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     _, page, sort = callback.data.split(":")
     page = int(page)
-    sort_alpha = bool(int(sort))
+    sort = int(sort)
     
-    text = get_keywords_text(page, sort_alpha)
+    text = get_keywords_text(page, sort, tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=keywords_keyboard(page, sort_alpha),
+        reply_markup=keywords_keyboard(page, sort, tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -530,31 +778,37 @@ async def keywords_page(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("kw_sort:"))
 async def keywords_sort(callback: CallbackQuery):
     """Сортировать ключевые слова."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     _, page, sort = callback.data.split(":")
     page = int(page)
-    sort_alpha = bool(int(sort))
+    sort = int(sort)
     
-    text = get_keywords_text(0, sort_alpha)  # Сброс на первую страницу
+    text = get_keywords_text(0, sort, tenant_id=tenant_id)  # Сброс на первую страницу
     
     await callback.message.edit_text(
         text,
-        reply_markup=keywords_keyboard(0, sort_alpha),
+        reply_markup=keywords_keyboard(0, sort, tenant_id=tenant_id),
         parse_mode="HTML"
     )
-    await callback.answer("✅ Отсортировано")
+    await callback.answer(f"✅ Сортировка {KW_SORT_TITLES.get(sort, '')}")
 
 
 @router.callback_query(F.data.startswith("del_kw:"))
 async def delete_keyword(callback: CallbackQuery):
     """Удалить ключевое слово."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     keyword = callback.data.split(":", 1)[1]
-    db.remove_keyword(keyword)
+    db.remove_keyword(keyword, tenant_id=tenant_id)
     
-    text = get_keywords_text()
+    text = get_keywords_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=keywords_keyboard(),
+        reply_markup=keywords_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer(f"✅ Удалено: {keyword}")
@@ -563,7 +817,10 @@ async def delete_keyword(callback: CallbackQuery):
 @router.callback_query(F.data == "kw_copy_all")
 async def copy_all_keywords(callback: CallbackQuery):
     """Скопировать все ключевые слова."""
-    keywords = db.get_keywords()
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
+    keywords = db.get_keywords(tenant_id=tenant_id)
     
     if keywords:
         text = "\n".join(keywords)
@@ -576,13 +833,16 @@ async def copy_all_keywords(callback: CallbackQuery):
 @router.callback_query(F.data == "kw_delete_all")
 async def delete_all_keywords(callback: CallbackQuery):
     """Удалить все ключевые слова."""
-    db.clear_keywords()
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
+    db.clear_keywords(tenant_id=tenant_id)
     
-    text = get_keywords_text()
+    text = get_keywords_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=keywords_keyboard(),
+        reply_markup=keywords_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer("✅ Все ключевые слова удалены")
@@ -591,16 +851,19 @@ async def delete_all_keywords(callback: CallbackQuery):
 @router.message(StateFilter(Form.waiting_keyword))
 async def add_keyword(message: Message, state: FSMContext):
     """Добавить ключевое слово."""
+    tenant_id = await tenant_or_deny(message)
+    if tenant_id is None:
+        return
     keyword = message.text.strip()
     
-    if db.add_keyword(keyword):
+    if db.add_keyword(keyword, tenant_id=tenant_id):
         await message.answer(f"✅ Ключевое слово добавлено: {keyword}")
     else:
         await message.answer(f"❌ Ключевое слово уже существует: {keyword}")
     
     # Обновить список
-    text = get_keywords_text()
-    await message.answer(text, reply_markup=keywords_keyboard(), parse_mode="HTML")
+    text = get_keywords_text(tenant_id=tenant_id)
+    await message.answer(text, reply_markup=keywords_keyboard(tenant_id=tenant_id), parse_mode="HTML")
 
 
 # ==================== МОДУЛЬ СТОП-СЛОВ ====================
@@ -608,13 +871,16 @@ async def add_keyword(message: Message, state: FSMContext):
 @router.callback_query(F.data == "stopwords")
 async def show_stopwords(callback: CallbackQuery, state: FSMContext):
     """Показать модуль стоп-слов."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     await state.set_state(Form.waiting_stopword)
     
-    text = get_stopwords_text()
+    text = get_stopwords_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=stopwords_keyboard(),
+        reply_markup=stopwords_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -623,15 +889,18 @@ async def show_stopwords(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("sw_page:"))
 async def stopwords_page(callback: CallbackQuery):
     """Переключить страницу стоп-слов."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     _, page, sort = callback.data.split(":")
     page = int(page)
     sort_alpha = bool(int(sort))
     
-    text = get_stopwords_text(page, sort_alpha)
+    text = get_stopwords_text(page, sort_alpha, tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=stopwords_keyboard(page, sort_alpha),
+        reply_markup=stopwords_keyboard(page, sort_alpha, tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -640,15 +909,18 @@ async def stopwords_page(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("sw_sort:"))
 async def stopwords_sort(callback: CallbackQuery):
     """Сортировать стоп-слова."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     _, page, sort = callback.data.split(":")
     page = int(page)
     sort_alpha = bool(int(sort))
     
-    text = get_stopwords_text(0, sort_alpha)
+    text = get_stopwords_text(0, sort_alpha, tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=stopwords_keyboard(0, sort_alpha),
+        reply_markup=stopwords_keyboard(0, sort_alpha, tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer("✅ Отсортировано")
@@ -657,14 +929,17 @@ async def stopwords_sort(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("del_sw:"))
 async def delete_stopword(callback: CallbackQuery):
     """Удалить стоп-слово."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     stopword = callback.data.split(":", 1)[1]
-    db.remove_stopword(stopword)
+    db.remove_stopword(stopword, tenant_id=tenant_id)
     
-    text = get_stopwords_text()
+    text = get_stopwords_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=stopwords_keyboard(),
+        reply_markup=stopwords_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer(f"✅ Удалено: {stopword}")
@@ -673,7 +948,10 @@ async def delete_stopword(callback: CallbackQuery):
 @router.callback_query(F.data == "sw_copy_all")
 async def copy_all_stopwords(callback: CallbackQuery):
     """Скопировать все стоп-слова."""
-    stopwords = db.get_stopwords()
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
+    stopwords = db.get_stopwords(tenant_id=tenant_id)
     
     if stopwords:
         text = "\n".join(stopwords)
@@ -686,13 +964,16 @@ async def copy_all_stopwords(callback: CallbackQuery):
 @router.callback_query(F.data == "sw_delete_all")
 async def delete_all_stopwords(callback: CallbackQuery):
     """Удалить все стоп-слова."""
-    db.clear_stopwords()
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
+    db.clear_stopwords(tenant_id=tenant_id)
     
-    text = get_stopwords_text()
+    text = get_stopwords_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=stopwords_keyboard(),
+        reply_markup=stopwords_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer("✅ Все стоп-слова удалены")
@@ -701,16 +982,19 @@ async def delete_all_stopwords(callback: CallbackQuery):
 @router.message(StateFilter(Form.waiting_stopword))
 async def add_stopword(message: Message, state: FSMContext):
     """Добавить стоп-слово."""
+    tenant_id = await tenant_or_deny(message)
+    if tenant_id is None:
+        return
     stopword = message.text.strip()
     
-    if db.add_stopword(stopword):
+    if db.add_stopword(stopword, tenant_id=tenant_id):
         await message.answer(f"✅ Стоп-слово добавлено: {stopword}")
     else:
         await message.answer(f"❌ Стоп-слово уже существует: {stopword}")
     
     # Обновить список
-    text = get_stopwords_text()
-    await message.answer(text, reply_markup=stopwords_keyboard(), parse_mode="HTML")
+    text = get_stopwords_text(tenant_id=tenant_id)
+    await message.answer(text, reply_markup=stopwords_keyboard(tenant_id=tenant_id), parse_mode="HTML")
 
 
 # ==================== МОДУЛЬ ЧЕРНОГО СПИСКА ====================
@@ -718,13 +1002,16 @@ async def add_stopword(message: Message, state: FSMContext):
 @router.callback_query(F.data == "blacklist")
 async def show_blacklist(callback: CallbackQuery, state: FSMContext):
     """Показать модуль черного списка."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     await state.set_state(Form.waiting_blacklist_id)
     
-    text = get_blacklist_text()
+    text = get_blacklist_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=blacklist_keyboard(),
+        reply_markup=blacklist_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -733,15 +1020,18 @@ async def show_blacklist(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("bl_page:"))
 async def blacklist_page(callback: CallbackQuery):
     """Переключить страницу черного списка."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     _, page, sort = callback.data.split(":")
     page = int(page)
     sort_numeric = bool(int(sort))
     
-    text = get_blacklist_text(page, sort_numeric)
+    text = get_blacklist_text(page, sort_numeric, tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=blacklist_keyboard(page, sort_numeric),
+        reply_markup=blacklist_keyboard(page, sort_numeric, tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -750,15 +1040,18 @@ async def blacklist_page(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("bl_sort:"))
 async def blacklist_sort(callback: CallbackQuery):
     """Сортировать черный список."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     _, page, sort = callback.data.split(":")
     page = int(page)
     sort_numeric = bool(int(sort))
     
-    text = get_blacklist_text(0, sort_numeric)
+    text = get_blacklist_text(0, sort_numeric, tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=blacklist_keyboard(0, sort_numeric),
+        reply_markup=blacklist_keyboard(0, sort_numeric, tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer("✅ Отсортировано")
@@ -767,14 +1060,17 @@ async def blacklist_sort(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("del_bl:"))
 async def delete_from_blacklist(callback: CallbackQuery):
     """Удалить из черного списка."""
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
     user_id = int(callback.data.split(":", 1)[1])
-    db.remove_from_blacklist(user_id)
+    db.remove_from_blacklist(user_id, tenant_id=tenant_id)
     
-    text = get_blacklist_text()
+    text = get_blacklist_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=blacklist_keyboard(),
+        reply_markup=blacklist_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer(f"✅ Удалено: {user_id}")
@@ -783,13 +1079,16 @@ async def delete_from_blacklist(callback: CallbackQuery):
 @router.callback_query(F.data == "bl_delete_all")
 async def clear_blacklist(callback: CallbackQuery):
     """Очистить черный список."""
-    db.clear_blacklist()
+    tenant_id = await tenant_or_deny(callback)
+    if tenant_id is None:
+        return
+    db.clear_blacklist(tenant_id=tenant_id)
     
-    text = get_blacklist_text()
+    text = get_blacklist_text(tenant_id=tenant_id)
     
     await callback.message.edit_text(
         text,
-        reply_markup=blacklist_keyboard(),
+        reply_markup=blacklist_keyboard(tenant_id=tenant_id),
         parse_mode="HTML"
     )
     await callback.answer("✅ Черный список очищен")
@@ -798,21 +1097,178 @@ async def clear_blacklist(callback: CallbackQuery):
 @router.message(StateFilter(Form.waiting_blacklist_id))
 async def add_to_blacklist(message: Message, state: FSMContext):
     """Добавить в черный список."""
+    tenant_id = await tenant_or_deny(message)
+    if tenant_id is None:
+        return
     try:
         user_id = int(message.text.strip())
         
-        if db.add_to_blacklist(user_id):
+        if db.add_to_blacklist(user_id, tenant_id=tenant_id):
             await message.answer(f"✅ Добавлен в черный список: {user_id}")
         else:
             await message.answer(f"❌ Пользователь уже в черном списке: {user_id}")
         
         # Обновить список
-        text = get_blacklist_text()
-        await message.answer(text, reply_markup=blacklist_keyboard(), parse_mode="HTML")
+        text = get_blacklist_text(tenant_id=tenant_id)
+        await message.answer(text, reply_markup=blacklist_keyboard(tenant_id=tenant_id), parse_mode="HTML")
     except ValueError:
         await message.answer("❌ Ошибка: отправьте корректный ID (число)")
 
 
+# ==================== МОДУЛЬ ПРОФИЛЕЙ ====================
+
+def tenants_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура выбора и управления профилями."""
+    current_id = current_tenant_id(user_id)
+    keyboard = []
+    for tenant in available_tenants(user_id):
+        mark = " 🟦" if tenant['id'] == current_id else ""
+        keyboard.append([InlineKeyboardButton(
+            text=f"{tenant['name']}{mark}",
+            callback_data=f"tenant_set:{tenant['id']}"
+        )])
+    if is_superadmin(user_id):
+        keyboard.append([InlineKeyboardButton(text="➕ Добавить профиль", callback_data="tenant_add")])
+        keyboard.append([InlineKeyboardButton(text="👥 Админы текущего профиля", callback_data="tenant_admins")])
+        if current_id != DEFAULT_TENANT_ID:
+            keyboard.append([InlineKeyboardButton(text="❌ Удалить текущий профиль", callback_data=f"tenant_del:{current_id}")])
+    keyboard.append([InlineKeyboardButton(text="⬅ Назад", callback_data="parser_settings")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_tenants_text(user_id: int) -> str:
+    """Получить текст для модуля профилей."""
+    tenant = current_tenant(user_id) or {}
+    admins = tenant.get('admin_ids') or 'только суперадмины'
+    return (
+        "🏢 <b>ПРОФИЛИ</b>\n\n"
+        f"Текущий профиль: <b>{tenant.get('name', '—')}</b>\n"
+        f"Админы профиля: <code>{admins}</code>\n\n"
+        "У каждого профиля свои ключ-слова, стоп-слова, чёрный список "
+        "и чат для уведомлений. Сообщение проверяется один раз по правилам "
+        "всех профилей, лид уходит в чаты тех профилей, чьи правила сработали.\n\n"
+        "Нажмите на профиль, чтобы управлять им."
+    )
+
+
+@router.callback_query(F.data == "tenants")
+async def show_tenants(callback: CallbackQuery, state: FSMContext):
+    """Показать модуль профилей."""
+    await state.clear()
+    
+    await callback.message.edit_text(
+        get_tenants_text(callback.from_user.id),
+        reply_markup=tenants_keyboard(callback.from_user.id),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("tenant_set:"))
+async def set_current_tenant(callback: CallbackQuery):
+    """Сделать профиль текущим."""
+    tenant_id = callback.data.split(":", 1)[1]
+    if not any(str(t['id']) == tenant_id for t in available_tenants(callback.from_user.id)):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    db.set_config(f"current_tenant:{callback.from_user.id}", tenant_id)
+    
+    await callback.message.edit_text(
+        get_tenants_text(callback.from_user.id),
+        reply_markup=tenants_keyboard(callback.from_user.id),
+        parse_mode="HTML"
+    )
+    await callback.answer("✅ Профиль выбран")
+
+
+@router.callback_query(F.data == "tenant_add")
+async def add_tenant_start(callback: CallbackQuery, state: FSMContext):
+    """Начать создание профиля."""
+    if not is_superadmin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    await state.set_state(Form.waiting_tenant_name)
+    await callback.message.edit_text(
+        "Отправьте название нового профиля:",
+        reply_markup=back_to_parser_keyboard()
+    )
+    await callback.answer()
+
+
+@router.message(StateFilter(Form.waiting_tenant_name))
+async def add_tenant(message: Message, state: FSMContext):
+    """Создать профиль."""
+    name = message.text.strip()
+    tenant_id = db.add_tenant(name)
+    if tenant_id:
+        db.set_config(f"current_tenant:{message.from_user.id}", str(tenant_id))
+        await message.answer(f"✅ Профиль создан: {name}")
+    else:
+        await message.answer(f"❌ Профиль уже существует: {name}")
+    await state.clear()
+    await message.answer(
+        get_tenants_text(message.from_user.id),
+        reply_markup=tenants_keyboard(message.from_user.id),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data == "tenant_admins")
+async def tenant_admins_start(callback: CallbackQuery, state: FSMContext):
+    """Начать изменение админов профиля."""
+    if not is_superadmin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    await state.set_state(Form.waiting_tenant_admins)
+    await callback.message.edit_text(
+        "Отправьте ID администраторов профиля через запятую.\n"
+        "Отправьте 0, чтобы оставить управление только суперадминам.",
+        reply_markup=back_to_parser_keyboard()
+    )
+    await callback.answer()
+
+
+@router.message(StateFilter(Form.waiting_tenant_admins))
+async def set_tenant_admins(message: Message, state: FSMContext):
+    """Установить админов профиля."""
+    try:
+        admin_ids = [int(x) for x in message.text.replace(" ", "").split(",") if x and x != "0"]
+    except ValueError:
+        await message.answer("❌ Ошибка: отправьте ID числами через запятую")
+        return
+    tenant_id = await tenant_or_deny(message)
+    if tenant_id is None:
+        await state.clear()
+        return
+    db.set_tenant_admins(tenant_id, admin_ids)
+    await state.clear()
+    await message.answer("✅ Админы профиля обновлены")
+    await message.answer(
+        get_tenants_text(message.from_user.id),
+        reply_markup=tenants_keyboard(message.from_user.id),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("tenant_del:"))
+async def delete_tenant(callback: CallbackQuery):
+    """Удалить профиль вместе с его правилами."""
+    if not is_superadmin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    tenant_id = int(callback.data.split(":", 1)[1])
+    if db.remove_tenant(tenant_id):
+        await callback.answer("✅ Профиль удален")
+    else:
+        await callback.answer("❌ Этот профиль удалить нельзя")
+    
+    await callback.message.edit_text(
+        get_tenants_text(callback.from_user.id),
+        reply_markup=tenants_keyboard(callback.from_user.id),
+        parse_mode="HTML"
+    )
+
+
 # ==================== МОДУЛЬ ЧАТ ДЛЯ УВЕДОМЛЕНИЙ ====================
 
 @router.callback_query(F.data == "notification_chat")
@@ -820,7 +1276,8 @@ async def show_notification_chat(callback: CallbackQuery, state: FSMContext):
     """Показать модуль настройки чата уведомлений."""
     await state.set_state(Form.waiting_chat_id)
     
-    current_chat = db.get_config('notification_chat_id', 'не установлен')
+    tenant = current_tenant(callback.from_user.id) or {}
+    current_chat = tenant.get('notification_chat_id') or 'не установлен'
     
     text = (
         "📢 <b>ЧАТ ДЛЯ УВЕДОМЛЕНИЙ</b>\n\n"
@@ -848,13 +1305,16 @@ async def set_notification_chat(message: Message, state: FSMContext):
         
         # Проверка, что это похоже на ID (число или начинается с -)
         if chat_id.lstrip('-').isdigit():
-            db.set_config('notification_chat_id', chat_id)
+            tenant_id = await tenant_or_deny(message)
+            if tenant_id is None:
+                return
+            db.set_tenant_chat(tenant_id, chat_id)
             await message.answer(f"✅ ID чата для уведомлений обновлен: {chat_id}")
             
             # Вернуться к настройкам парсера
             await state.clear()
-            text = get_parser_status_text()
-            await message.answer(text, reply_markup=parser_settings_keyboard(), parse_mode="HTML")
+            text = get_parser_status_text(message.from_user.id)
+            await message.answer(text, reply_markup=parser_settings_keyboard(message.from_user.id), parse_mode="HTML")
         else:
             await message.answer("❌ Ошибка: отправьте корректный ID чата (число)")
     except Exception as e:
@@ -862,12 +1322,489 @@ async def set_notification_chat(message: Message, state: FSMContext):
         await message.answer("❌ Произошла ошибка")
 
 
+# ==================== ОЧЕРЕДЬ УВЕДОМЛЕНИЙ ====================
+
+def notification_queue_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура очереди уведомлений (повтор ошибок — только суперадмину)."""
+    buttons = [InlineKeyboardButton(text="🔄 Обновить", callback_data="notification_queue")]
+    if is_superadmin(user_id):
+        buttons.append(InlineKeyboardButton(text="🔁 Повторить ошибки", callback_data="retry_queue"))
+    keyboard = [
+        buttons,
+        [InlineKeyboardButton(text="⬅ Назад", callback_data="parser_settings")]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_notification_queue_text() -> str:
+    """Получить текст состояния очереди уведомлений."""
+    queue = db.get_queue_stats()
+    age = int(queue['oldest_age'])
+    if age >= 3600:
+        age_text = f"{age // 3600} ч {age % 3600 // 60} мин"
+    elif age >= 60:
+        age_text = f"{age // 60} мин"
+    else:
+        age_text = f"{age} с"
+    
+    return (
+        "📤 <b>ОЧЕРЕДЬ УВЕДОМЛЕНИЙ</b>\n\n"
+        f"⏳ Ждут отправки: <b>{queue['pending']}</b>\n"
+        f"🕰 Самое старое ждёт: <b>{age_text if queue['pending'] else '—'}</b>\n"
+        f"❌ Не доставлено (попытки исчерпаны): <b>{queue['failed']}</b>\n\n"
+        "<i>Лиды сначала сохраняются в базе, затем отправляются воркером. "
+        "Неотправленные уведомления повторяются и переживают перезапуск.</i>"
+    )
+
+
+@router.callback_query(F.data == "notification_queue")
+async def show_notification_queue(callback: CallbackQuery):
+    """Показать состояние очереди уведомлений."""
+    try:
+        await callback.message.edit_text(
+            get_notification_queue_text(),
+            reply_markup=notification_queue_keyboard(callback.from_user.id),
+            parse_mode="HTML"
+        )
+    except TelegramBadRequest:
+        # Текст не изменился
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data == "retry_queue")
+async def retry_notification_queue(callback: CallbackQuery):
+    """Повторить недоставленные уведомления (очередь общая — только суперадмин)."""
+    if not await superadmin_or_deny(callback):
+        return
+    count = db.retry_failed_notifications()
+    try:
+        await callback.message.edit_text(
+            get_notification_queue_text(),
+            reply_markup=notification_queue_keyboard(callback.from_user.id),
+            parse_mode="HTML"
+        )
+    except TelegramBadRequest:
+        pass
+    await callback.answer(f"✅ В очередь возвращено: {count}")
+
+
+# ==================== ПРОВЕРКА ТЕКСТА ====================
+
+# Сколько символов нормализованного текста показывать в разборе
+EXPLAIN_TEXT_LIMIT = 1500
+
+
+def _format_ns(ns: int) -> str:
+    return f"{ns / 1000:.1f} мкс"
+
+
+def _highlight(text: str, keyword_spans: list, stopword_spans: list) -> str:
+    """Выделить в тексте слова ключ-слов (жирным) и стоп-слов (зачёркнутым)."""
+    marks = sorted([(s, e, "b") for s, e in keyword_spans] + [(s, e, "s") for s, e in stopword_spans])
+    result, last = [], 0
+    for start, end, tag in marks:
+        if start < last or start >= EXPLAIN_TEXT_LIMIT:
+            continue
+        result.append(html.escape(text[last:start]))
+        result.append(f"<{tag}>{html.escape(text[start:end])}</{tag}>")
+        last = end
+    result.append(html.escape(text[last:EXPLAIN_TEXT_LIMIT]))
+    if len(text) > EXPLAIN_TEXT_LIMIT:
+        result.append("…")
+    return "".join(result)
+
+
+# Снимки правил для разбора: (rules_version, морфология, профили) → RuleSet
+_explain_rules: dict = {}
+
+
+def _explain_ruleset(conf: dict, allowed: set):
+    """Снимок правил профилей пользователя (перестраивается только после изменения правил)."""
+    from ruleset import RuleSet
+    
+    version = (conf.get('rules_version'), conf.get('morphology_enabled'))
+    key = (*version, frozenset(allowed))
+    rules = _explain_rules.get(key)
+    if rules is None:
+        snapshot = {tid: data for tid, data in db.get_rules_snapshot().items() if tid in allowed}
+        rules = RuleSet(snapshot, conf.get('morphology_enabled') == 'true')
+        # Снимки прошлых версий правил больше не нужны
+        for stale in [k for k in _explain_rules if k[:2] != version]:
+            _explain_rules.pop(stale, None)
+        _explain_rules[key] = rules
+    return rules
+
+
+def get_explain_text(text: str, sender_id: int, user_id: int) -> str:
+    """
+    Разобрать текст теми же шагами, что и воркер (правила профилей пользователя).
+    
+    Args:
+        text: Проверяемый текст
+        sender_id: ID автора (0 — неизвестен, чёрный список не сработает)
+        user_id: Кто проверяет (видит только свои профили)
+        
+    Returns:
+        Текст разбора (HTML)
+    """
+    # Воркер импортируется только здесь (без Telethon) и работает с базой бота
+    import worker
+    
+    worker.init(db)
+    conf = db.get_all_config()
+    allowed = {tenant['id'] for tenant in available_tenants(user_id)}
+    rules = _explain_ruleset(conf, allowed)
+    report = worker.explain_text(text, sender_id, conf, rules)
+    
+    def tenant_names(tenant_ids) -> str:
+        return ", ".join(html.escape(rules.tenants[tid]['name']) for tid in tenant_ids)
+    
+    normalized = report['normalized']
+    passed = bool(report['hits'])
+    result = "🧪 <b>РАЗБОР ТЕКСТА</b>\n\n"
+    result += f"Итог: {'✅' if passed else '❌'} <b>{html.escape(report['reason'])}</b>\n"
+    result += f"Автор: <code>{sender_id}</code>\n" if sender_id else "Автор: не указан\n"
+    
+    result += "\n<b>Ключ-слова:</b>\n"
+    if not report['keywords']:
+        result += "• не найдены\n"
+    for rule, spans in report['keywords'].items():
+        words = ", ".join(f"«{html.escape(normalized[s:e])}» [{s}–{e}]" for s, e in spans)
+        cost = report['keyword_timings'].get(rule, 0)
+        result += f"• <code>{html.escape(rule)}</code> — {words} · {_format_ns(cost)}\n"
+    if report['blacklisted']:
+        result += f"\n🚫 Автор в чёрном списке профилей: {tenant_names(report['blacklisted'])}\n"
+    if report['stopwords']:
+        result += "\n<b>Стоп-слова:</b>\n"
+        for rule, spans in report['stopwords'].items():
+            words = ", ".join(f"«{html.escape(normalized[s:e])}»" for s, e in spans)
+            result += f"• <code>{html.escape(rule)}</code> — {words}\n"
+    if report['duplicates']:
+        result += f"\n♻️ Уже приходило за 24 часа профилям: {tenant_names(report['duplicates'])}\n"
+    if passed:
+        result += f"\n📨 Лид получат профили: {tenant_names(report['hits'])}\n"
+    
+    result += "\n<b>Время по шагам:</b>\n"
+    for stage, ns in report['stages']:
+        result += f"• {stage} — {_format_ns(ns)}\n"
+    
+    keyword_spans = [span for spans in report['keywords'].values() for span in spans]
+    stopword_spans = [span for spans in report['stopwords'].values() for span in spans]
+    result += f"\n<b>Текст после нормализации:</b>\n{_highlight(normalized, keyword_spans, stopword_spans)}"
+    return result
+
+
+def _forwarded_sender_id(message: Message) -> int:
+    """ID автора пересланного сообщения (0, если автор скрыт или сообщение не переслано)."""
+    sender = getattr(message.forward_origin, 'sender_user', None)
+    return sender.id if sender else 0
+
+
+@router.callback_query(F.data == "explain")
+async def explain_start(callback: CallbackQuery, state: FSMContext):
+    """Начать проверку текста."""
+    await state.set_state(Form.waiting_explain_text)
+    
+    await callback.message.edit_text(
+        "🧪 <b>ПРОВЕРКА ТЕКСТА</b>\n\n"
+        "Отправьте текст или перешлите сообщение — бот прогонит его через те же проверки, "
+        "что и парсер: нормализация, ключ-слова, чёрный список, стоп-слова, дубли.\n\n"
+        "<i>У пересланного сообщения автор берётся из пересылки — так проверяется и чёрный список. "
+        "То же можно сделать командой /explain текст</i>",
+        reply_markup=back_to_parser_keyboard(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.message(StateFilter(Form.waiting_explain_text))
+async def explain_message(message: Message):
+    """Проверить отправленный или пересланный текст (можно присылать несколько подряд)."""
+    text = message.text or message.caption
+    if not text:
+        await message.answer("❌ В сообщении нет текста")
+        return
+    await message.answer(
+        await asyncio.to_thread(get_explain_text, text, _forwarded_sender_id(message), message.from_user.id),
+        reply_markup=back_to_parser_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+# ==================== БЭКТЕСТ ПРАВИЛ ====================
+
+# За сколько дней история лидов прогоняется через изменённые правила
+BACKTEST_DAYS = 30
+# Сколько примеров расхождений показывать
+BACKTEST_EXAMPLES = 5
+BACKTEST_HELP = (
+    "🔁 <b>БЭКТЕСТ ПРАВИЛ</b>\n\n"
+    "Покажет, какие лиды за последние "
+    f"{BACKTEST_DAYS} дней появились бы или пропали, если изменить правила текущего профиля.\n\n"
+    "<code>/backtest +ключ-слово, -ключ-слово, +!стоп-слово, -!стоп-слово</code>\n\n"
+    "<i>Прогоняются только сохранённые лиды, поэтому видны в основном потери. "
+    "Полный архив чатов (экспорт Telegram) проверяется командой "
+    "python backtest.py на сервере.</i>"
+)
+
+
+def parse_backtest_edits(args: str) -> dict:
+    """
+    Разобрать правки для /backtest: «+слово», «-слово», «+!стоп», «-!стоп» через запятую или с новой строки.
+    
+    Returns:
+        Словарь с ключами add_keywords, remove_keywords, add_stopwords, remove_stopwords
+    """
+    edits = {'add_keywords': [], 'remove_keywords': [], 'add_stopwords': [], 'remove_stopwords': []}
+    for item in args.replace("\n", ",").split(","):
+        item = item.strip()
+        if len(item) < 2 or item[0] not in "+-":
+            continue
+        action = 'add' if item[0] == "+" else 'remove'
+        kind = 'stopwords' if item[1] == "!" else 'keywords'
+        rule = item[2:].strip() if kind == 'stopwords' else item[1:].strip()
+        if rule:
+            edits[f"{action}_{kind}"].append(rule)
+    return edits
+
+
+def get_backtest_text(edits: dict, tenant_id: int, user_id: int) -> str:
+    """
+    Прогнать историю лидов профилей пользователя через текущие и изменённые правила.
+    
+    Args:
+        edits: Правки (parse_backtest_edits)
+        tenant_id: Профиль, к которому применяются правки
+        user_id: Кто проверяет (видит только свои профили)
+        
+    Returns:
+        Текст отчёта (HTML)
+    """
+    import backtest
+    
+    allowed = [tenant['id'] for tenant in available_tenants(user_id)]
+    baseline = {tid: data for tid, data in db.get_rules_snapshot().items() if tid in allowed}
+    candidate = backtest.apply_edits(baseline, tenant_id, **edits)
+    use_lemmas = db.get_config('morphology_enabled') == 'true'
+    messages = backtest.read_logs(db, BACKTEST_DAYS, allowed)
+    
+    result = backtest.BacktestResult()
+    examples = []
+    for result, changes in backtest.run_backtest(messages, baseline, candidate, use_lemmas):
+        examples.extend(change for change in changes if change['tenant_id'] == tenant_id)
+    
+    lines = []
+    for action, kind, label in (('add', 'keywords', "+"), ('remove', 'keywords', "−"),
+                                ('add', 'stopwords', "+ стоп:"), ('remove', 'stopwords', "− стоп:")):
+        lines.extend(f"{label} <code>{html.escape(rule)}</code>" for rule in edits[f"{action}_{kind}"])
+    
+    text = "🔁 <b>БЭКТЕСТ ПРАВИЛ</b>\n\n"
+    text += f"Профиль: <b>{html.escape(baseline[tenant_id]['tenant']['name'])}</b>\n"
+    text += "\n".join(lines) + "\n\n"
+    text += f"Проверено лидов за {BACKTEST_DAYS} дн.: <b>{result.messages}</b>\n"
+    text += f"Лидов было: {result.leads_before[tenant_id]}, стало бы: {result.leads_after[tenant_id]}\n"
+    text += f"🟢 Добавилось: <b>{result.gained[tenant_id]}</b>   🔴 Пропало: <b>{result.lost[tenant_id]}</b>\n"
+    if examples:
+        text += "\n<b>Примеры:</b>\n"
+        for change in examples[:BACKTEST_EXAMPLES]:
+            mark = "🟢" if change['change'] == 'gained' else "🔴"
+            preview = html.escape(change['text'][:120])
+            rules = ", ".join(html.escape(rule) for rule in change['rules'])
+            text += f"{mark} <i>{preview}</i> · <code>{rules}</code>\n"
+    text += "\n<i>Прогоняются только сохранённые лиды; полный архив — python backtest.py</i>"
+    return text
+
+
+# ==================== ПРОФИЛИРОВАНИЕ ВОРКЕРОВ ====================
+
+# Как часто бот проверяет, готов ли отчёт (секунды)
+PROFILE_POLL_INTERVAL = 2
+PROFILE_BUTTONS = {'cpu': "🔥 CPU", 'sample': "📈 Выборка", 'memory': "🧠 Память"}
+
+
+def worker_name(account: dict) -> str:
+    """Имя воркера аккаунта (как в run.py: файл сессии)."""
+    return account.get("session_file") or 'parser_session'
+
+
+def profile_keyboard(seconds: float) -> InlineKeyboardMarkup:
+    """Клавиатура профилирования: режимы для каждого активного аккаунта (по номеру из текста)."""
+    keyboard = []
+    for number, account in enumerate(AccountStore.active_accounts(), 1):
+        keyboard.append([
+            InlineKeyboardButton(text=f"{number} · {label}",
+                                 callback_data=f"prof:{kind}:{seconds:g}:{account.get('id')}")
+            for kind, label in PROFILE_BUTTONS.items()
+        ])
+    keyboard.append([InlineKeyboardButton(text="⬅ Назад", callback_data="main_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_profile_text(seconds: float) -> str:
+    """Получить текст экрана профилирования."""
+    accounts = "".join(
+        f"{number}. <code>{html.escape(account.get('phone') or worker_name(account))}</code>\n"
+        for number, account in enumerate(AccountStore.active_accounts(), 1)
+    ) or "<i>Активных аккаунтов нет</i>\n"
+    return (
+        "🩺 <b>ПРОФИЛИРОВАНИЕ ВОРКЕРА</b>\n\n"
+        f"{accounts}\n"
+        f"Окно: <b>{seconds:g} с</b> (другое — /profile секунды)\n\n"
+        "• <b>CPU (cProfile)</b> — точное время по функциям, воркер на время замера медленнее\n"
+        "• <b>CPU (выборка стека)</b> — доли времени по функциям, почти без нагрузки\n"
+        "• <b>Память (tracemalloc)</b> — где выросла память за окно\n\n"
+        "Воркер не перезапускается; отчёт придёт документом."
+    )
+
+
+async def deliver_profile(chat_id: int, request_id: int, timeout: float):
+    """Дождаться отчёта воркера и отправить его документом."""
+    deadline = time.monotonic() + timeout
+    request = None
+    while time.monotonic() < deadline:
+        await asyncio.sleep(PROFILE_POLL_INTERVAL)
+        request = db.get_profile_request(request_id)
+        if request and request['status'] in ('done', 'failed'):
+            break
+    else:
+        # Воркер не взял запрос или не успел — отменяем, чтобы он не начал его позже
+        db.finish_profile_request(request_id, error="Истекло время ожидания")
+        await bot.send_message(chat_id, "❌ Воркер не прислал отчёт вовремя (не запущен или занят)")
+        return
+    
+    if request['status'] == 'failed':
+        await bot.send_message(chat_id, f"❌ Профилирование не удалось: {html.escape(request['error'] or '')}",
+                               parse_mode="HTML")
+        return
+    filename = f"profile-{request['kind']}-{request['worker']}-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+    await bot.send_document(
+        chat_id,
+        BufferedInputFile(request['result'].encode('utf-8'), filename=filename.replace('/', '_')),
+        caption=f"🩺 {PROFILE_KINDS.get(request['kind'], request['kind'])}, {request['seconds']:g} с — {request['worker']}"
+    )
+
+
+@router.callback_query(F.data.startswith("prof:"))
+async def start_profile(callback: CallbackQuery):
+    """Попросить воркер аккаунта снять профиль."""
+    if not is_superadmin(callback.from_user.id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    _, kind, seconds, account_id = callback.data.split(":", 3)
+    seconds = float(seconds)
+    account = AccountStore.get_account(account_id)
+    if not account or kind not in PROFILE_KINDS:
+        await callback.answer("❌ Аккаунт не найден", show_alert=True)
+        return
+    
+    worker = worker_name(account)
+    alive = any(
+        item['worker'] == worker and time.time() - item['updated_at'] < config.STATS_FLUSH_INTERVAL * 3
+        for item in db.get_worker_stats()
+    )
+    if not alive:
+        await callback.answer("❌ Воркер этого аккаунта сейчас не работает", show_alert=True)
+        return
+    
+    db.purge_profile_requests()
+    request_id = db.request_profile(worker, kind, seconds)
+    # Воркер забирает запрос при сохранении счётчиков (раз в STATS_FLUSH_INTERVAL)
+    timeout = seconds + config.STATS_FLUSH_INTERVAL * 2 + 30
+    asyncio.create_task(deliver_profile(callback.message.chat.id, request_id, timeout))
+    
+    await callback.message.edit_text(
+        f"⏳ {PROFILE_KINDS[kind]} для <code>{html.escape(worker)}</code>: {seconds:g} с.\n"
+        f"Отчёт придёт документом примерно через {seconds + config.STATS_FLUSH_INTERVAL:.0f} с.",
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+# ==================== СТАТИСТИКА ====================
+
+# Периоды статистики: часы → подпись
+STATS_PERIODS = {24: "24 часа", 168: "7 дней", 720: "30 дней"}
+_SPARK = "▁▂▃▄▅▆▇█"
+
+
+def statistics_keyboard(hours: int) -> InlineKeyboardMarkup:
+    """Клавиатура статистики: выбор периода."""
+    periods = [
+        InlineKeyboardButton(
+            text=f"{'• ' if period == hours else ''}{title}",
+            callback_data=f"stats:{period}"
+        )
+        for period, title in STATS_PERIODS.items()
+    ]
+    keyboard = [
+        periods,
+        [InlineKeyboardButton(text="⬅ Назад", callback_data="main_menu")]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_statistics_text(hours: int, user_id: int) -> str:
+    """Получить текст статистики (только из почасовых таблиц)."""
+    # Суперадмин видит все профили и трафик воркеров, админ профиля — свой профиль
+    superadmin = is_superadmin(user_id)
+    tenant_id = None if superadmin else (current_tenant_id(user_id) or -1)
+    stats = db.get_statistics(hours, tenant_id=tenant_id)
+    
+    text = f"📈 <b>СТАТИСТИКА</b> — {STATS_PERIODS.get(hours, f'{hours} ч')}\n\n"
+    text += f"🔥 Лидов: <b>{stats['leads']}</b>\n"
+    if superadmin:
+        text += (
+            f"👁 Просмотрено сообщений: <b>{stats['seen']}</b>\n"
+            f"🚫 Отклонено фильтрами: <b>{stats['rejected']}</b>\n"
+        )
+    
+    if hours <= 24 and stats['by_hour']:
+        peak = max(leads for _, leads in stats['by_hour'])
+        spark = "".join(_SPARK[min(7, leads * 8 // (peak + 1))] for _, leads in stats['by_hour'])
+        text += f"\n<b>По часам:</b> <code>{spark}</code>\n"
+    
+    if stats['top_chats']:
+        text += "\n<b>Чаты с лидами:</b>\n"
+        for title, leads in stats['top_chats']:
+            text += f"• {html.escape(str(title))} — {leads}\n"
+    
+    if stats['top_keywords']:
+        text += "\n<b>Ключевые слова:</b>\n"
+        for keyword, hits in stats['top_keywords']:
+            text += f"• <code>{html.escape(keyword)}</code> — {hits}\n"
+    
+    if not stats['leads'] and not stats['seen']:
+        text += "\n<i>Данных за период пока нет.</i>"
+    return text
+
+
+@router.callback_query(F.data.startswith("stats:"))
+async def show_statistics(callback: CallbackQuery):
+    """Показать статистику."""
+    hours = int(callback.data.split(":", 1)[1])
+    try:
+        await callback.message.edit_text(
+            get_statistics_text(hours, callback.from_user.id),
+            reply_markup=statistics_keyboard(hours),
+            parse_mode="HTML"
+        )
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
+
+
 # ==================== ИСТОРИЯ ЛИДОВ ====================
 
 @router.callback_query(F.data == "lead_history")
 async def show_lead_history(callback: CallbackQuery):
     """Показать историю лидов."""
-    logs = db.get_recent_logs(10)
+    # Суперадмин видит лиды всех профилей, админ профиля — только своего
+    if is_superadmin(callback.from_user.id):
+        logs = db.get_recent_logs(10)
+    else:
+        tenant_id = current_tenant_id(callback.from_user.id)
+        logs = db.get_recent_logs(10, tenant_id=tenant_id) if tenant_id else []
     
     if not logs:
         text = "📜 <b>ИСТОРИЯ ЛИДОВ</b>\n\nЛиды пока не найдены."
@@ -896,28 +1833,126 @@ async def show_lead_history(callback: CallbackQuery):
     await callback.answer()
 
 
-# ==================== ЗАГЛУШКИ БУДУЩИХ ФУНКЦИЙ ====================
+# ==================== МОДУЛЬ ИСТОЧНИКОВ ====================
 
-@router.callback_query(F.data == "import_sources")
-async def import_sources_stub(callback: CallbackQuery):
-    """Заглушка для импорта источников."""
+def sources_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура управления источниками."""
+    keyboard = []
+    for source in db.get_sources():
+        mark = "✅" if source.get('mode') != 'exclude' else "🚫"
+        if source.get('peer_id') is not None:
+            resolved = ""
+        else:
+            resolved = " ⚠️" if source.get('resolve_error') else " ⏳"
+        keyboard.append([InlineKeyboardButton(
+            text=f"❌ {mark} {source['title']}{resolved}",
+            callback_data=f"del_src:{source['id']}"
+        )])
+    keyboard.append([
+        InlineKeyboardButton(text="➕ Разрешить чат", callback_data="src_add:include"),
+        InlineKeyboardButton(text="➖ Исключить чат", callback_data="src_add:exclude")
+    ])
+    keyboard.append([InlineKeyboardButton(text="⬅ Назад", callback_data="main_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_sources_text() -> str:
+    """Получить текст для модуля источников."""
+    sources = db.get_sources()
+    include = sum(1 for s in sources if s.get('mode') != 'exclude')
+    exclude = len(sources) - include
+    failed = [s for s in sources if s.get('peer_id') is None and s.get('resolve_error')]
     text = (
-        "📥 <b>ИМПОРТ ИСТОЧНИКОВ</b>\n\n"
-        "⚠️ Функция автоподписки на группы пока в разработке.\n\n"
-        "В будущих версиях здесь можно будет:\n"
-        "• Добавлять ссылки на группы и каналы\n"
-        "• Автоматически подписываться на них\n"
-        "• Управлять списком источников"
+        "📥 <b>ИСТОЧНИКИ</b>\n\n"
+        f"✅ Разрешённых чатов: <b>{include}</b>\n"
+        f"🚫 Исключённых чатов: <b>{exclude}</b>\n\n"
+        "Если есть хотя бы один разрешённый чат — парсер слушает только разрешённые. "
+        "Исключённые чаты не обрабатываются никогда. Изменения применяются без перезапуска.\n\n"
+        "Для удаления нажмите на источник. ⏳ — воркер ещё не нашёл чат, "
+        "⚠️ — чат найти не удалось (не учитывается, воркер повторяет поиск).\n\n"
     )
+    if failed:
+        text += "⚠️ <b>Не найдены:</b>\n"
+        for source in failed:
+            text += (f"• {html.escape(source['title'])} — "
+                     f"<code>{html.escape(source['resolve_error'][:100])}</code>\n")
+        text += "\n"
+    return text + "<i>Формат: @username, https://t.me/username или ID чата (-100...)</i>"
+
+
+@router.callback_query(F.data == "import_sources")
+async def show_sources(callback: CallbackQuery, state: FSMContext):
+    """Показать модуль источников (общий для всех профилей — только суперадмину)."""
+    await state.clear()
+    if not await superadmin_or_deny(callback):
+        return
     
     await callback.message.edit_text(
-        text,
+        get_sources_text(),
+        reply_markup=sources_keyboard(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("src_add:"))
+async def add_source_start(callback: CallbackQuery, state: FSMContext):
+    """Начать добавление источника."""
+    if not await superadmin_or_deny(callback):
+        return
+    mode = callback.data.split(":", 1)[1]
+    if mode == "exclude":
+        await state.set_state(Form.waiting_source_exclude)
+        prompt = "Отправьте чат, который нужно исключить:"
+    else:
+        await state.set_state(Form.waiting_source_include)
+        prompt = "Отправьте чат, который нужно слушать:"
+    
+    await callback.message.edit_text(
+        f"{prompt}\n\n<i>@username, https://t.me/username или ID чата</i>",
         reply_markup=back_to_main_keyboard(),
         parse_mode="HTML"
     )
     await callback.answer()
 
 
+@router.message(StateFilter(Form.waiting_source_include, Form.waiting_source_exclude))
+async def add_source(message: Message, state: FSMContext):
+    """Добавить источник."""
+    if not is_superadmin(message.from_user.id):
+        await state.clear()
+        await message.answer("❌ Нет доступа")
+        return
+    link = message.text.strip()
+    mode = "exclude" if await state.get_state() == Form.waiting_source_exclude.state else "include"
+    
+    if db.add_source(title=link, link=link, mode=mode):
+        await message.answer(f"✅ Источник добавлен: {link}")
+    else:
+        await message.answer(f"❌ Источник уже существует: {link}")
+    
+    await state.clear()
+    await message.answer(get_sources_text(), reply_markup=sources_keyboard(), parse_mode="HTML")
+
+
+@router.callback_query(F.data.startswith("del_src:"))
+async def delete_source(callback: CallbackQuery):
+    """Удалить источник."""
+    if not await superadmin_or_deny(callback):
+        return
+    source_id = int(callback.data.split(":", 1)[1])
+    db.remove_source(source_id)
+    
+    await callback.message.edit_text(
+        get_sources_text(),
+        reply_markup=sources_keyboard(),
+        parse_mode="HTML"
+    )
+    await callback.answer("✅ Удалено")
+
+
+# ==================== ЗАГЛУШКИ БУДУЩИХ ФУНКЦИЙ ====================
+
 @router.callback_query(F.data == "outbox")
 async def outbox_stub(callback: CallbackQuery):
     """Заглушка для исходящих сообщений."""
@@ -973,19 +2008,44 @@ async def show_help(callback: CallbackQuery):
 
 # ==================== ЗАПУСК БОТА ====================
 
+# Под этим именем бот сохраняет свои метрики рядом со счётчиками воркеров
+BOT_STATS_NAME = "bot"
+
+
+async def flush_loop_stats(monitor: LoopMonitor, started_at: float):
+    """Периодически сохранять задержку цикла событий бота (видна на /metrics и в карточке статуса)."""
+    while True:
+        await asyncio.sleep(config.STATS_FLUSH_INTERVAL)
+        try:
+            db.save_worker_stats(BOT_STATS_NAME, started_at,
+                                 {'slow_callbacks': monitor.slow_callbacks}, monitor.metrics.to_dict())
+        except Exception as e:
+            logger.error(f"Ошибка сохранения метрик бота: {e}")
+
+
 async def main():
     """Главная функция запуска бота."""
+    init()
     dp.include_router(router)
     
+    # Задержка цикла событий и шаги, которые его блокируют (синхронные запросы к SQLite и т.п.)
+    monitor = LoopMonitor(Metrics())
+    monitor.start()
+    stats_task = asyncio.create_task(flush_loop_stats(monitor, time.time()))
+    
     logger.info("Бот запущен")
     
     try:
         await dp.start_polling(bot)
     finally:
+        stats_task.cancel()
+        await monitor.stop()
         await bot.session.close()
 
 
 if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging("bot")
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
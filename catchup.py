@@ -0,0 +1,206 @@
+"""
+Догрузка сообщений, пропущенных за время простоя воркера.
+
+Воркер запоминает последнее обработанное сообщение каждого чата (Watermarks;
+отметки сохраняются в chat_watermarks вместе со счётчиками). После перезапуска
+обработчик новых сообщений регистрируется сразу, а CatchUp в фоне догружает то,
+что пришло за время простоя: iter_messages(min_id=отметка, reverse=True) от старых
+к новым, несколько чатов одновременно, чаты с лидами — первыми, не быстрее
+CATCHUP_RATE сообщений в секунду на весь воркер. Догрузка чата останавливается
+на первом сообщении, которое уже получил обработчик, а обработчик пропускает
+сообщения, которые догрузка успела обработать раньше, поэтому сообщения не
+обрабатываются дважды.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class MessageEvent:
+    """Сообщение из истории чата в виде события NewMessage (то, что нужно обработчику воркера)."""
+
+    __slots__ = ('message', 'chat_id', 'sender_id')
+
+    def __init__(self, message):
+        self.message = message
+        self.chat_id = message.chat_id
+        # По sender_id автор берётся из кэша сущностей без get_sender()
+        self.sender_id = message.sender_id
+
+    async def get_sender(self):
+        return await self.message.get_sender()
+
+    async def get_chat(self):
+        return await self.message.get_chat()
+
+
+class Watermarks:
+    """
+    Последнее обработанное сообщение каждого чата.
+
+    Пока чат догружается, его отметка двигается только догрузкой, а новые
+    сообщения запоминаются отдельно и применяются в конце (finish): если воркер
+    упадёт посреди догрузки, следующий запуск продолжит с места остановки.
+    """
+
+    def __init__(self, marks: Optional[Dict[int, int]] = None):
+        """
+        Args:
+            marks: Сохранённые отметки (Database.get_watermarks)
+        """
+        self.marks: Dict[int, int] = dict(marks or {})
+        self._dirty: Dict[int, int] = {}
+        # Догружаемые чаты: chat_id → [первое новое сообщение, последнее новое сообщение]
+        self._pending: Dict[int, List[int]] = {}
+
+    def live(self, chat_id: Optional[int], message_id: int) -> bool:
+        """
+        Учесть сообщение, пришедшее обработчику новых сообщений.
+
+        Returns:
+            False, если догрузка чата уже обработала это сообщение
+        """
+        if chat_id is None:
+            return True
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            self._advance(chat_id, message_id)
+            return True
+        if message_id <= self.marks.get(chat_id, 0):
+            return False
+        if not pending[0]:
+            pending[0] = pending[1] = message_id
+        else:
+            pending[1] = max(pending[1], message_id)
+        return True
+
+    def first_live(self, chat_id: int) -> int:
+        """Первое сообщение догружаемого чата, полученное обработчиком (0 — ещё не было)."""
+        pending = self._pending.get(chat_id)
+        return pending[0] if pending else 0
+
+    def begin(self, chat_ids: Iterable[int]):
+        """Начать догрузку чатов."""
+        for chat_id in chat_ids:
+            self._pending.setdefault(chat_id, [0, 0])
+
+    def backfilled(self, chat_id: int, message_id: int):
+        """Учесть догруженное сообщение."""
+        self._advance(chat_id, message_id)
+
+    def finish(self, chat_id: int):
+        """Закончить догрузку чата: отметка переходит к последнему новому сообщению."""
+        pending = self._pending.pop(chat_id, None)
+        if pending and pending[1]:
+            self._advance(chat_id, pending[1])
+
+    def take_dirty(self) -> Dict[int, int]:
+        """Забрать изменённые с прошлого сохранения отметки."""
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def _advance(self, chat_id: int, message_id: int):
+        if message_id > self.marks.get(chat_id, 0):
+            self.marks[chat_id] = message_id
+            self._dirty[chat_id] = message_id
+
+
+class CatchUp:
+    """Догрузка пропущенных сообщений через тот же обработчик, что и новые сообщения."""
+
+    def __init__(self, client, watermarks: Watermarks, handle: Callable[[Any], Awaitable[None]],
+                 input_peer: Optional[Callable[[int], Any]] = None,
+                 concurrency: int = config.CATCHUP_CONCURRENCY,
+                 rate: float = config.CATCHUP_RATE,
+                 max_messages: int = config.CATCHUP_MAX_MESSAGES,
+                 max_age_hours: float = config.CATCHUP_MAX_AGE_HOURS):
+        """
+        Args:
+            client: Клиент Telethon
+            watermarks: Отметки чатов
+            handle: Обработчик события нового сообщения
+            input_peer: chat_id → InputPeer из кэша сущностей (None — искать чат через Telethon)
+            concurrency: Сколько чатов догружать одновременно
+            rate: Сколько сообщений в секунду обрабатывать (на все чаты)
+            max_messages: Сколько сообщений одного чата догружать не больше
+            max_age_hours: Сообщения старше стольких часов пропускаются (0 — без ограничения)
+        """
+        self.client = client
+        self.watermarks = watermarks
+        self.handle = handle
+        self.input_peer = input_peer
+        self.concurrency = max(1, concurrency)
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.max_messages = max_messages
+        self.max_age_hours = max_age_hours
+        self._next_slot = 0.0
+
+    async def _pace(self):
+        """Выдержать паузу, чтобы не превышать CATCHUP_RATE."""
+        if not self.interval:
+            await asyncio.sleep(0)
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+    async def run(self, chat_ids: List[int]) -> int:
+        """
+        Догрузить чаты (в порядке приоритета).
+
+        Args:
+            chat_ids: Чаты с сохранёнными отметками, важные — первыми
+
+        Returns:
+            Сколько сообщений обработано
+        """
+        self.watermarks.begin(chat_ids)
+        # Семафор пропускает ожидающих по очереди, поэтому порядок чатов сохраняется
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def catch_up(chat_id: int) -> int:
+            async with semaphore:
+                try:
+                    count = await self.catch_up_chat(chat_id)
+                except Exception as e:
+                    logger.warning(f"Не удалось догрузить чат {chat_id}: {e}")
+                    count = 0
+                # При остановке воркера (отмена) отметка остаётся на месте остановки догрузки
+                self.watermarks.finish(chat_id)
+                return count
+
+        return sum(await asyncio.gather(*(catch_up(chat_id) for chat_id in chat_ids)))
+
+    async def catch_up_chat(self, chat_id: int) -> int:
+        """Догрузить один чат от сохранённой отметки до первого нового сообщения."""
+        min_id = self.watermarks.marks.get(chat_id, 0)
+        since = (datetime.now(timezone.utc) - timedelta(hours=self.max_age_hours)
+                 if self.max_age_hours > 0 else None)
+        peer = (self.input_peer(chat_id) if self.input_peer else None) or chat_id
+        fetched = processed = 0
+        async for message in self.client.iter_messages(peer, min_id=min_id, reverse=True,
+                                                       limit=self.max_messages or None):
+            first_live = self.watermarks.first_live(chat_id)
+            if first_live and message.id >= first_live:
+                break
+            fetched += 1
+            if since is None or message.date is None or message.date >= since:
+                await self._pace()
+                await self.handle(MessageEvent(message))
+                processed += 1
+            self.watermarks.backfilled(chat_id, message.id)
+        else:
+            if self.max_messages and fetched >= self.max_messages:
+                logger.warning(f"Чат {chat_id}: догружено {fetched} сообщений (CATCHUP_MAX_MESSAGES), "
+                               "более новые пропущенные сообщения не проверены")
+        if processed:
+            logger.info(f"Чат {chat_id}: догружено {processed} пропущенных сообщений")
+        return processed
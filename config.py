@@ -27,4 +27,93 @@ DATABASE_PATH = os.getenv("DATABASE_PATH", "parser.db")
 
 # Настройки логирования
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Формат (text или json), каталог файлов логов с ротацией (пусто — только stderr),
+# размер файла (МБ), сколько старых файлов хранить, длина очереди записей
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_DIR = os.getenv("LOG_DIR", "")
+LOG_FILE_MAX_MB = float(os.getenv("LOG_FILE_MAX_MB", "20"))
+LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
 
+
+# Размер LRU-кэша лемм для режима морфологии (pymorphy2)
+LEMMA_CACHE_SIZE = int(os.getenv("LEMMA_CACHE_SIZE", "50000"))
+
+# Отправка уведомлений: сообщений в минуту на один чат и сколько можно отправить подряд
+NOTIFY_RATE_PER_MINUTE = float(os.getenv("NOTIFY_RATE_PER_MINUTE", "20"))
+NOTIFY_BURST = int(os.getenv("NOTIFY_BURST", "3"))
+# Быстрые повторы при ошибках отправки (FloodWait повторяется всегда);
+# дальше уведомление возвращается в очередь в базе с растущей задержкой
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "2"))
+# Режим сводки: с какой длины очереди чата лиды объединяются в одно сообщение
+DIGEST_THRESHOLD = int(os.getenv("DIGEST_THRESHOLD", "3"))
+
+# Очередь уведомлений в базе: как часто проверять, сколько попыток,
+# через сколько секунд забрать уведомление упавшего воркера и сколько
+# уведомлений воркер держит у диспетчера одновременно (больше не забирает)
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "600"))
+OUTBOX_MAX_IN_FLIGHT = int(os.getenv("OUTBOX_MAX_IN_FLIGHT", "100"))
+
+# Склейка кросс-постов: окно (с) после первого лида, в которое повторы того же текста
+# от того же отправителя не отправляются отдельно (0 — выключено), и пауза перед сводкой
+CROSSPOST_WINDOW = float(os.getenv("CROSSPOST_WINDOW", "900"))
+CROSSPOST_FOLLOWUP_DELAY = float(os.getenv("CROSSPOST_FOLLOWUP_DELAY", "60"))
+
+# Склейка альбомов: сколько секунд ждать следующую часть альбома (0 — каждая часть отдельно)
+ALBUM_WINDOW = float(os.getenv("ALBUM_WINDOW", "1.0"))
+
+# Приёмники лидов через запятую: telegram, webhook, jsonl
+LEAD_SINKS = [x.strip() for x in os.getenv("LEAD_SINKS", "telegram").split(",") if x.strip()]
+# Webhook (например, CRM): адрес, токен (Authorization: Bearer), размер и задержка пачки
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_TOKEN = os.getenv("WEBHOOK_TOKEN", "")
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_BATCH_DELAY = float(os.getenv("WEBHOOK_BATCH_DELAY", "2"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_RETRIES = int(os.getenv("WEBHOOK_MAX_RETRIES", "8"))
+# Журнал лидов JSONL: каталог, размер сегмента (МБ), сколько сегментов хранить
+LEAD_LOG_DIR = os.getenv("LEAD_LOG_DIR", "leads")
+LEAD_LOG_SEGMENT_MB = int(os.getenv("LEAD_LOG_SEGMENT_MB", "64"))
+LEAD_LOG_MAX_SEGMENTS = int(os.getenv("LEAD_LOG_MAX_SEGMENTS", "20"))
+
+# Догрузка пропущенного после перезапуска воркера: сколько сообщений одного чата догружать
+# не больше (0 — выключено), сообщения старше скольких часов пропускать (0 — не пропускать),
+# сколько чатов догружать одновременно и сколько сообщений в секунду обрабатывать
+CATCHUP_MAX_MESSAGES = int(os.getenv("CATCHUP_MAX_MESSAGES", "1000"))
+CATCHUP_MAX_AGE_HOURS = float(os.getenv("CATCHUP_MAX_AGE_HOURS", "24"))
+CATCHUP_CONCURRENCY = int(os.getenv("CATCHUP_CONCURRENCY", "3"))
+CATCHUP_RATE = float(os.getenv("CATCHUP_RATE", "20"))
+
+# Кэш сущностей (чаты и авторы) между перезапусками: каталог, срок жизни записи (часы),
+# как часто сохранять (секунды); при запуске — участники скольких чатов с лидами
+# и сколько участников одного чата загружать
+ENTITY_CACHE_DIR = os.getenv("ENTITY_CACHE_DIR", "entity_cache")
+ENTITY_CACHE_TTL_HOURS = float(os.getenv("ENTITY_CACHE_TTL_HOURS", "72"))
+ENTITY_CACHE_SAVE_INTERVAL = float(os.getenv("ENTITY_CACHE_SAVE_INTERVAL", "300"))
+ENTITY_WARMUP_CHATS = int(os.getenv("ENTITY_WARMUP_CHATS", "5"))
+ENTITY_WARMUP_PARTICIPANTS = int(os.getenv("ENTITY_WARMUP_PARTICIPANTS", "200"))
+
+# Как часто воркер сохраняет свои счётчики в базу (секунды)
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "10"))
+# Время проверки правил замеряется на каждом N-м сообщении (0 — не замерять)
+RULE_PROFILE_SAMPLE = int(os.getenv("RULE_PROFILE_SAMPLE", "100"))
+# Как часто замерять задержку цикла событий (секунды, 0 — не замерять)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+# Если цикл событий занят дольше стольких миллисекунд — в лог пишется задача и стек (0 — не следить)
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "200"))
+
+# Профилирование воркера из бота (/profile): длительность по умолчанию и максимум (секунды),
+# шаг статистической выборки стека (секунды)
+PROFILE_DEFAULT_SECONDS = float(os.getenv("PROFILE_DEFAULT_SECONDS", "30"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# Локальный HTTP API только для чтения (0 — выключен)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "0"))
+# Токен доступа к API (заголовок Authorization: Bearer ...); пусто — без проверки
+API_TOKEN = os.getenv("API_TOKEN", "")
+# Сколько секунд ответы API берутся из кэша
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "5"))
@@ -0,0 +1,106 @@
+"""
+Склейка кросс-постов: одно и то же объявление от одного отправителя в разных чатах.
+
+Первое сообщение уходит уведомлением сразу. Повторы того же текста (по отпечатку
+нормализованного текста) от того же отправителя в течение окна не проверяются
+заново и не отправляются по отдельности: чаты копятся в памяти, а через короткую
+паузу уходит одно дополнительное сообщение со списком чатов, появившихся
+с прошлого уведомления.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CrossPost:
+    """Объявление, замеченное в нескольких чатах."""
+    sender_id: int
+    fingerprint: str
+    tenant_ids: List[int]
+    first_seen: float
+    # Все чаты с объявлением: (название, ссылка на сообщение)
+    chats: List[Tuple[str, str]] = field(default_factory=list)
+    # Сколько первых чатов уже было в уведомлениях (первый — сам лид)
+    notified: int = 1
+    # Последний повтор — по нему ставится дополнительное уведомление
+    last_chat_id: int = 0
+    last_message_id: int = 0
+    flush_task: Optional[asyncio.Task] = None
+
+
+class CrossPostAggregator:
+    """TTL-словарь (отправитель, отпечаток) → кросс-пост."""
+
+    def __init__(self, flush: Callable[[CrossPost], Awaitable[None]],
+                 window: float = config.CROSSPOST_WINDOW,
+                 delay: float = config.CROSSPOST_FOLLOWUP_DELAY):
+        """
+        Args:
+            flush: Корутина отправки дополнительного уведомления со списком чатов
+            window: Сколько секунд после первого сообщения повторы склеиваются (0 — выключено)
+            delay: Сколько секунд копить повторы перед дополнительным уведомлением
+        """
+        self._flush = flush
+        self.window = window
+        self.delay = delay
+        self._entries: "OrderedDict[Tuple[int, str], CrossPost]" = OrderedDict()
+
+    def _expire(self, now: float):
+        # Записи добавляются по времени, поэтому устаревшие всегда в начале
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.first_seen + self.window > now:
+                break
+            self._entries.popitem(last=False)
+
+    def remember(self, sender_id: int, fingerprint: str, tenant_ids: List[int],
+                 chat_title: str, message_link: str):
+        """Запомнить отправленный лид, чтобы склеивать его повторы."""
+        if not self.window or not sender_id:
+            return
+        now = time.monotonic()
+        self._expire(now)
+        key = (sender_id, fingerprint)
+        self._entries.pop(key, None)
+        self._entries[key] = CrossPost(
+            sender_id, fingerprint, list(tenant_ids), now, [(chat_title, message_link)]
+        )
+
+    def fold(self, sender_id: int, fingerprint: str, chat_id: int, message_id: int,
+             chat_title: str, message_link: str) -> bool:
+        """
+        Склеить сообщение с уже отправленным лидом, если это его повтор.
+
+        Returns:
+            True если сообщение — повтор и отдельное уведомление не нужно
+        """
+        if not self.window or not sender_id:
+            return False
+        self._expire(time.monotonic())
+        entry = self._entries.get((sender_id, fingerprint))
+        if entry is None:
+            return False
+        if any(link == message_link for _, link in entry.chats):
+            return True
+        entry.chats.append((chat_title, message_link))
+        entry.last_chat_id = chat_id
+        entry.last_message_id = message_id
+        if entry.flush_task is None or entry.flush_task.done():
+            entry.flush_task = asyncio.create_task(self._flush_later(entry))
+        return True
+
+    async def _flush_later(self, entry: CrossPost):
+        await asyncio.sleep(self.delay)
+        try:
+            await self._flush(entry)
+        except Exception as e:
+            logger.error("Ошибка при отправке сводки кросс-поста: %s", e)
@@ -3,14 +3,24 @@
 Управляет ключевыми словами, стоп-словами, черным списком, конфигом и историей лидов.
 """
 
+import json
 import sqlite3
 import logging
-from typing import List, Dict, Optional, Tuple
+import time
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 
 
 logger = logging.getLogger(__name__)
 
+# Профиль (тенант) по умолчанию — существующие правила до появления профилей
+DEFAULT_TENANT_ID = 1
+
+# Виды уведомлений в очереди: лид попадает в историю после отправки,
+# сводка кросс-поста — только уведомление о повторах уже отправленного лида
+NOTIFICATION_LEAD = 'lead'
+NOTIFICATION_CROSSPOST = 'crosspost'
+
 
 class Database:
     """Класс для работы с SQLite базой данных."""
@@ -25,6 +35,13 @@ class Database:
         self.db_path = db_path
         self.init_db()
     
+    # Таблицы, привязанные к профилю: таблица → колонка значения
+    TENANT_TABLES = {
+        'keywords': 'text TEXT NOT NULL',
+        'stopwords': 'text TEXT NOT NULL',
+        'blacklist': 'user_id INTEGER NOT NULL',
+    }
+    
     def get_connection(self) -> sqlite3.Connection:
         """Создать подключение к базе данных."""
         conn = sqlite3.connect(self.db_path)
@@ -35,67 +52,225 @@ class Database:
         """Создать все необходимые таблицы."""
         conn = self.get_connection()
         cursor = conn.cursor()
+        # Бот и воркеры стартуют одновременно — миграции выполняем под блокировкой
+        cursor.execute("BEGIN IMMEDIATE")
         
-        # Таблица ключевых слов
+        # Таблица профилей (тенантов): у каждого свои правила и чат уведомлений
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS keywords (
+            CREATE TABLE IF NOT EXISTS tenants (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                text TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL UNIQUE,
+                notification_chat_id TEXT DEFAULT '',
+                admin_ids TEXT DEFAULT '',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
         
-        # Таблица стоп-слов
+        # Таблицы правил профиля: ключевые слова, стоп-слова, черный список
+        for table, column in self.TENANT_TABLES.items():
+            self._ensure_tenant_table(cursor, table, column)
+        
+        # Таблица конфигурации
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS stopwords (
+            CREATE TABLE IF NOT EXISTS config (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                text TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                key TEXT NOT NULL UNIQUE,
+                value TEXT NOT NULL
             )
         """)
         
-        # Таблица черного списка
+        # Таблица истории лидов
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS blacklist (
+            CREATE TABLE IF NOT EXISTS logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                source_chat TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                text TEXT,
+                user_id INTEGER,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                chat_id INTEGER,
+                fingerprint TEXT
             )
         """)
         
-        # Таблица конфигурации
+        # Миграции: отпечаток нормализованного текста и профиль лида
+        cursor.execute("PRAGMA table_info(logs)")
+        log_columns = {row['name'] for row in cursor.fetchall()}
+        if 'fingerprint' not in log_columns:
+            cursor.execute("ALTER TABLE logs ADD COLUMN fingerprint TEXT")
+        if 'tenant_id' not in log_columns:
+            cursor.execute(f"ALTER TABLE logs ADD COLUMN tenant_id INTEGER DEFAULT {DEFAULT_TENANT_ID}")
+        # Сработавшие ключевые слова лида (через перевод строки)
+        if 'keywords' not in log_columns:
+            cursor.execute("ALTER TABLE logs ADD COLUMN keywords TEXT")
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS config (
+            CREATE INDEX IF NOT EXISTS idx_logs_fingerprint ON logs (fingerprint, timestamp)
+        """)
+        # Индексы для выборок API: по чату и по автору (постранично по id)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_chat ON logs (chat_id, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_user ON logs (user_id, id)")
+        
+        # Почасовая статистика (обновляется по мере записи лидов и сброса счётчиков воркеров)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_leads_hourly'")
+        backfill_leads = cursor.fetchone() is None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_leads_hourly (
+                hour TEXT NOT NULL,
+                tenant_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                chat_title TEXT,
+                leads INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hour, tenant_id, chat_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_keywords_hourly (
+                hour TEXT NOT NULL,
+                tenant_id INTEGER NOT NULL,
+                keyword TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hour, tenant_id, keyword)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_traffic_hourly (
+                hour TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                seen INTEGER NOT NULL DEFAULT 0,
+                rejected INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hour, chat_id)
+            )
+        """)
+        # Лиды, записанные до появления статистики, переносим один раз
+        if backfill_leads:
+            cursor.execute(f"""
+                INSERT INTO stats_leads_hourly (hour, tenant_id, chat_id, chat_title, leads)
+                SELECT strftime('%Y-%m-%d %H:00', timestamp), COALESCE(tenant_id, {DEFAULT_TENANT_ID}),
+                       COALESCE(chat_id, 0), MAX(source_chat), COUNT(*)
+                FROM logs GROUP BY 1, 2, 3
+            """)
+        
+        # Статистика ключевых слов: срабатывания, лиды, ложные срабатывания
+        # (автор лида потом попал в черный список) и выборочное время проверки
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS keyword_stats (
+                tenant_id INTEGER NOT NULL,
+                keyword TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                leads INTEGER NOT NULL DEFAULT 0,
+                false_positives INTEGER NOT NULL DEFAULT 0,
+                eval_count INTEGER NOT NULL DEFAULT 0,
+                eval_ns INTEGER NOT NULL DEFAULT 0,
+                last_hit_at REAL,
+                PRIMARY KEY (tenant_id, keyword)
+            )
+        """)
+        
+        # Счётчики воркеров (каждый воркер периодически сохраняет свои)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS worker_stats (
+                worker TEXT PRIMARY KEY,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                counters TEXT NOT NULL DEFAULT '{}',
+                latency TEXT NOT NULL DEFAULT '{}'
+            )
+        """)
+        cursor.execute("PRAGMA table_info(worker_stats)")
+        if 'latency' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE worker_stats ADD COLUMN latency TEXT NOT NULL DEFAULT '{}'")
+        
+        # Запросы профилирования воркеров из бота (воркер забирает свои, пишет отчёт в result)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS profile_requests (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                key TEXT NOT NULL UNIQUE,
-                value TEXT NOT NULL
+                worker TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                seconds REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
             )
         """)
         
-        # Таблица истории лидов
+        # Последнее обработанное сообщение каждого чата (по воркерам): после перезапуска
+        # воркер догружает пропущенное начиная с него
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS logs (
+            CREATE TABLE IF NOT EXISTS chat_watermarks (
+                worker TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (worker, chat_id)
+            )
+        """)
+        
+        # Очередь уведомлений: лид сначала записывается сюда, затем доставляется воркером.
+        # Ключ идемпотентности — сообщение-источник (chat_id, message_id) и профиль
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS notification_queue (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_chat TEXT NOT NULL,
+                tenant_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
                 message_id INTEGER NOT NULL,
+                notification_chat_id INTEGER NOT NULL,
+                notification_text TEXT NOT NULL,
+                source_chat TEXT,
                 text TEXT,
                 user_id INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                chat_id INTEGER
+                fingerprint TEXT,
+                keywords TEXT,
+                kind TEXT NOT NULL DEFAULT 'lead',
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                claimed_by TEXT,
+                claimed_at REAL,
+                sent_at REAL,
+                UNIQUE (chat_id, message_id, tenant_id)
             )
         """)
+        cursor.execute("PRAGMA table_info(notification_queue)")
+        queue_columns = {row['name'] for row in cursor.fetchall()}
+        if 'keywords' not in queue_columns:
+            cursor.execute("ALTER TABLE notification_queue ADD COLUMN keywords TEXT")
+        if 'kind' not in queue_columns:
+            cursor.execute("ALTER TABLE notification_queue ADD COLUMN kind TEXT NOT NULL DEFAULT 'lead'")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_queue_status ON notification_queue (status, next_attempt_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_queue_fingerprint ON notification_queue (fingerprint)
+        """)
         
-        # Таблица источников (для будущего функционала)
+        # Таблица источников: списки разрешённых (include) и исключённых (exclude) чатов
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS sources (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
                 link TEXT NOT NULL,
                 status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                mode TEXT DEFAULT 'include',
+                peer_id INTEGER,
+                resolve_error TEXT
             )
         """)
         
+        # Миграция: режим источника, разрешённый воркером peer id и ошибка поиска чата
+        cursor.execute("PRAGMA table_info(sources)")
+        source_columns = {row['name'] for row in cursor.fetchall()}
+        if 'mode' not in source_columns:
+            cursor.execute("ALTER TABLE sources ADD COLUMN mode TEXT DEFAULT 'include'")
+        if 'peer_id' not in source_columns:
+            cursor.execute("ALTER TABLE sources ADD COLUMN peer_id INTEGER")
+        if 'resolve_error' not in source_columns:
+            cursor.execute("ALTER TABLE sources ADD COLUMN resolve_error TEXT")
+        
         # Инициализация конфига по умолчанию
         default_configs = {
             'working_status': 'false',
@@ -103,7 +278,11 @@ class Database:
             'channels_enabled': 'true',
             'dialogs_enabled': 'false',
             'ignore_duplicates': 'true',
-            'notification_chat_id': ''
+            'morphology_enabled': 'false',
+            'digest_enabled': 'false',
+            'notification_chat_id': '',
+            'rules_version': '0',
+            'sources_version': '0'
         }
         
         for key, value in default_configs.items():
@@ -111,59 +290,271 @@ class Database:
                 INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)
             """, (key, value))
         
+        # Профиль по умолчанию наследует глобальный чат уведомлений
+        cursor.execute("""
+            INSERT OR IGNORE INTO tenants (id, name, notification_chat_id)
+            SELECT ?, 'Основной', value FROM config WHERE key = 'notification_chat_id'
+        """, (DEFAULT_TENANT_ID,))
+        
         conn.commit()
         conn.close()
         logger.info("База данных инициализирована")
     
+    @staticmethod
+    def _ensure_tenant_table(cursor: sqlite3.Cursor, table: str, column: str):
+        """
+        Создать таблицу правил профиля или перенести в неё старую таблицу без профилей.
+        
+        Уникальность значения раньше была глобальной (UNIQUE(text)), теперь — в пределах
+        профиля, поэтому старая таблица пересоздаётся, а её строки уходят в профиль по умолчанию.
+        """
+        name = column.split()[0]
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = {row['name'] for row in cursor.fetchall()}
+        if columns and 'tenant_id' in columns:
+            return
+        if columns:
+            cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        cursor.execute(f"""
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant_id INTEGER NOT NULL DEFAULT {DEFAULT_TENANT_ID},
+                {column},
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (tenant_id, {name})
+            )
+        """)
+        if columns:
+            cursor.execute(f"""
+                INSERT INTO {table} (id, {name}, created_at)
+                SELECT id, {name}, created_at FROM {table}_old
+            """)
+            cursor.execute(f"DROP TABLE {table}_old")
+            logger.info(f"Таблица {table} перенесена в профиль по умолчанию")
+    
+    @staticmethod
+    def _bump_rules_version(cursor: sqlite3.Cursor):
+        """Увеличить версию правил, чтобы воркеры перечитали свой снимок."""
+        cursor.execute("""
+            UPDATE config SET value = CAST(value AS INTEGER) + 1 WHERE key = 'rules_version'
+        """)
+    
+    # ==================== ПРОФИЛИ (ТЕНАНТЫ) ====================
+    
+    def add_tenant(self, name: str) -> Optional[int]:
+        """
+        Создать профиль.
+        
+        Args:
+            name: Название профиля
+            
+        Returns:
+            ID профиля или None, если такое название уже есть
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO tenants (name) VALUES (?)", (name.strip(),))
+            tenant_id = cursor.lastrowid
+            self._bump_rules_version(cursor)
+            conn.commit()
+            logger.info(f"Добавлен профиль: {name}")
+            return tenant_id
+        except sqlite3.IntegrityError:
+            logger.warning(f"Профиль уже существует: {name}")
+            return None
+        finally:
+            conn.close()
+    
+    def remove_tenant(self, tenant_id: int) -> bool:
+        """
+        Удалить профиль вместе с его правилами (профиль по умолчанию удалить нельзя).
+        
+        Args:
+            tenant_id: ID профиля
+            
+        Returns:
+            True если удалено успешно
+        """
+        if tenant_id == DEFAULT_TENANT_ID:
+            return False
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        for table in self.TENANT_TABLES:
+            cursor.execute(f"DELETE FROM {table} WHERE tenant_id = ?", (tenant_id,))
+        cursor.execute("DELETE FROM tenants WHERE id = ?", (tenant_id,))
+        affected = cursor.rowcount
+        self._bump_rules_version(cursor)
+        conn.commit()
+        conn.close()
+        logger.info(f"Удален профиль: {tenant_id}")
+        return affected > 0
+    
+    def get_tenants(self) -> List[Dict]:
+        """
+        Получить список всех профилей.
+        
+        Returns:
+            Список словарей с данными профилей
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tenants ORDER BY id")
+        tenants = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return tenants
+    
+    def get_tenant(self, tenant_id: int) -> Optional[Dict]:
+        """
+        Получить профиль по ID.
+        
+        Args:
+            tenant_id: ID профиля
+            
+        Returns:
+            Словарь с данными профиля или None
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tenants WHERE id = ?", (tenant_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    def get_user_tenants(self, user_id: int) -> List[Dict]:
+        """
+        Получить профили, администратором которых является пользователь.
+        
+        Args:
+            user_id: ID пользователя Telegram
+            
+        Returns:
+            Список словарей с данными профилей
+        """
+        return [
+            t for t in self.get_tenants()
+            if str(user_id) in (t.get('admin_ids') or '').split(',')
+        ]
+    
+    def set_tenant_chat(self, tenant_id: int, chat_id: str):
+        """
+        Установить чат уведомлений профиля.
+        
+        Args:
+            tenant_id: ID профиля
+            chat_id: ID чата
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE tenants SET notification_chat_id = ? WHERE id = ?", (chat_id, tenant_id))
+        if tenant_id == DEFAULT_TENANT_ID:
+            cursor.execute("""
+                INSERT OR REPLACE INTO config (key, value) VALUES ('notification_chat_id', ?)
+            """, (chat_id,))
+        self._bump_rules_version(cursor)
+        conn.commit()
+        conn.close()
+        logger.info(f"Чат уведомлений профиля {tenant_id}: {chat_id}")
+    
+    def set_tenant_admins(self, tenant_id: int, admin_ids: List[int]):
+        """
+        Установить администраторов профиля.
+        
+        Args:
+            tenant_id: ID профиля
+            admin_ids: Список ID пользователей Telegram
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE tenants SET admin_ids = ? WHERE id = ?",
+            (",".join(str(x) for x in admin_ids), tenant_id)
+        )
+        conn.commit()
+        conn.close()
+        logger.info(f"Администраторы профиля {tenant_id}: {admin_ids}")
+    
+    def get_rules_snapshot(self) -> Dict[int, Dict]:
+        """
+        Получить правила всех профилей одним подключением.
+        
+        Returns:
+            Словарь tenant_id → {'tenant', 'keywords', 'stopwords', 'blacklist'}
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM tenants ORDER BY id")
+        snapshot = {
+            row['id']: {'tenant': dict(row), 'keywords': [], 'stopwords': [], 'blacklist': set()}
+            for row in cursor.fetchall()
+        }
+        for table, key in (('keywords', 'keywords'), ('stopwords', 'stopwords')):
+            cursor.execute(f"SELECT tenant_id, text FROM {table} ORDER BY created_at DESC")
+            for row in cursor.fetchall():
+                if row['tenant_id'] in snapshot:
+                    snapshot[row['tenant_id']][key].append(row['text'])
+        cursor.execute("SELECT tenant_id, user_id FROM blacklist")
+        for row in cursor.fetchall():
+            if row['tenant_id'] in snapshot:
+                snapshot[row['tenant_id']]['blacklist'].add(row['user_id'])
+        conn.close()
+        return snapshot
+    
     # ==================== КЛЮЧЕВЫЕ СЛОВА ====================
     
-    def add_keyword(self, text: str) -> bool:
+    def add_keyword(self, text: str, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Добавить ключевое слово.
         
         Args:
             text: Текст ключевого слова
+            tenant_id: ID профиля
             
         Returns:
             True если добавлено успешно, False если уже существует
         """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO keywords (text) VALUES (?)", (text.strip(),))
+            cursor.execute("INSERT INTO keywords (tenant_id, text) VALUES (?, ?)", (tenant_id, text.strip()))
+            self._bump_rules_version(cursor)
             conn.commit()
-            conn.close()
             logger.info(f"Добавлено ключевое слово: {text}")
             return True
         except sqlite3.IntegrityError:
             logger.warning(f"Ключевое слово уже существует: {text}")
             return False
+        finally:
+            conn.close()
     
-    def remove_keyword(self, text: str) -> bool:
+    def remove_keyword(self, text: str, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Удалить ключевое слово.
         
         Args:
             text: Текст ключевого слова
+            tenant_id: ID профиля
             
         Returns:
             True если удалено успешно
         """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM keywords WHERE text = ?", (text,))
+        cursor.execute("DELETE FROM keywords WHERE tenant_id = ? AND text = ?", (tenant_id, text))
         affected = cursor.rowcount
+        self._bump_rules_version(cursor)
         conn.commit()
         conn.close()
         logger.info(f"Удалено ключевое слово: {text}")
         return affected > 0
     
-    def get_keywords(self, sort_alpha: bool = False) -> List[str]:
+    def get_keywords(self, sort_alpha: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> List[str]:
         """
         Получить список всех ключевых слов.
         
         Args:
             sort_alpha: Сортировать по алфавиту
+            tenant_id: ID профиля
             
         Returns:
             Список ключевых слов
@@ -172,72 +563,79 @@ class Database:
         cursor = conn.cursor()
         
         if sort_alpha:
-            cursor.execute("SELECT text FROM keywords ORDER BY text COLLATE NOCASE")
+            cursor.execute("SELECT text FROM keywords WHERE tenant_id = ? ORDER BY text COLLATE NOCASE", (tenant_id,))
         else:
-            cursor.execute("SELECT text FROM keywords ORDER BY created_at DESC")
+            cursor.execute("SELECT text FROM keywords WHERE tenant_id = ? ORDER BY created_at DESC", (tenant_id,))
         
         keywords = [row['text'] for row in cursor.fetchall()]
         conn.close()
         return keywords
     
-    def clear_keywords(self):
-        """Удалить все ключевые слова."""
+    def clear_keywords(self, tenant_id: int = DEFAULT_TENANT_ID):
+        """Удалить все ключевых слов профиля."""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM keywords")
+        cursor.execute("DELETE FROM keywords WHERE tenant_id = ?", (tenant_id,))
+        self._bump_rules_version(cursor)
         conn.commit()
         conn.close()
-        logger.info("Все ключевые слова удалены")
+        logger.info(f"Все ключевые слова удалены (профиль {tenant_id})")
     
     # ==================== СТОП-СЛОВА ====================
     
-    def add_stopword(self, text: str) -> bool:
+    def add_stopword(self, text: str, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Добавить стоп-слово.
         
         Args:
             text: Текст стоп-слова
+            tenant_id: ID профиля
             
         Returns:
             True если добавлено успешно, False если уже существует
         """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO stopwords (text) VALUES (?)", (text.strip(),))
+            cursor.execute("INSERT INTO stopwords (tenant_id, text) VALUES (?, ?)", (tenant_id, text.strip()))
+            self._bump_rules_version(cursor)
             conn.commit()
-            conn.close()
             logger.info(f"Добавлено стоп-слово: {text}")
             return True
         except sqlite3.IntegrityError:
             logger.warning(f"Стоп-слово уже существует: {text}")
             return False
+        finally:
+            conn.close()
     
-    def remove_stopword(self, text: str) -> bool:
+    def remove_stopword(self, text: str, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Удалить стоп-слово.
         
         Args:
             text: Текст стоп-слова
+            tenant_id: ID профиля
             
         Returns:
             True если удалено успешно
         """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM stopwords WHERE text = ?", (text,))
+        cursor.execute("DELETE FROM stopwords WHERE tenant_id = ? AND text = ?", (tenant_id, text))
         affected = cursor.rowcount
+        self._bump_rules_version(cursor)
         conn.commit()
         conn.close()
         logger.info(f"Удалено стоп-слово: {text}")
         return affected > 0
     
-    def get_stopwords(self, sort_alpha: bool = False) -> List[str]:
+    def get_stopwords(self, sort_alpha: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> List[str]:
         """
         Получить список всех стоп-слов.
         
         Args:
             sort_alpha: Сортировать по алфавиту
+            tenant_id: ID профиля
             
         Returns:
             Список стоп-слов
@@ -246,72 +644,80 @@ class Database:
         cursor = conn.cursor()
         
         if sort_alpha:
-            cursor.execute("SELECT text FROM stopwords ORDER BY text COLLATE NOCASE")
+            cursor.execute("SELECT text FROM stopwords WHERE tenant_id = ? ORDER BY text COLLATE NOCASE", (tenant_id,))
         else:
-            cursor.execute("SELECT text FROM stopwords ORDER BY created_at DESC")
+            cursor.execute("SELECT text FROM stopwords WHERE tenant_id = ? ORDER BY created_at DESC", (tenant_id,))
         
         stopwords = [row['text'] for row in cursor.fetchall()]
         conn.close()
         return stopwords
     
-    def clear_stopwords(self):
-        """Удалить все стоп-слова."""
+    def clear_stopwords(self, tenant_id: int = DEFAULT_TENANT_ID):
+        """Удалить все стоп-слов профиля."""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM stopwords")
+        cursor.execute("DELETE FROM stopwords WHERE tenant_id = ?", (tenant_id,))
+        self._bump_rules_version(cursor)
         conn.commit()
         conn.close()
-        logger.info("Все стоп-слова удалены")
+        logger.info(f"Все стоп-слова удалены (профиль {tenant_id})")
     
     # ==================== ЧЕРНЫЙ СПИСОК ====================
     
-    def add_to_blacklist(self, user_id: int) -> bool:
+    def add_to_blacklist(self, user_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Добавить пользователя в черный список.
         
         Args:
             user_id: ID пользователя Telegram
+            tenant_id: ID профиля
             
         Returns:
             True если добавлено успешно, False если уже существует
         """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO blacklist (user_id) VALUES (?)", (user_id,))
+            cursor.execute("INSERT INTO blacklist (tenant_id, user_id) VALUES (?, ?)", (tenant_id, user_id))
+            self._bump_rules_version(cursor)
+            self._count_false_positives(cursor, user_id, tenant_id)
             conn.commit()
-            conn.close()
             logger.info(f"Добавлен в черный список: {user_id}")
             return True
         except sqlite3.IntegrityError:
             logger.warning(f"Пользователь уже в черном списке: {user_id}")
             return False
+        finally:
+            conn.close()
     
-    def remove_from_blacklist(self, user_id: int) -> bool:
+    def remove_from_blacklist(self, user_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Удалить пользователя из черного списка.
         
         Args:
             user_id: ID пользователя Telegram
+            tenant_id: ID профиля
             
         Returns:
             True если удалено успешно
         """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM blacklist WHERE user_id = ?", (user_id,))
+        cursor.execute("DELETE FROM blacklist WHERE tenant_id = ? AND user_id = ?", (tenant_id, user_id))
         affected = cursor.rowcount
+        self._bump_rules_version(cursor)
         conn.commit()
         conn.close()
         logger.info(f"Удален из черного списка: {user_id}")
         return affected > 0
     
-    def get_blacklist(self, sort_numeric: bool = False) -> List[int]:
+    def get_blacklist(self, sort_numeric: bool = False, tenant_id: int = DEFAULT_TENANT_ID) -> List[int]:
         """
         Получить список всех пользователей в черном списке.
         
         Args:
             sort_numeric: Сортировать по числовому значению
+            tenant_id: ID профиля
             
         Returns:
             Список ID пользователей
@@ -320,36 +726,38 @@ class Database:
         cursor = conn.cursor()
         
         if sort_numeric:
-            cursor.execute("SELECT user_id FROM blacklist ORDER BY user_id")
+            cursor.execute("SELECT user_id FROM blacklist WHERE tenant_id = ? ORDER BY user_id", (tenant_id,))
         else:
-            cursor.execute("SELECT user_id FROM blacklist ORDER BY created_at DESC")
+            cursor.execute("SELECT user_id FROM blacklist WHERE tenant_id = ? ORDER BY created_at DESC", (tenant_id,))
         
         blacklist = [row['user_id'] for row in cursor.fetchall()]
         conn.close()
         return blacklist
     
-    def clear_blacklist(self):
-        """Удалить всех пользователей из черного списка."""
+    def clear_blacklist(self, tenant_id: int = DEFAULT_TENANT_ID):
+        """Удалить всех пользователей из черного списка профиля."""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM blacklist")
+        cursor.execute("DELETE FROM blacklist WHERE tenant_id = ?", (tenant_id,))
+        self._bump_rules_version(cursor)
         conn.commit()
         conn.close()
-        logger.info("Черный список очищен")
+        logger.info(f"Черный список очищен (профиль {tenant_id})")
     
-    def is_blacklisted(self, user_id: int) -> bool:
+    def is_blacklisted(self, user_id: int, tenant_id: int = DEFAULT_TENANT_ID) -> bool:
         """
         Проверить, находится ли пользователь в черном списке.
         
         Args:
             user_id: ID пользователя Telegram
+            tenant_id: ID профиля
             
         Returns:
             True если в черном списке
         """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM blacklist WHERE user_id = ?", (user_id,))
+        cursor.execute("SELECT 1 FROM blacklist WHERE tenant_id = ? AND user_id = ?", (tenant_id, user_id))
         result = cursor.fetchone() is not None
         conn.close()
         return result
@@ -426,7 +834,8 @@ class Database:
     # ==================== ИСТОРИЯ ЛИДОВ ====================
     
     def add_log(self, source_chat: str, message_id: int, text: str, 
-                user_id: int, chat_id: int):
+                user_id: int, chat_id: int, fingerprint: Optional[str] = None,
+                tenant_id: int = DEFAULT_TENANT_ID):
         """
         Добавить запись в историю лидов.
         
@@ -436,23 +845,27 @@ class Database:
             text: Текст сообщения
             user_id: ID автора
             chat_id: ID чата
+            fingerprint: Отпечаток нормализованного текста (для поиска дубликатов)
+            tenant_id: ID профиля, которому отправлен лид
         """
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO logs (source_chat, message_id, text, user_id, chat_id)
-            VALUES (?, ?, ?, ?, ?)
-        """, (source_chat, message_id, text, user_id, chat_id))
+            INSERT INTO logs (source_chat, message_id, text, user_id, chat_id, fingerprint, tenant_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (source_chat, message_id, text, user_id, chat_id, fingerprint, tenant_id))
+        self._rollup_lead(cursor, tenant_id, chat_id, source_chat)
         conn.commit()
         conn.close()
         logger.info(f"Добавлен лог: {source_chat} - {message_id}")
     
-    def get_recent_logs(self, limit: int = 10) -> List[Dict]:
+    def get_recent_logs(self, limit: int = 10, tenant_id: Optional[int] = None) -> List[Dict]:
         """
         Получить последние записи из истории лидов.
         
         Args:
             limit: Количество записей
+            tenant_id: Только лиды этого профиля (None — все)
             
         Returns:
             Список словарей с данными лидов
@@ -460,59 +873,862 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT * FROM logs ORDER BY timestamp DESC LIMIT ?
-        """, (limit,))
+            SELECT * FROM logs WHERE (? IS NULL OR tenant_id = ?) ORDER BY timestamp DESC LIMIT ?
+        """, (tenant_id, tenant_id, limit))
+        logs = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return logs
+    
+    def query_logs(self, since: Optional[str] = None, until: Optional[str] = None,
+                   chat_id: Optional[int] = None, user_id: Optional[int] = None,
+                   text: Optional[str] = None, tenant_id: Optional[int] = None,
+                   before_id: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        """
+        Выбрать лиды по фильтрам, от новых к старым, постранично по id.
+        
+        Args:
+            since: Не раньше этого времени (UTC, 'YYYY-MM-DD HH:MM:SS')
+            until: Раньше этого времени (UTC)
+            chat_id: ID чата-источника
+            user_id: ID автора
+            text: Подстрока текста (без учёта регистра для латиницы)
+            tenant_id: ID профиля
+            before_id: Только записи с id меньше этого (курсор следующей страницы)
+            limit: Размер страницы
+            
+        Returns:
+            Список словарей с данными лидов
+        """
+        conditions = []
+        params: List = []
+        for condition, value in (
+            ("datetime(timestamp) >= datetime(?)", since),
+            ("datetime(timestamp) < datetime(?)", until),
+            ("chat_id = ?", chat_id),
+            ("user_id = ?", user_id),
+            ("tenant_id = ?", tenant_id),
+            ("id < ?", before_id),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if text:
+            conditions.append("text LIKE ? ESCAPE '\\'")
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM logs {where} ORDER BY id DESC LIMIT ?", (*params, limit))
         logs = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return logs
     
-    def check_duplicate(self, text: str, hours: int = 24) -> bool:
+    def iter_logs(self, days: Optional[int] = None, tenant_ids: Optional[List[int]] = None,
+                  batch: int = 1000) -> Iterator[Dict]:
+        """
+        Перебрать историю лидов от старых к новым, не загружая её в память целиком.
+        
+        Args:
+            days: Только за последние N дней (None — вся история)
+            tenant_ids: Только лиды этих профилей (None — все)
+            batch: Сколько строк читать за раз
+        
+        Yields:
+            Словари с данными лидов
+        """
+        conditions = []
+        params: List = []
+        if days is not None:
+            conditions.append("timestamp > datetime('now', ?)")
+            params.append(f"-{int(days)} days")
+        if tenant_ids is not None:
+            conditions.append(f"tenant_id IN ({','.join('?' * len(tenant_ids))})")
+            params.extend(tenant_ids)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM logs {where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+    
+    def check_duplicate(self, text: str, hours: int = 24,
+                        fingerprint: Optional[str] = None,
+                        tenant_id: Optional[int] = None) -> bool:
         """
         Проверить, есть ли дубликат сообщения за последние N часов.
         
+        Если передан отпечаток нормализованного текста, сравнение идёт по нему
+        (по индексу), иначе — по точному совпадению текста.
+        
         Args:
             text: Текст сообщения
             hours: Количество часов для проверки
+            fingerprint: Отпечаток нормализованного текста
+            tenant_id: Искать только среди лидов этого профиля
             
         Returns:
             True если дубликат найден
         """
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 1 FROM logs 
-            WHERE text = ? 
-            AND datetime(timestamp) > datetime('now', '-{} hours')
-            LIMIT 1
-        """.format(hours), (text,))
+        if fingerprint:
+            # Лиды, ещё ждущие отправки в очереди, тоже считаются
+            cursor.execute("""
+                SELECT 1 FROM logs 
+                WHERE fingerprint = ? 
+                AND (? IS NULL OR tenant_id = ?)
+                AND timestamp > datetime('now', '-{} hours')
+                UNION ALL
+                SELECT 1 FROM notification_queue
+                WHERE fingerprint = ?
+                AND (? IS NULL OR tenant_id = ?)
+                AND status IN ('pending', 'sending')
+                LIMIT 1
+            """.format(hours), (fingerprint, tenant_id, tenant_id, fingerprint, tenant_id, tenant_id))
+        else:
+            cursor.execute("""
+                SELECT 1 FROM logs 
+                WHERE text = ? 
+                AND datetime(timestamp) > datetime('now', '-{} hours')
+                LIMIT 1
+            """.format(hours), (text,))
         result = cursor.fetchone() is not None
         conn.close()
         return result
     
-    # ==================== ИСТОЧНИКИ (для будущего) ====================
+    # ==================== ОЧЕРЕДЬ УВЕДОМЛЕНИЙ ====================
     
-    def add_source(self, title: str, link: str) -> bool:
+    def enqueue_notification(self, tenant_id: int, chat_id: int, message_id: int,
+                             notification_chat_id: int, notification_text: str,
+                             source_chat: str, text: str, user_id: int,
+                             fingerprint: Optional[str] = None,
+                             keywords: Optional[List[str]] = None,
+                             kind: str = NOTIFICATION_LEAD) -> bool:
+        """
+        Записать лид в очередь уведомлений.
+        
+        Args:
+            tenant_id: ID профиля
+            chat_id: ID чата-источника
+            message_id: ID сообщения в чате-источнике
+            notification_chat_id: ID чата уведомлений профиля
+            notification_text: Готовый текст уведомления (HTML)
+            source_chat: Название чата-источника
+            text: Текст сообщения
+            user_id: ID автора
+            fingerprint: Отпечаток нормализованного текста
+            keywords: Сработавшие ключевые слова
+            kind: Вид уведомления (NOTIFICATION_LEAD или NOTIFICATION_CROSSPOST)
+            
+        Returns:
+            True если лид поставлен в очередь, False если он уже там был
+        """
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR IGNORE INTO notification_queue
+                    (tenant_id, chat_id, message_id, notification_chat_id, notification_text,
+                     source_chat, text, user_id, fingerprint, keywords, kind, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (tenant_id, chat_id, message_id, notification_chat_id, notification_text,
+                  source_chat, text, user_id, fingerprint, "\n".join(keywords or []), kind, now, now))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+    
+    def claim_notifications(self, worker: str, limit: int = 50, lease: float = 600) -> List[Dict]:
+        """
+        Забрать уведомления, готовые к отправке.
+        
+        Уведомления, которые другой воркер забрал, но не подтвердил дольше lease
+        секунд (воркер упал), забираются повторно.
+        
+        Args:
+            worker: Имя воркера
+            limit: Максимум уведомлений
+            lease: Через сколько секунд неподтверждённое уведомление можно забрать снова
+            
+        Returns:
+            Список уведомлений (строки очереди)
+        """
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT * FROM notification_queue
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'sending' AND claimed_at < ?)
+                ORDER BY id LIMIT ?
+            """, (now, now - lease, limit))
+            rows = [dict(row) for row in cursor.fetchall()]
+            cursor.executemany("""
+                UPDATE notification_queue SET status = 'sending', claimed_by = ?, claimed_at = ?
+                WHERE id = ?
+            """, [(worker, now, row['id']) for row in rows])
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+    
+    def renew_notifications(self, worker: str, queue_ids: List[int]) -> int:
+        """
+        Продлить аренду уведомлений, которые воркер ещё отправляет.
+        
+        Без продления уведомление, ждущее в очереди диспетчера дольше lease
+        (всплеск лидов, долгий FloodWait), забрал бы другой воркер и отправил повторно.
+        
+        Args:
+            worker: Имя воркера
+            queue_ids: ID уведомлений в отправке
+            
+        Returns:
+            Количество продлённых уведомлений
+        """
+        if not queue_ids:
+            return 0
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE notification_queue SET claimed_at = ?
+                WHERE id = ? AND status = 'sending' AND claimed_by = ?
+            """, [(now, queue_id, worker) for queue_id in queue_ids])
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    def release_notifications(self, worker: str) -> int:
+        """
+        Вернуть в очередь уведомления, забранные воркером до перезапуска.
+        
+        Args:
+            worker: Имя воркера
+            
+        Returns:
+            Количество возвращённых уведомлений
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE notification_queue SET status = 'pending', claimed_by = NULL, claimed_at = NULL
+            WHERE status = 'sending' AND claimed_by = ?
+        """, (worker,))
+        released = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return released
+    
+    def complete_notification(self, queue_id: int, worker: Optional[str] = None) -> bool:
+        """
+        Отметить уведомление отправленным и записать лид в историю (одной транзакцией).
+        
+        Сводка кросс-поста в историю и статистику лидов не попадает.
+        
+        Args:
+            queue_id: ID уведомления в очереди
+            worker: Имя воркера; если аренду уже забрал другой воркер, отметка не ставится
+            
+        Returns:
+            True если уведомление отмечено отправленным
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if worker is None:
+                cursor.execute("""
+                    UPDATE notification_queue SET status = 'sent', sent_at = ?, last_error = NULL
+                    WHERE id = ? AND status != 'sent'
+                """, (time.time(), queue_id))
+            else:
+                cursor.execute("""
+                    UPDATE notification_queue SET status = 'sent', sent_at = ?, last_error = NULL
+                    WHERE id = ? AND status = 'sending' AND claimed_by = ?
+                """, (time.time(), queue_id, worker))
+            completed = cursor.rowcount > 0
+            if completed:
+                cursor.execute(
+                    "SELECT tenant_id, chat_id, source_chat, kind FROM notification_queue WHERE id = ?",
+                    (queue_id,)
+                )
+                row = cursor.fetchone()
+                if row['kind'] == NOTIFICATION_LEAD:
+                    cursor.execute("""
+                        INSERT INTO logs (source_chat, message_id, text, user_id, chat_id, fingerprint, tenant_id, keywords)
+                        SELECT source_chat, message_id, text, user_id, chat_id, fingerprint, tenant_id, keywords
+                        FROM notification_queue WHERE id = ?
+                    """, (queue_id,))
+                    self._rollup_lead(cursor, row['tenant_id'], row['chat_id'], row['source_chat'])
+            conn.commit()
+            return completed
+        finally:
+            conn.close()
+    
+    def fail_notification(self, queue_id: int, error: str, max_attempts: int = 10,
+                          worker: Optional[str] = None) -> bool:
+        """
+        Записать неудачную попытку отправки и назначить повтор с экспоненциальной задержкой.
+        
+        Args:
+            queue_id: ID уведомления в очереди
+            error: Текст ошибки
+            max_attempts: После скольких попыток уведомление помечается ошибочным
+            worker: Имя воркера; если аренду уже забрал другой воркер, попытка не записывается
+            
+        Returns:
+            True если будет повтор (или уведомление уже у другого воркера),
+            False если попытки исчерпаны
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT attempts, status, claimed_by FROM notification_queue WHERE id = ?",
+                           (queue_id,))
+            row = cursor.fetchone()
+            if not row:
+                return False
+            if worker is not None and (row['status'] != 'sending' or row['claimed_by'] != worker):
+                return True
+            attempts = row['attempts'] + 1
+            retry = attempts < max_attempts
+            delay = min(3600, 30 * 2 ** (attempts - 1))
+            cursor.execute("""
+                UPDATE notification_queue
+                SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?,
+                    claimed_by = NULL, claimed_at = NULL
+                WHERE id = ?
+            """, ('pending' if retry else 'failed', attempts, error[:500], time.time() + delay, queue_id))
+            conn.commit()
+            return retry
+        finally:
+            conn.close()
+    
+    def retry_failed_notifications(self) -> int:
+        """
+        Вернуть в очередь уведомления с исчерпанными попытками.
+        
+        Returns:
+            Количество уведомлений
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE notification_queue SET status = 'pending', attempts = 0, next_attempt_at = ?
+            WHERE status = 'failed'
+        """, (time.time(),))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+    
+    def purge_sent_notifications(self, days: int = 7) -> int:
+        """
+        Удалить из очереди отправленные уведомления старше N дней (история остаётся в logs).
+        
+        Args:
+            days: Срок хранения
+            
+        Returns:
+            Количество удалённых записей
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM notification_queue WHERE status = 'sent' AND sent_at < ?
+        """, (time.time() - days * 86400,))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+    
+    def get_queue_stats(self) -> Dict:
+        """
+        Получить состояние очереди уведомлений.
+        
+        Returns:
+            Словарь: pending (ждут отправки), failed (попытки исчерпаны),
+            oldest_age (сколько секунд ждёт самое старое неотправленное)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT
+                SUM(status IN ('pending', 'sending')) AS pending,
+                SUM(status = 'failed') AS failed,
+                MIN(CASE WHEN status IN ('pending', 'sending') THEN created_at END) AS oldest
+            FROM notification_queue
+            WHERE status != 'sent'
+        """)
+        row = cursor.fetchone()
+        conn.close()
+        oldest = row['oldest']
+        return {
+            'pending': row['pending'] or 0,
+            'failed': row['failed'] or 0,
+            'oldest_age': time.time() - oldest if oldest else 0,
+        }
+    
+    # ==================== СТАТИСТИКА ====================
+    
+    @staticmethod
+    def current_hour() -> str:
+        """Текущий час в формате почасовой статистики (UTC, как CURRENT_TIMESTAMP)."""
+        return time.strftime('%Y-%m-%d %H:00', time.gmtime())
+    
+    @classmethod
+    def _rollup_lead(cls, cursor: sqlite3.Cursor, tenant_id: int, chat_id: Optional[int],
+                     chat_title: Optional[str]):
+        """Учесть записанный лид в почасовой статистике (в транзакции записи лида)."""
+        cursor.execute("""
+            INSERT INTO stats_leads_hourly (hour, tenant_id, chat_id, chat_title, leads)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(hour, tenant_id, chat_id) DO UPDATE SET
+                leads = leads + 1,
+                chat_title = excluded.chat_title
+        """, (cls.current_hour(), tenant_id, chat_id or 0, chat_title))
+    
+    def add_hourly_counters(self, traffic: Dict[Tuple[str, int], Tuple[int, int]],
+                            keywords: Dict[Tuple[str, int, str], int]):
+        """
+        Прибавить счётчики воркера к почасовой статистике.
+        
+        Args:
+            traffic: (час, ID чата) → (просмотрено сообщений, отклонено фильтрами)
+            keywords: (час, ID профиля, ключевое слово) → срабатываний
+        """
+        if not traffic and not keywords:
+            return
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO stats_traffic_hourly (hour, chat_id, seen, rejected) VALUES (?, ?, ?, ?)
+                ON CONFLICT(hour, chat_id) DO UPDATE SET
+                    seen = seen + excluded.seen,
+                    rejected = rejected + excluded.rejected
+            """, [(hour, chat_id, seen, rejected) for (hour, chat_id), (seen, rejected) in traffic.items()])
+            cursor.executemany("""
+                INSERT INTO stats_keywords_hourly (hour, tenant_id, keyword, hits) VALUES (?, ?, ?, ?)
+                ON CONFLICT(hour, tenant_id, keyword) DO UPDATE SET hits = hits + excluded.hits
+            """, [(hour, tenant_id, keyword, hits) for (hour, tenant_id, keyword), hits in keywords.items()])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_statistics(self, hours: int = 24, tenant_id: Optional[int] = None, top: int = 5) -> Dict:
+        """
+        Получить статистику за последние N часов (только из почасовых таблиц).
+        
+        Args:
+            hours: Период в часах
+            tenant_id: Только лиды и ключевые слова этого профиля (None — все)
+            top: Сколько чатов и ключевых слов показать
+            
+        Returns:
+            Словарь: leads, seen, rejected, top_chats [(название, лиды)],
+            top_keywords [(слово, срабатывания)], by_hour [(час, лиды)]
+        """
+        since = time.strftime('%Y-%m-%d %H:00', time.gmtime(time.time() - (hours - 1) * 3600))
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COALESCE(SUM(leads), 0) AS leads FROM stats_leads_hourly
+            WHERE hour >= ? AND (? IS NULL OR tenant_id = ?)
+        """, (since, tenant_id, tenant_id))
+        leads = cursor.fetchone()['leads']
+        cursor.execute("""
+            SELECT COALESCE(SUM(seen), 0) AS seen, COALESCE(SUM(rejected), 0) AS rejected
+            FROM stats_traffic_hourly WHERE hour >= ?
+        """, (since,))
+        traffic = cursor.fetchone()
+        cursor.execute("""
+            SELECT MAX(chat_title) AS title, chat_id, SUM(leads) AS leads FROM stats_leads_hourly
+            WHERE hour >= ? AND (? IS NULL OR tenant_id = ?)
+            GROUP BY chat_id ORDER BY leads DESC LIMIT ?
+        """, (since, tenant_id, tenant_id, top))
+        top_chats = [(row['title'] or str(row['chat_id']), row['leads']) for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT keyword, SUM(hits) AS hits FROM stats_keywords_hourly
+            WHERE hour >= ? AND (? IS NULL OR tenant_id = ?)
+            GROUP BY keyword ORDER BY hits DESC LIMIT ?
+        """, (since, tenant_id, tenant_id, top))
+        top_keywords = [(row['keyword'], row['hits']) for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT hour, SUM(leads) AS leads FROM stats_leads_hourly
+            WHERE hour >= ? AND (? IS NULL OR tenant_id = ?)
+            GROUP BY hour ORDER BY hour
+        """, (since, tenant_id, tenant_id))
+        leads_by_hour = {row['hour']: row['leads'] for row in cursor.fetchall()}
+        conn.close()
+        # Все часы периода, включая часы без лидов
+        now = time.time()
+        by_hour = []
+        for i in range(hours - 1, -1, -1):
+            hour = time.strftime('%Y-%m-%d %H:00', time.gmtime(now - i * 3600))
+            by_hour.append((hour, leads_by_hour.get(hour, 0)))
+        return {
+            'leads': leads,
+            'seen': traffic['seen'],
+            'rejected': traffic['rejected'],
+            'top_chats': top_chats,
+            'top_keywords': top_keywords,
+            'by_hour': by_hour,
+        }
+    
+    @staticmethod
+    def _count_false_positives(cursor: sqlite3.Cursor, user_id: int, tenant_id: int):
+        """Засчитать ложные срабатывания ключевым словам лидов автора, попавшего в черный список."""
+        cursor.execute(
+            "SELECT keywords FROM logs WHERE user_id = ? AND tenant_id = ? AND keywords != ''",
+            (user_id, tenant_id)
+        )
+        counts: Dict[str, int] = {}
+        for row in cursor.fetchall():
+            for keyword in set(row['keywords'].split("\n")):
+                counts[keyword] = counts.get(keyword, 0) + 1
+        cursor.executemany("""
+            INSERT INTO keyword_stats (tenant_id, keyword, false_positives) VALUES (?, ?, ?)
+            ON CONFLICT(tenant_id, keyword) DO UPDATE SET
+                false_positives = false_positives + excluded.false_positives
+        """, [(tenant_id, keyword, count) for keyword, count in counts.items()])
+    
+    def add_keyword_stats(self, stats: Dict[Tuple[int, str], Tuple[int, int, int, int]]):
+        """
+        Прибавить счётчики ключевых слов, накопленные воркером.
+        
+        Args:
+            stats: (ID профиля, ключевое слово) → (срабатывания, лиды, замеры, время замеров в нс)
+        """
+        if not stats:
+            return
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO keyword_stats (tenant_id, keyword, hits, leads, eval_count, eval_ns, last_hit_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(tenant_id, keyword) DO UPDATE SET
+                    hits = hits + excluded.hits,
+                    leads = leads + excluded.leads,
+                    eval_count = eval_count + excluded.eval_count,
+                    eval_ns = eval_ns + excluded.eval_ns,
+                    last_hit_at = COALESCE(excluded.last_hit_at, last_hit_at)
+            """, [
+                (tenant_id, keyword, hits, leads, eval_count, eval_ns, now if hits else None)
+                for (tenant_id, keyword), (hits, leads, eval_count, eval_ns) in stats.items()
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def get_keyword_stats(self, tenant_id: int = DEFAULT_TENANT_ID) -> Dict[str, Dict]:
+        """
+        Получить статистику ключевых слов профиля.
+        
+        Args:
+            tenant_id: ID профиля
+            
+        Returns:
+            Ключевое слово → словарь (hits, leads, false_positives, eval_count, eval_ns, last_hit_at)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM keyword_stats WHERE tenant_id = ?", (tenant_id,))
+        stats = {row['keyword']: dict(row) for row in cursor.fetchall()}
+        conn.close()
+        return stats
+    
+    # ==================== СЧЁТЧИКИ ВОРКЕРОВ ====================
+    
+    def save_worker_stats(self, worker: str, started_at: float, counters: Dict[str, int],
+                          latency: Optional[Dict[str, Dict]] = None):
+        """
+        Сохранить счётчики воркера (с момента его запуска).
+        
+        Args:
+            worker: Имя воркера
+            started_at: Время запуска воркера (unix time)
+            counters: Счётчики
+            latency: Гистограммы длительности этапов (metrics.Metrics.to_dict)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO worker_stats (worker, started_at, updated_at, counters, latency) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(worker) DO UPDATE SET
+                started_at = excluded.started_at,
+                updated_at = excluded.updated_at,
+                counters = excluded.counters,
+                latency = excluded.latency
+        """, (worker, started_at, time.time(), json.dumps(counters, ensure_ascii=False), json.dumps(latency or {})))
+        conn.commit()
+        conn.close()
+    
+    def get_worker_stats(self) -> List[Dict]:
+        """
+        Получить счётчики всех воркеров.
+        
+        Returns:
+            Список словарей: worker, started_at, updated_at, counters, latency
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM worker_stats ORDER BY worker")
+        rows = []
+        for row in cursor.fetchall():
+            item = dict(row)
+            item['counters'] = json.loads(item['counters'] or '{}')
+            item['latency'] = json.loads(item['latency'] or '{}')
+            rows.append(item)
+        conn.close()
+        return rows
+    
+    # ==================== ПРОФИЛИРОВАНИЕ ====================
+    
+    def request_profile(self, worker: str, kind: str, seconds: float) -> int:
+        """
+        Попросить воркер снять профиль.
+        
+        Args:
+            worker: Имя воркера
+            kind: Режим (profiler.PROFILE_KINDS)
+            seconds: Длительность окна
+            
+        Returns:
+            ID запроса
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO profile_requests (worker, kind, seconds, created_at) VALUES (?, ?, ?, ?)",
+            (worker, kind, seconds, time.time())
+        )
+        request_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return request_id
+    
+    def claim_profile_request(self, worker: str) -> Optional[Dict]:
+        """
+        Забрать самый старый ожидающий запрос профилирования воркера.
+        
+        Returns:
+            Запрос (id, kind, seconds) или None
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT id, kind, seconds FROM profile_requests
+                WHERE worker = ? AND status = 'pending' ORDER BY id LIMIT 1
+            """, (worker,))
+            row = cursor.fetchone()
+            if row:
+                cursor.execute("UPDATE profile_requests SET status = 'running' WHERE id = ?", (row['id'],))
+            conn.commit()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def finish_profile_request(self, request_id: int, result: Optional[str] = None,
+                               error: Optional[str] = None):
+        """
+        Записать отчёт профилирования (или ошибку).
+        
+        Args:
+            request_id: ID запроса
+            result: Текст отчёта
+            error: Текст ошибки (запрос помечается failed)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE profile_requests SET status = ?, result = ?, error = ?, finished_at = ?
+            WHERE id = ?
+        """, ('failed' if error else 'done', result, error, time.time(), request_id))
+        conn.commit()
+        conn.close()
+    
+    def get_profile_request(self, request_id: int) -> Optional[Dict]:
+        """Получить запрос профилирования с отчётом."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM profile_requests WHERE id = ?", (request_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    def purge_profile_requests(self, days: int = 7):
+        """Удалить старые запросы профилирования вместе с отчётами."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM profile_requests WHERE created_at < ?", (time.time() - days * 86400,))
+        conn.commit()
+        conn.close()
+    
+    # ==================== ДОГРУЗКА ПРОПУЩЕННОГО ====================
+    
+    def get_watermarks(self, worker: str) -> Dict[int, int]:
+        """
+        Получить последние обработанные сообщения чатов воркера.
+        
+        Returns:
+            Словарь chat_id → message_id
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT chat_id, message_id FROM chat_watermarks WHERE worker = ?", (worker,))
+        marks = {row['chat_id']: row['message_id'] for row in cursor.fetchall()}
+        conn.close()
+        return marks
+    
+    def save_watermarks(self, worker: str, marks: Dict[int, int]):
+        """
+        Сохранить последние обработанные сообщения чатов (отметка не уменьшается).
+        
+        Args:
+            worker: Имя воркера
+            marks: chat_id → message_id
+        """
+        if not marks:
+            return
+        now = time.time()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO chat_watermarks (worker, chat_id, message_id, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(worker, chat_id) DO UPDATE SET
+                message_id = MAX(message_id, excluded.message_id),
+                updated_at = excluded.updated_at
+        """, [(worker, chat_id, message_id, now) for chat_id, message_id in marks.items()])
+        conn.commit()
+        conn.close()
+    
+    def get_chat_lead_counts(self, hours: int = 168) -> Dict[int, int]:
+        """
+        Лиды по чатам за последние часы (из почасовой статистики).
+        
+        Returns:
+            Словарь chat_id → лидов
+        """
+        since = time.strftime('%Y-%m-%d %H:00', time.gmtime(time.time() - (hours - 1) * 3600))
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT chat_id, SUM(leads) AS leads FROM stats_leads_hourly
+            WHERE hour >= ? GROUP BY chat_id
+        """, (since,))
+        counts = {row['chat_id']: row['leads'] for row in cursor.fetchall()}
+        conn.close()
+        return counts
+    
+    # ==================== ИСТОЧНИКИ ====================
+    
+    @staticmethod
+    def _bump_sources_version(cursor: sqlite3.Cursor):
+        """Увеличить версию источников, чтобы воркеры перечитали списки чатов."""
+        cursor.execute("""
+            UPDATE config SET value = CAST(value AS INTEGER) + 1 WHERE key = 'sources_version'
+        """)
+    
+    def add_source(self, title: str, link: str, mode: str = 'include') -> bool:
         """
         Добавить источник для парсинга.
         
         Args:
             title: Название источника
-            link: Ссылка на источник
+            link: Ссылка на источник (@username, t.me/..., или ID чата)
+            mode: 'include' — слушать только такие чаты, 'exclude' — игнорировать чат
             
         Returns:
-            True если добавлено успешно
+            True если добавлено успешно, False если такой источник уже есть
         """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sources WHERE link = ?", (link,))
+            if cursor.fetchone():
+                logger.warning(f"Источник уже существует: {link}")
+                return False
             cursor.execute("""
-                INSERT INTO sources (title, link) VALUES (?, ?)
-            """, (title, link))
+                INSERT INTO sources (title, link, mode) VALUES (?, ?, ?)
+            """, (title, link, mode))
+            self._bump_sources_version(cursor)
             conn.commit()
-            conn.close()
+            logger.info(f"Добавлен источник ({mode}): {link}")
             return True
         except sqlite3.IntegrityError:
             return False
+        finally:
+            conn.close()
+    
+    def remove_source(self, source_id: int) -> bool:
+        """
+        Удалить источник.
+        
+        Args:
+            source_id: ID источника
+            
+        Returns:
+            True если удалено успешно
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM sources WHERE id = ?", (source_id,))
+        affected = cursor.rowcount
+        self._bump_sources_version(cursor)
+        conn.commit()
+        conn.close()
+        logger.info(f"Удален источник: {source_id}")
+        return affected > 0
+    
+    def set_source_peer(self, source_id: int, peer_id: int):
+        """
+        Сохранить peer id, в который воркер разрешил ссылку источника.
+        
+        Args:
+            source_id: ID источника
+            peer_id: ID чата в формате Telethon (с префиксом -100 для каналов)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE sources SET peer_id = ?, resolve_error = NULL WHERE id = ?", (peer_id, source_id)
+        )
+        conn.commit()
+        conn.close()
+    
+    def set_source_error(self, source_id: int, error: str):
+        """
+        Сохранить ошибку, с которой воркер не смог найти чат источника (показывается в боте).
+        
+        Args:
+            source_id: ID источника
+            error: Текст ошибки
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE sources SET resolve_error = ? WHERE id = ?", (error[:200], source_id))
+        conn.commit()
+        conn.close()
     
     def get_sources(self) -> List[Dict]:
         """
@@ -527,4 +1743,3 @@ class Database:
         sources = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return sources
-
@@ -0,0 +1,205 @@
+"""
+Диспетчер уведомлений о лидах.
+
+Отправка вынесена из обработчика сообщений в фоновые задачи: на каждый чат
+уведомлений — своя очередь и свой ограничитель скорости (token bucket).
+FloodWait от Telegram не теряет уведомление: чат ставится на паузу на
+указанное время, после чего отправка повторяется. В режиме сводки при
+всплеске лиды, накопившиеся в очереди чата, объединяются в одно сообщение.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина текста сообщения Telegram
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+@dataclass
+class Notification:
+    """Уведомление в очереди чата."""
+    chat_id: int
+    text: str
+    # Вызывается после успешной отправки (например, запись в историю)
+    on_sent: Optional[Callable[[], None]] = None
+    # Вызывается с текстом ошибки, когда повторы исчерпаны
+    on_failed: Optional[Callable[[str], None]] = None
+    attempts: int = 0
+
+
+class TokenBucket:
+    """Ограничитель скорости: rate токенов в секунду, запас не больше capacity."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        # До этого момента отправка запрещена (FloodWait)
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Дождаться свободного токена и забрать его."""
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Запретить отправку на seconds секунд и обнулить запас."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+
+
+class NotificationDispatcher:
+    """Очереди уведомлений по чатам с ограничением скорости и повторами."""
+
+    def __init__(self, send: Callable[[int, str], Awaitable[None]],
+                 rate_per_minute: float = config.NOTIFY_RATE_PER_MINUTE,
+                 burst: int = config.NOTIFY_BURST,
+                 digest_threshold: int = config.DIGEST_THRESHOLD,
+                 max_retries: int = config.NOTIFY_MAX_RETRIES):
+        """
+        Args:
+            send: Корутина отправки (chat_id, text)
+            rate_per_minute: Сколько сообщений в минуту можно отправить в один чат
+            burst: Сколько сообщений можно отправить подряд без пауз
+            digest_threshold: С какой длины очереди чата включается сводка
+            max_retries: Сколько раз повторять отправку при ошибках (кроме FloodWait)
+        """
+        self._send = send
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.digest_threshold = max(2, digest_threshold)
+        self.max_retries = max_retries
+        # Включается из настроек бота (digest_enabled)
+        self.digest_enabled = False
+        self._queues: Dict[int, Deque[Notification]] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Сколько раз Telegram ответил FloodWait (для метрик воркера)
+        self.flood_waits = 0
+
+    def submit(self, chat_id: int, text: str, on_sent: Optional[Callable[[], None]] = None,
+               on_failed: Optional[Callable[[str], None]] = None):
+        """
+        Поставить уведомление в очередь чата (не ждёт отправки).
+
+        Args:
+            chat_id: ID чата уведомлений
+            text: Текст уведомления (HTML)
+            on_sent: Колбэк после успешной отправки
+            on_failed: Колбэк, если отправить не удалось
+        """
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+            self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+        queue.append(Notification(chat_id, text, on_sent, on_failed))
+        task = self._tasks.get(chat_id)
+        if task is None or task.done():
+            self._tasks[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    def pending(self) -> int:
+        """Количество уведомлений, ожидающих отправки."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def stop(self):
+        """Остановить фоновые задачи отправки."""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        if self.pending():
+            logger.warning("Не отправлено уведомлений при остановке: %s", self.pending())
+
+    # ---------- отправка ----------
+
+    def _take_batch(self, queue: Deque[Notification]) -> List[Notification]:
+        """Забрать из очереди одно уведомление или сводку (сколько поместится в сообщение)."""
+        batch = [queue.popleft()]
+        if not self.digest_enabled or len(queue) + 1 < self.digest_threshold:
+            return batch
+        length = len(batch[0].text)
+        while queue:
+            length += len(DIGEST_SEPARATOR) + len(queue[0].text)
+            if length > MESSAGE_LIMIT - 100:
+                break
+            batch.append(queue.popleft())
+        return batch
+
+    @staticmethod
+    def _format(batch: List[Notification]) -> str:
+        if len(batch) == 1:
+            return batch[0].text
+        header = f"📦 <b>Сводка: {len(batch)} лидов</b>\n\n"
+        return header + DIGEST_SEPARATOR.join(item.text for item in batch)
+
+    async def _run(self, chat_id: int):
+        queue = self._queues[chat_id]
+        bucket = self._buckets[chat_id]
+        while queue:
+            # Пока ждём токен, очередь растёт — сводка соберёт всё накопившееся
+            await bucket.acquire()
+            batch = self._take_batch(queue)
+            await self._deliver(chat_id, bucket, batch)
+
+    async def _deliver(self, chat_id: int, bucket: TokenBucket, batch: List[Notification]):
+        # Telethon к этому моменту уже загружен клиентом отправки
+        from telethon.errors import FloodWaitError
+        text = self._format(batch)
+        while True:
+            try:
+                await self._send(chat_id, text)
+                break
+            except FloodWaitError as e:
+                logger.warning("FloodWait в чате %s: пауза %s с", chat_id, e.seconds)
+                self.flood_waits += 1
+                bucket.pause(e.seconds + 1)
+                await bucket.acquire()
+            except Exception as e:
+                batch[0].attempts += 1
+                if batch[0].attempts > self.max_retries:
+                    logger.error("Уведомление в чат %s не отправлено (%s шт.): %s", chat_id, len(batch), e)
+                    self._notify(batch, failed=str(e))
+                    return
+                delay = min(60, 2 ** batch[0].attempts)
+                logger.warning("Ошибка отправки в чат %s, повтор через %s с: %s", chat_id, delay, e)
+                await asyncio.sleep(delay)
+                await bucket.acquire()
+        if len(batch) > 1:
+            logger.info("Отправлена сводка в чат %s: %s лидов", chat_id, len(batch))
+        self._notify(batch)
+    
+    @staticmethod
+    def _notify(batch: List[Notification], failed: Optional[str] = None):
+        """Вызвать колбэки уведомлений после отправки или окончательной ошибки."""
+        for item in batch:
+            try:
+                if failed is None:
+                    if item.on_sent:
+                        item.on_sent()
+                elif item.on_failed:
+                    item.on_failed(failed)
+            except Exception as e:
+                logger.error("Ошибка в колбэке уведомления: %s", e)
@@ -0,0 +1,217 @@
+"""
+Кэш сущностей Telegram (чаты и авторы) воркера, сохраняемый между перезапусками.
+
+Воркеру от чата и автора нужны только вид, название, username, признак бота
+и access hash (для запросов к чату без поиска сущности). Без кэша после
+перезапуска первое сообщение каждого чата и каждого автора вызывает
+get_chat/get_sender — всплеск запросов и медленные первые уведомления.
+
+Кэш хранится в ENTITY_CACHE_DIR/<воркер>.json (access hash привязан к
+аккаунту, поэтому у каждого воркера свой файл), читается при запуске целиком,
+запись устаревает через ENTITY_CACHE_TTL_HOURS. После запуска кэш в фоне
+обновляется: диалоги аккаунта одним проходом iter_dialogs и участники чатов,
+откуда приходит больше всего лидов.
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Формат файла кэша (увеличивать при несовместимых изменениях)
+CACHE_VERSION = 1
+
+
+@dataclass
+class CachedEntity:
+    """Сжатая сущность: то, что воркер читает у чата и автора."""
+    peer_id: int
+    id: int
+    # user, bot, chat, megagroup, channel
+    kind: str
+    title: str
+    username: Optional[str]
+    access_hash: Optional[int]
+    expires: float
+
+    @property
+    def bot(self) -> bool:
+        return self.kind == 'bot'
+
+    @property
+    def broadcast(self) -> bool:
+        return self.kind == 'channel'
+
+    @classmethod
+    def from_entity(cls, entity, expires: float) -> Optional["CachedEntity"]:
+        """Сжать User, Chat или Channel (остальное — None)."""
+        # Telethon нужен только при работе с сущностями, а не при импорте воркера
+        from telethon import utils
+        from telethon.tl.types import Channel, Chat, User
+        if isinstance(entity, User):
+            kind = 'bot' if entity.bot else 'user'
+            title = entity.first_name or entity.username or str(entity.id)
+        elif isinstance(entity, Channel):
+            kind = 'channel' if entity.broadcast else 'megagroup'
+            title = entity.title
+        elif isinstance(entity, Chat):
+            kind = 'chat'
+            title = entity.title
+        else:
+            return None
+        # У min-сущностей из обновлений access hash непригоден для запросов
+        access_hash = None if getattr(entity, 'min', False) else getattr(entity, 'access_hash', None)
+        return cls(utils.get_peer_id(entity), entity.id, kind, title or 'Неизвестно',
+                   getattr(entity, 'username', None), access_hash, expires)
+
+    def input_peer(self):
+        """InputPeer для запросов к Telegram (None, если access hash неизвестен)."""
+        from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
+        if self.kind == 'chat':
+            return InputPeerChat(self.id)
+        if self.access_hash is None:
+            return None
+        if self.kind in ('user', 'bot'):
+            return InputPeerUser(self.id, self.access_hash)
+        return InputPeerChannel(self.id, self.access_hash)
+
+
+class EntityCache:
+    """Словарь peer id → CachedEntity с TTL и сохранением на диск."""
+
+    def __init__(self, path: Optional[str] = None, ttl_hours: float = config.ENTITY_CACHE_TTL_HOURS):
+        """
+        Args:
+            path: Файл кэша (None — только в памяти)
+            ttl_hours: Через сколько часов запись устаревает
+        """
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self._entities: Dict[int, CachedEntity] = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def get(self, peer_id: Optional[int]) -> Optional[CachedEntity]:
+        """Сущность из кэша (None — нет или устарела)."""
+        entity = self._entities.get(peer_id)
+        if entity is None or entity.expires < time.time():
+            return None
+        return entity
+
+    def put(self, entity) -> Optional[CachedEntity]:
+        """Запомнить сущность Telethon, вернуть её сжатую копию."""
+        cached = CachedEntity.from_entity(entity, time.time() + self.ttl)
+        if cached is None:
+            return None
+        previous = self._entities.get(cached.peer_id)
+        # Сохранённый access hash не теряется, если новая копия пришла без него
+        if cached.access_hash is None and previous is not None:
+            cached.access_hash = previous.access_hash
+        self._entities[cached.peer_id] = cached
+        self._dirty = True
+        return cached
+
+    def input_peer(self, peer_id: int):
+        """InputPeer чата или пользователя из кэша (устаревший access hash тоже годится)."""
+        entity = self._entities.get(peer_id)
+        return entity.input_peer() if entity else None
+
+    async def chat(self, event) -> Optional[CachedEntity]:
+        """Чат события: из кэша или через event.get_chat()."""
+        cached = self.get(event.chat_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        chat = await event.get_chat()
+        return self.put(chat) if chat else None
+
+    async def sender(self, event) -> Optional[CachedEntity]:
+        """Автор события: из кэша или через event.get_sender()."""
+        cached = self.get(getattr(event, 'sender_id', None))
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        sender = await event.get_sender()
+        return self.put(sender) if sender else None
+
+    async def warm_up(self, client, participant_chats: Iterable[int] = (),
+                      participants_limit: int = config.ENTITY_WARMUP_PARTICIPANTS) -> int:
+        """
+        Заполнить кэш диалогами аккаунта и участниками важных чатов.
+
+        Args:
+            client: Клиент Telethon
+            participant_chats: Чаты, участников которых загрузить (важные — первыми)
+            participants_limit: Сколько участников одного чата загружать не больше
+
+        Returns:
+            Сколько сущностей загружено
+        """
+        count = 0
+        async for dialog in client.iter_dialogs():
+            count += self.put(dialog.entity) is not None
+        if participants_limit > 0:
+            for chat_id in participant_chats:
+                entity = self._entities.get(chat_id)
+                if entity is None or entity.kind == 'channel':
+                    continue
+                try:
+                    async for user in client.iter_participants(entity.input_peer() or chat_id,
+                                                               limit=participants_limit):
+                        count += self.put(user) is not None
+                except Exception as e:
+                    # Участники скрыты или нет прав — хватит и диалогов
+                    logger.debug(f"Участники чата {chat_id} не загружены: {e}")
+        return count
+
+    def load(self) -> int:
+        """Прочитать кэш с диска (устаревшие записи пропускаются)."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Кэш сущностей не прочитан ({self.path}): {e}")
+            return 0
+        if data.get('version') != CACHE_VERSION:
+            return 0
+        now = time.time()
+        for row in data.get('entities', []):
+            entity = CachedEntity(*row)
+            if entity.expires >= now:
+                self._entities[entity.peer_id] = entity
+        return len(self._entities)
+
+    def save(self):
+        """Записать кэш на диск (через временный файл), если он изменился."""
+        if not self.path or not self._dirty:
+            return
+        self._dirty = False
+        now = time.time()
+        rows = [
+            [e.peer_id, e.id, e.kind, e.title, e.username, e.access_hash, e.expires]
+            for e in list(self._entities.values()) if e.expires >= now
+        ]
+        tmp = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({'version': CACHE_VERSION, 'entities': rows}, f, ensure_ascii=False,
+                          separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            self._dirty = True
+            raise
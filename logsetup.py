@@ -0,0 +1,165 @@
+"""
+Логирование без записи и форматирования в цикле событий.
+
+Записи из любого потока кладутся в очередь (QueueHandler) как есть, без
+форматирования, а форматирует и пишет их фоновый поток (QueueListener):
+в stderr и, если задан LOG_DIR, в файл процесса LOG_DIR/<процесс>.log с ротацией
+по размеру (LOG_FILE_MAX_MB, LOG_FILE_BACKUPS). LOG_FORMAT=json — по объекту JSON
+на строку (time, level, logger, process, message, correlation_id, exc).
+Если очередь заполнена (LOG_QUEUE_SIZE), запись отбрасывается, а не задерживает
+обработку; число отброшенных — dropped_records() (счётчик воркера log_dropped).
+
+Идентификатор корреляции задаётся на время обработки сообщения
+(with correlation(...)) и попадает во все записи этой задачи asyncio, в том
+числе из Database, кэша сущностей и приёмников.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_correlation_id: contextvars.ContextVar = contextvars.ContextVar('correlation_id', default=None)
+_handler: Optional["DroppingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_process = "main"
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке и без ожидания при заполненной очереди."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь внутри процесса: запись не нужно сериализовать, сообщение
+        # собирается из msg и args уже в потоке записи
+        record.correlation_id = _correlation_id.get()
+        record.process_name = _process
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат; идентификатор корреляции — в квадратных скобках в конце."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        correlation_id = getattr(record, 'correlation_id', None)
+        return f"{text} [{correlation_id}]" if correlation_id else text
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись одной строкой JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': getattr(record, 'process_name', _process),
+            'message': record.getMessage(),
+        }
+        correlation_id = getattr(record, 'correlation_id', None)
+        if correlation_id:
+            data['correlation_id'] = correlation_id
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def setup_logging(process: str = "main", level: Optional[str] = None):
+    """
+    Настроить логирование процесса (повторный вызов перенастраивает).
+
+    Args:
+        process: Имя процесса (поле process и имя файла лога)
+        level: Уровень (по умолчанию LOG_LEVEL)
+    """
+    global _handler, _listener, _process
+    stop_logging()
+    _process = process
+
+    formatter = JsonFormatter() if config.LOG_FORMAT == 'json' else TextFormatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if config.LOG_DIR:
+        os.makedirs(config.LOG_DIR, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            os.path.join(config.LOG_DIR, f"{os.path.basename(process)}.log"),
+            maxBytes=int(config.LOG_FILE_MAX_MB * 1024 * 1024),
+            backupCount=config.LOG_FILE_BACKUPS,
+            encoding="utf-8",
+            delay=True
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _handler = DroppingQueueHandler(queue.Queue(config.LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(getattr(logging, level or config.LOG_LEVEL, logging.INFO))
+    _listener = logging.handlers.QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Дописать оставшиеся записи и остановить фоновый поток."""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+def dropped_records() -> int:
+    """Сколько записей отброшено из-за заполненной очереди."""
+    return _handler.dropped if _handler else 0
+
+
+@contextmanager
+def correlation(correlation_id: str) -> Iterator[None]:
+    """Пометить записи внутри блока идентификатором корреляции."""
+    token = _correlation_id.set(correlation_id)
+    try:
+        yield
+    finally:
+        _correlation_id.reset(token)
+
+
+def _after_fork():
+    # Поток записи в дочерний процесс не переходит: очередь родителя не останавливаем
+    # (stop() ждал бы несуществующий поток), а бросаем и поднимаем свою
+    global _handler, _listener
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _handler = _listener = None
+    setup_logging(_process)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(stop_logging)
@@ -0,0 +1,127 @@
+"""
+Наблюдение за циклом событий asyncio (воркер и бот).
+
+- Задержка цикла: фоновая задача засыпает на LOOP_LAG_INTERVAL секунд и
+  замеряет, насколько позже запланированного она проснулась; значения идут
+  в гистограмму loop_lag вместе с остальными метриками процесса.
+- Медленные шаги: отдельный поток каждые полпорога отправляет в цикл
+  «пинг» (call_soon_threadsafe). Если пинг не выполнен дольше
+  SLOW_CALLBACK_MS, цикл занят синхронным кодом — поток пишет в лог
+  текущую задачу, её корутину и стек потока цикла в этот момент
+  (например, запрос к SQLite в Database или чтение файла в AccountStore).
+
+Режим отладки asyncio для этого не нужен: на горячем пути нет никаких замеров.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+import config
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько кадров стека писать в лог о медленном шаге
+STACK_LIMIT = 20
+
+
+class LoopMonitor:
+    """Задержка цикла событий и поиск шагов, блокирующих цикл."""
+
+    def __init__(self, metrics: Metrics,
+                 interval: float = config.LOOP_LAG_INTERVAL,
+                 threshold: float = config.SLOW_CALLBACK_MS / 1000):
+        """
+        Args:
+            metrics: Куда писать гистограмму задержки (этап loop_lag)
+            interval: Как часто замерять задержку цикла, секунды (0 — не замерять)
+            threshold: Сколько секунд цикл может быть занят без записи в лог (0 — не следить)
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        # Сколько раз цикл был заблокирован дольше порога
+        self.slow_callbacks = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # Когда отправлен ещё не выполненный пинг (None — пинг выполнен)
+        self._ping_sent: Optional[float] = None
+        self._reported = False
+
+    def start(self):
+        """Запустить замеры (вызывать внутри работающего цикла)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._probe())
+        if self.threshold > 0:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        """Остановить замеры."""
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._thread = None
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.metrics.observe('loop_lag', max(0.0, loop.time() - scheduled))
+
+    # ---------- поток-сторож ----------
+
+    def _pong(self):
+        """Выполняется в цикле: пинг дошёл, цикл свободен."""
+        if self._reported:
+            blocked = time.monotonic() - self._ping_sent
+            logger.warning(f"Цикл событий освободился через {blocked:.2f} с")
+        self._reported = False
+        self._ping_sent = None
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            sent = self._ping_sent
+            if sent is None:
+                self._ping_sent = time.monotonic()
+                try:
+                    self._loop.call_soon_threadsafe(self._pong)
+                except RuntimeError:
+                    # Цикл закрыт — процесс завершается
+                    return
+                continue
+            blocked = time.monotonic() - sent
+            if blocked >= self.threshold and not self._reported:
+                self._reported = True
+                self.slow_callbacks += 1
+                self._report(blocked)
+
+    def _report(self, blocked: float):
+        """Записать в лог, чем занят цикл (вызывается из потока-сторожа)."""
+        task_name = "вне задачи"
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is not None:
+            coro = task.get_coro()
+            task_name = f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame else ""
+        logger.warning(
+            f"Цикл событий занят дольше {blocked:.2f} с, задача: {task_name}\n{stack}".rstrip()
+        )
@@ -0,0 +1,333 @@
+"""
+Сопоставление сообщений с набором правил (ключевых слов или стоп-слов).
+
+Правила компилируются один раз: каждое слово правила становится «атомом»,
+а все допустимые формы атомов складываются в хэш-индекс «слово → атомы».
+Сообщение проверяется за один проход по его словам: собираются позиции
+сработавших атомов и битовая маска, по которой сразу отсекаются правила,
+у которых сработали не все атомы. Фразы и близость проверяются по позициям.
+
+Синтаксис правил:
+- слово — по границе слова с допустимыми окончаниями (или по лемме)
+- _слово_ — строгое слово без изменения формы
+- "куплю айфон" — фраза: слова подряд (слова без кавычек через пробел — тоже фраза)
+- куплю NEAR/3 айфон — слова на расстоянии не более 3 слов друг от друга
+- часть1+часть2 — все части должны встретиться в тексте
+"""
+
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import morphology
+from normalizer import NormalizedText, normalize_text
+
+
+# Буквенные правила без морфологии
+VERB_BASE_SUFFIXES = ("ть", "ти")  # инфинитив
+ADJ_BASE_SUFFIXES = ("ый", "ий", "ой")
+ADJ_ALLOWED_ENDINGS = ("ый", "ая", "ое", "ие", "ые", "ой", "ем", "ими", "его", "ею")
+NOUN_ALLOWED_ENDINGS = ("а", "у", "ом", "е", "и", "ов", "ам", "ах", "ы")
+
+# Частые приставки русских глаголов (для учёта производных форм)
+VERB_PREFIXES = {
+    "по", "пере", "вы", "в", "за", "на", "с", "со", "под", "подо",
+    "над", "от", "ото", "об", "обо", "про", "при", "у", "до", "раз",
+    "рас", "воз", "вз", "из", "ис", "без", "через", "пере", "перео"
+}
+
+_NEAR_RE = re.compile(r"\s+NEAR/(\d+)\s+", re.IGNORECASE)
+
+# Виды частей правила
+TERM_WORD = "word"
+TERM_PHRASE = "phrase"
+TERM_NEAR = "near"
+
+
+def detect_pos_simple(keyword: str) -> str:
+    """Определить часть речи по окончанию (эвристика без морфологии)."""
+    k = keyword.lower()
+    if any(k.endswith(suf) for suf in VERB_BASE_SUFFIXES):
+        return "verb"
+    if any(k.endswith(suf) for suf in ADJ_BASE_SUFFIXES):
+        return "adj"
+    # Простая эвристика для наречий: окончание на "о" (и не попали в adj/verb)
+    if k.endswith("о"):
+        return "adv"
+    return "noun"
+
+
+def word_forms(word: str) -> Set[str]:
+    """
+    Получить допустимые формы слова по буквальным правилам (без морфологии).
+
+    Args:
+        word: Нормализованное слово (см. normalizer)
+
+    Returns:
+        Множество форм, которые считаются совпадением
+    """
+    pos = detect_pos_simple(word)
+    if pos == "verb":
+        # Разрешаем приставки, но запрещаем иные окончания/изменения
+        return {word} | {prefix + word for prefix in VERB_PREFIXES}
+    if pos == "adj":
+        base = word
+        for suf in ADJ_BASE_SUFFIXES:
+            if word.endswith(suf):
+                base = word[: -len(suf)]
+                break
+        return {base + ending for ending in ADJ_ALLOWED_ENDINGS}
+    if pos == "adv":
+        return {word}
+    # Существительное по умолчанию
+    return {word} | {word + ending for ending in NOUN_ALLOWED_ENDINGS}
+
+
+def _split_words(chunk: str) -> List[Tuple[str, bool]]:
+    """Разбить фрагмент правила на (слово, строгое) с учётом _слово_."""
+    words: List[Tuple[str, bool]] = []
+    # _фраза целиком_ — все слова строгие
+    if len(chunk) > 1 and chunk.startswith('_') and chunk.endswith('_') and ' ' in chunk:
+        return [(token, True) for token in normalize_text(chunk[1:-1]).tokens]
+    for raw in chunk.split():
+        exact = len(raw) > 1 and raw.startswith('_') and raw.endswith('_')
+        if exact:
+            raw = raw[1:-1]
+        for token in normalize_text(raw).tokens:
+            words.append((token, exact))
+    return words
+
+
+class RuleMatcher:
+    """Скомпилированный набор правил."""
+
+    def __init__(self, rules: List[str], use_lemmas: bool = False):
+        """
+        Скомпилировать правила в индекс.
+
+        Args:
+            rules: Список правил (ключевые слова или стоп-слова)
+            use_lemmas: Сравнивать нормальные формы слов вместо буквальных окончаний
+        """
+        self.use_lemmas = use_lemmas
+        self.rules: List[str] = []
+        # Части каждого правила: (вид, атомы, расстояние для NEAR,
+        # число атомов левого операнда NEAR — остальные атомы правые)
+        self._terms: List[List[Tuple[str, Tuple[int, ...], int, int]]] = []
+        # Битовая маска атомов каждого правила
+        self._masks: List[int] = []
+        # Правила, в которых участвует атом
+        self._atom_rules: List[List[int]] = []
+        self._atom_keys: Dict[Tuple[str, bool], int] = {}
+        # Форма слова / лемма → атомы
+        self._surface_index: Dict[str, List[int]] = {}
+        self._lemma_index: Dict[str, List[int]] = {}
+
+        for rule in rules:
+            terms = self._compile_rule(rule)
+            if not terms:
+                continue
+            rule_idx = len(self.rules)
+            self.rules.append(rule)
+            self._terms.append(terms)
+            mask = 0
+            for _, atoms, _, _ in terms:
+                for atom in atoms:
+                    mask |= 1 << atom
+            self._masks.append(mask)
+            for atom in {a for _, atoms, _, _ in terms for a in atoms}:
+                self._atom_rules[atom].append(rule_idx)
+
+    # ---------- компиляция ----------
+
+    def _atom(self, word: str, exact: bool) -> int:
+        key = (word, exact)
+        atom = self._atom_keys.get(key)
+        if atom is not None:
+            return atom
+        atom = len(self._atom_rules)
+        self._atom_keys[key] = atom
+        self._atom_rules.append([])
+        if exact:
+            self._surface_index.setdefault(word, []).append(atom)
+        elif self.use_lemmas:
+            self._lemma_index.setdefault(morphology.lemmatize(word), []).append(atom)
+        else:
+            for form in word_forms(word):
+                self._surface_index.setdefault(form, []).append(atom)
+        return atom
+
+    def _compile_sequence(self, chunk: str) -> Optional[Tuple[str, Tuple[int, ...], int, int]]:
+        words = _split_words(chunk.strip().strip('"'))
+        if not words:
+            return None
+        atoms = tuple(self._atom(word, exact) for word, exact in words)
+        if len(atoms) == 1:
+            return (TERM_WORD, atoms, 0, 0)
+        return (TERM_PHRASE, atoms, 0, 0)
+
+    def _compile_rule(self, rule: str) -> List[Tuple[str, Tuple[int, ...], int, int]]:
+        terms: List[Tuple[str, Tuple[int, ...], int, int]] = []
+        for part in rule.split('+'):
+            pieces = _NEAR_RE.split(part.strip())
+            if len(pieces) == 1:
+                term = self._compile_sequence(pieces[0])
+                if term:
+                    terms.append(term)
+                continue
+            # a NEAR/k b NEAR/m c → попарные ограничения соседних операндов
+            operands = [self._compile_sequence(p) for p in pieces[0::2]]
+            distances = [int(d) for d in pieces[1::2]]
+            for left, right, distance in zip(operands, operands[1:], distances):
+                if not left or not right:
+                    continue
+                # Операнд-фраза должен встретиться целиком: расстояние считается
+                # от конкретного вхождения фразы, а не от любого её слова
+                terms.append((TERM_NEAR, left[1] + right[1], distance, len(left[1])))
+        return terms
+
+    # ---------- проверка ----------
+
+    def _scan_atoms(self, normalized: NormalizedText) -> Tuple[int, Dict[int, List[int]]]:
+        """Один проход по словам: битовая маска и позиции сработавших атомов."""
+        matched = 0
+        positions: Dict[int, List[int]] = {}
+        surface_index = self._surface_index
+        lemma_index = self._lemma_index
+        for pos, token in enumerate(normalized.tokens):
+            atoms = surface_index.get(token)
+            if atoms:
+                for atom in atoms:
+                    matched |= 1 << atom
+                    positions.setdefault(atom, []).append(pos)
+            if lemma_index:
+                atoms = lemma_index.get(morphology.lemmatize(token))
+                if atoms:
+                    for atom in atoms:
+                        matched |= 1 << atom
+                        positions.setdefault(atom, []).append(pos)
+        return matched, positions
+
+    @staticmethod
+    def _occurrences(atoms: Tuple[int, ...], positions: Dict[int, List[int]]) -> List[Tuple[int, int]]:
+        """Вхождения слов подряд: позиции (первого, последнего) слова."""
+        last = len(atoms) - 1
+        if not last:
+            return [(pos, pos) for pos in positions[atoms[0]]]
+        tails = [set(positions[a]) for a in atoms[1:]]
+        return [
+            (start, start + last)
+            for start in positions[atoms[0]]
+            if all(start + i + 1 in tail for i, tail in enumerate(tails))
+        ]
+
+    @classmethod
+    def _check_term(cls, kind: str, atoms: Tuple[int, ...], distance: int, split: int,
+                    positions: Dict[int, List[int]]) -> bool:
+        if kind == TERM_WORD:
+            return True
+        if kind == TERM_PHRASE:
+            return bool(cls._occurrences(atoms, positions))
+        # TERM_NEAR: расстояние между краями вхождений, пересекающиеся не считаются
+        right = cls._occurrences(atoms[split:], positions)
+        if not right:
+            return False
+        return any(
+            0 < max(r_start - l_end, l_start - r_end) <= distance
+            for l_start, l_end in cls._occurrences(atoms[:split], positions)
+            for r_start, r_end in right
+        )
+
+    def _scan(self, normalized: NormalizedText, first_only: bool,
+              timings: Optional[Dict[int, int]] = None) -> List[int]:
+        matched, positions = self._scan_atoms(normalized)
+        if not matched:
+            return []
+        candidates: Set[int] = set()
+        for atom in positions:
+            candidates.update(self._atom_rules[atom])
+        fired: List[int] = []
+        for rule_idx in sorted(candidates):
+            if timings is not None:
+                started = time.perf_counter_ns()
+            mask = self._masks[rule_idx]
+            ok = matched & mask == mask and all(
+                self._check_term(kind, atoms, distance, split, positions)
+                for kind, atoms, distance, split in self._terms[rule_idx]
+            )
+            if timings is not None:
+                timings[rule_idx] = time.perf_counter_ns() - started
+            if ok:
+                fired.append(rule_idx)
+                if first_only:
+                    break
+        return fired
+
+    def first_match(self, normalized: NormalizedText) -> Optional[str]:
+        """
+        Найти первое сработавшее правило.
+
+        Args:
+            normalized: Нормализованный текст сообщения
+
+        Returns:
+            Текст правила или None
+        """
+        fired = self._scan(normalized, first_only=True)
+        return self.rules[fired[0]] if fired else None
+
+    def matches(self, normalized: NormalizedText) -> List[str]:
+        """Вернуть все сработавшие правила."""
+        return [self.rules[i] for i in self._scan(normalized, first_only=False)]
+
+    def matches_timed(self, normalized: NormalizedText) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Вернуть сработавшие правила и время проверки каждого правила-кандидата.
+
+        Общий проход по словам ни одному правилу не приписывается: у правил,
+        ни одно слово которых не встретилось в тексте, стоимость нулевая.
+
+        Returns:
+            Tuple (сработавшие правила, правило → время проверки в наносекундах)
+        """
+        timings: Dict[int, int] = {}
+        fired = self._scan(normalized, first_only=False, timings=timings)
+        return [self.rules[i] for i in fired], {self.rules[i]: ns for i, ns in timings.items()}
+
+    def match_spans(self, normalized: NormalizedText, rules: List[str]) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Найти слова текста, на которых сработали правила (для разбора в боте).
+
+        Args:
+            normalized: Нормализованный текст сообщения
+            rules: Сработавшие правила (из matches)
+
+        Returns:
+            Правило → позиции (начало, конец) слов в нормализованном тексте
+        """
+        _, positions = self._scan_atoms(normalized)
+        index = {rule: i for i, rule in enumerate(self.rules)}
+        spans = normalized.spans
+        result: Dict[str, List[Tuple[int, int]]] = {}
+        for rule in rules:
+            atoms = {atom for _, term_atoms, _, _ in self._terms[index[rule]] for atom in term_atoms}
+            words = sorted({pos for atom in atoms for pos in positions.get(atom, ())})
+            result[rule] = [spans[pos] for pos in words]
+        return result
+
+
+@lru_cache(maxsize=64)
+def get_matcher(rules: Tuple[str, ...], use_lemmas: bool = False) -> RuleMatcher:
+    """
+    Получить скомпилированный набор правил (кэшируется, пока список не изменится).
+
+    Args:
+        rules: Кортеж правил
+        use_lemmas: Режим поиска по леммам
+
+    Returns:
+        RuleMatcher
+    """
+    return RuleMatcher(list(rules), use_lemmas)
@@ -0,0 +1,205 @@
+"""
+Метрики задержек воркера и вывод в формате Prometheus.
+
+Каждый этап обработки сообщения замеряется по монотонным часам
+(time.perf_counter) и попадает в гистограмму с фиксированными корзинами:
+наблюдение — один bisect и два сложения, поэтому замеры почти ничего
+не стоят на горячем пути. Воркер периодически сохраняет гистограммы
+и счётчики в worker_stats, а HTTP API отдаёт их на /metrics
+(render_prometheus) — процессы воркеров сами портов не открывают.
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Верхние границы корзин гистограмм задержек, секунды (последняя корзина — +Inf)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+# Квантили, которые показываются в боте и отдаются отдельными метриками
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Этапы обработки сообщения (порядок — для вывода)
+STAGES = {
+    'total': "Всего",
+    'prefilter': "Тип чата и автора",
+    'entities': "Чат и автор (Telethon)",
+    'normalize': "Нормализация",
+    'config': "Чтение настроек (SQLite)",
+    'rules': "Правила",
+    'dedupe': "Дубли (SQLite)",
+    'enqueue': "Постановка лида (SQLite)",
+    'send': "Отправка в Telegram",
+    'loop_lag': "Задержка цикла событий",
+}
+
+PREFIX = "parser"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (совместима с histogram Prometheus)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Учесть одно значение."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        """Прибавить другую гистограмму с теми же корзинами."""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценить квантиль линейной интерполяцией внутри корзины (как histogram_quantile).
+
+        Args:
+            q: Квантиль от 0 до 1
+
+        Returns:
+            Значение в секундах (0, если наблюдений нет)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    def to_dict(self) -> Dict:
+        return {'counts': self.counts, 'sum': self.sum, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Histogram":
+        histogram = cls()
+        counts = data.get('counts') or []
+        if len(counts) == len(histogram.counts):
+            histogram.counts = list(counts)
+            histogram.sum = data.get('sum', 0.0)
+            histogram.count = data.get('count', 0)
+        return histogram
+
+
+class Metrics:
+    """Гистограммы задержек по этапам (в памяти процесса)."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """Учесть длительность этапа."""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {stage: histogram.to_dict() for stage, histogram in self.histograms.items()}
+
+
+def load_histograms(data: Optional[Dict]) -> Dict[str, Histogram]:
+    """Гистограммы из сохранённого словаря (worker_stats.latency)."""
+    return {stage: Histogram.from_dict(item) for stage, item in (data or {}).items()}
+
+
+def stage_order(stages: Iterable[str]) -> List[str]:
+    """Этапы в порядке STAGES, неизвестные — в конце по алфавиту."""
+    known = [stage for stage in STAGES if stage in stages]
+    return known + sorted(set(stages) - set(known))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(workers: List[Dict], queue: Optional[Dict] = None) -> str:
+    """
+    Собрать текст метрик в формате Prometheus (text exposition 0.0.4).
+
+    Args:
+        workers: Database.get_worker_stats()
+        queue: Database.get_queue_stats()
+
+    Returns:
+        Текст для ответа /metrics
+    """
+    families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def add(name: str, kind: str, help_text: str, labels: str, value):
+        family = families.setdefault(name, (kind, help_text, []))
+        family[2].append(f"{name}{labels} {_number(value)}")
+
+    for item in workers:
+        worker = item['worker']
+        add(f"{PREFIX}_worker_start_time_seconds", "gauge", "Время запуска воркера (unix time)",
+            _labels(worker=worker), item['started_at'])
+        add(f"{PREFIX}_worker_last_flush_seconds", "gauge", "Время последнего сохранения счётчиков (unix time)",
+            _labels(worker=worker), item['updated_at'])
+        for key, value in sorted(item.get('counters', {}).items()):
+            if key.startswith("rejected:"):
+                add(f"{PREFIX}_filtered_total", "counter", "Сообщения, отклонённые фильтрами, по причине",
+                    _labels(worker=worker, reason=key.split(":", 1)[1]), value)
+            else:
+                add(f"{PREFIX}_{key}_total", "counter", f"Счётчик воркера: {key}",
+                    _labels(worker=worker), value)
+        histograms = load_histograms(item.get('latency'))
+        for stage in stage_order(histograms):
+            histogram = histograms[stage]
+            name = f"{PREFIX}_stage_duration_seconds"
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                add(f"{name}_bucket", "histogram", "Длительность этапов обработки сообщения",
+                    _labels(worker=worker, stage=stage, le=le), cumulative)
+            add(f"{name}_sum", "histogram", "", _labels(worker=worker, stage=stage), histogram.sum)
+            add(f"{name}_count", "histogram", "", _labels(worker=worker, stage=stage), histogram.count)
+            for q in QUANTILES:
+                add(f"{PREFIX}_stage_duration_quantile_seconds", "gauge",
+                    "Оценка квантиля длительности этапа (с запуска воркера)",
+                    _labels(worker=worker, stage=stage, quantile=q), histogram.quantile(q))
+
+    if queue is not None:
+        for status in ('pending', 'failed'):
+            add(f"{PREFIX}_notification_queue", "gauge", "Уведомления в очереди по состоянию",
+                _labels(status=status), queue[status])
+        add(f"{PREFIX}_notification_queue_oldest_age_seconds", "gauge",
+            "Сколько ждёт самое старое неотправленное уведомление", "", queue['oldest_age'])
+
+    lines: List[str] = []
+    for name, (kind, help_text, samples) in families.items():
+        # _sum и _count принадлежат семейству _bucket — заголовок у него один
+        if name.endswith(("_sum", "_count")) and kind == "histogram":
+            lines.extend(samples)
+            continue
+        family = name[:-len("_bucket")] if kind == "histogram" else name
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
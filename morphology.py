@@ -0,0 +1,79 @@
+"""
+Морфология для режима поиска по леммам (pymorphy2).
+
+Анализатор загружается один раз на процесс и только при первом обращении.
+Леммы кэшируются в ограниченном LRU: частоты слов в чатах сильно скошены,
+поэтому почти все слова сообщения берутся из кэша.
+"""
+
+import inspect
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_analyzer = None
+_analyzer_failed = False
+
+
+def _patch_getargspec():
+    """
+    Совместимость с Python 3.11+: в стандартной библиотеке удалён inspect.getargspec,
+    а pymorphy2 всё ещё его использует. Полифилл ставится только перед загрузкой
+    pymorphy2, а не при импорте модуля.
+    """
+    if not hasattr(inspect, 'getargspec'):
+        def _getargspec_compat(func):
+            fs = inspect.getfullargspec(func)
+            ArgSpec = namedtuple('ArgSpec', 'args varargs keywords defaults')
+            return ArgSpec(fs.args, fs.varargs, fs.varkw, fs.defaults)
+        inspect.getargspec = _getargspec_compat  # type: ignore[attr-defined]
+
+
+def get_analyzer():
+    """
+    Получить анализатор pymorphy2 (создаётся один раз на процесс).
+
+    Returns:
+        MorphAnalyzer или None, если pymorphy2 недоступен
+    """
+    global _analyzer, _analyzer_failed
+    if _analyzer is None and not _analyzer_failed:
+        try:
+            _patch_getargspec()
+            import pymorphy2
+            _analyzer = pymorphy2.MorphAnalyzer()
+            logger.info("Морфологический анализатор загружен")
+        except Exception as e:
+            _analyzer_failed = True
+            logger.error(f"Не удалось загрузить pymorphy2, режим лемм недоступен: {e}")
+    return _analyzer
+
+
+def is_available() -> bool:
+    """Проверить, доступен ли режим поиска по леммам."""
+    return get_analyzer() is not None
+
+
+@lru_cache(maxsize=config.LEMMA_CACHE_SIZE)
+def lemmatize(word: str) -> str:
+    """
+    Получить нормальную форму слова (с заменой «ё» на «е»).
+
+    Args:
+        word: Слово в нижнем регистре (см. normalizer)
+
+    Returns:
+        Лемма слова; само слово, если анализатор недоступен
+    """
+    analyzer = get_analyzer()
+    if analyzer is None or not word.isalpha():
+        return word
+    parses = analyzer.parse(word)
+    if not parses:
+        return word
+    return parses[0].normal_form.replace("ё", "е")
+
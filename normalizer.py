@@ -0,0 +1,155 @@
+"""
+Нормализация текста сообщений перед фильтрацией.
+
+Текст приводится к единому виду один раз на сообщение:
+- нижний регистр;
+- «ё» → «е»;
+- удаление невидимых символов (zero-width, мягкий перенос, BOM);
+- исправление смешанных латинско-кириллических слов (гомоглифы);
+- разбиение на слова с позициями.
+
+Результат кэшируется на объекте сообщения и переиспользуется
+проверками ключевых слов, стоп-слов и дубликатов.
+"""
+
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# Невидимые символы, которыми часто «ломают» ключевые слова
+INVISIBLE_CHARS = (
+    "\u00ad"  # мягкий перенос
+    "\u180e"  # монгольский разделитель гласных
+    "\u200b\u200c\u200d\u200e\u200f"  # zero-width и метки направления
+    "\u2060\u2061\u2062\u2063\u2064"  # word joiner и невидимые операторы
+    "\ufeff"  # BOM
+)
+
+# Удаление невидимых символов (str.translate на не-ASCII тексте заметно медленнее)
+_INVISIBLE_RE = re.compile(f"[{INVISIBLE_CHARS}]")
+
+# Гомоглифы: латинские буквы, похожие на кириллические (в нижнем регистре), и обратно
+_LAT_TO_CYR = str.maketrans("abcehkmoptxy", "авсенкмортху")
+_CYR_TO_LAT = str.maketrans("авсенкмортху", "abcehkmoptxy")
+
+# Слово: буквы и цифры (подчёркивание не считается частью слова)
+_TOKEN_RE = re.compile(r"[^\W_]+")
+# Быстрая проверка на наличие смешанных слов во всём тексте (только если есть латиница)
+_MIXED_RE = re.compile(r"[a-z][а-я]|[а-я][a-z]")
+_LATIN_RE = re.compile(r"[a-z]")
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Имя атрибута для кэша на объекте сообщения
+_CACHE_ATTR = "_lead_normalized"
+
+
+def _fix_mixed_token(token: str) -> str:
+    """Привести слово со смешанными алфавитами к преобладающему алфавиту."""
+    latin = len(_LATIN_RE.findall(token))
+    cyrillic = len(_CYRILLIC_RE.findall(token))
+    if not latin or not cyrillic:
+        return token
+    if cyrillic >= latin:
+        return token.translate(_LAT_TO_CYR)
+    return token.translate(_CYR_TO_LAT)
+
+
+class NormalizedText:
+    """Нормализованный текст сообщения со списком слов и их позициями."""
+
+    __slots__ = ("text", "tokens", "_spans", "_positions", "_fingerprint")
+
+    def __init__(self, text: str, tokens: List[str]):
+        self.text = text
+        self.tokens = tokens
+        self._spans: Optional[List[Tuple[int, int]]] = None
+        self._positions: Optional[Dict[str, List[int]]] = None
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def spans(self) -> List[Tuple[int, int]]:
+        """Позиции слов в нормализованном тексте (считаются при первом обращении)."""
+        if self._spans is None:
+            self._spans = [m.span() for m in _TOKEN_RE.finditer(self.text)]
+        return self._spans
+
+    @property
+    def positions(self) -> Dict[str, List[int]]:
+        """Индекс слово → список позиций (строится при первом обращении)."""
+        if self._positions is None:
+            positions: Dict[str, List[int]] = {}
+            for i, token in enumerate(self.tokens):
+                positions.setdefault(token, []).append(i)
+            self._positions = positions
+        return self._positions
+
+    @property
+    def fingerprint(self) -> str:
+        """Отпечаток текста для поиска дубликатов (не зависит от регистра, пробелов и пунктуации)."""
+        if self._fingerprint is None:
+            joined = " ".join(self.tokens)
+            self._fingerprint = hashlib.sha1(joined.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    def __bool__(self) -> bool:
+        return bool(self.tokens)
+
+
+def fold_text(text: str) -> str:
+    """
+    Свернуть текст: нижний регистр, ё → е, без невидимых символов, без гомоглифов.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        Свёрнутый текст (той же структуры, что и исходный)
+    """
+    folded = _INVISIBLE_RE.sub("", text.lower().replace("ё", "е"))
+    if _LATIN_RE.search(folded) and _MIXED_RE.search(folded):
+        folded = _TOKEN_RE.sub(lambda m: _fix_mixed_token(m.group(0)), folded)
+    return folded
+
+
+def normalize_text(text: str) -> NormalizedText:
+    """
+    Нормализовать текст и разбить его на слова.
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        NormalizedText с текстом, словами и их позициями в нормализованном тексте
+    """
+    folded = fold_text(text or "")
+    return NormalizedText(folded, _TOKEN_RE.findall(folded))
+
+
+def ensure_normalized(text) -> NormalizedText:
+    """Вернуть NormalizedText как есть, а строку — нормализовать."""
+    if isinstance(text, NormalizedText):
+        return text
+    return normalize_text(text)
+
+
+def normalize_message(message, text: Optional[str] = None) -> NormalizedText:
+    """
+    Нормализовать текст сообщения Telethon с кэшированием на самом объекте.
+
+    Args:
+        message: Объект сообщения (event.message)
+        text: Текст для нормализации (по умолчанию message.text)
+
+    Returns:
+        NormalizedText
+    """
+    cached = getattr(message, _CACHE_ATTR, None)
+    if cached is not None:
+        return cached
+    normalized = normalize_text(text if text is not None else (getattr(message, "text", None) or ""))
+    try:
+        setattr(message, _CACHE_ATTR, normalized)
+    except AttributeError:
+        pass
+    return normalized
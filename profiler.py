@@ -0,0 +1,177 @@
+"""
+Профилирование работающего воркера по запросу из бота.
+
+Бот записывает запрос в таблицу profile_requests, воркер забирает его при
+очередном сохранении счётчиков, снимает профиль в фоне и записывает
+текстовый отчёт обратно — бот отправляет его документом. Пока запросов
+нет, профилировщики не включены и ничего не стоят.
+
+Режимы:
+- cpu — cProfile на N секунд: функции с наибольшим собственным и общим временем;
+- sample — статистическая выборка стека потока цикла событий каждые
+  PROFILE_SAMPLE_INTERVAL секунд (почти без накладных расходов, видно и
+  время внутри C-вызовов, например SQLite);
+- memory — tracemalloc: разница снимков памяти в начале и конце окна,
+  места, где память выросла сильнее всего.
+"""
+
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Режимы профилирования → подпись
+PROFILE_KINDS = {
+    'cpu': "CPU (cProfile)",
+    'sample': "CPU (выборка стека)",
+    'memory': "Память (tracemalloc)",
+}
+# Сколько строк в отчёте
+TOP_LIMIT = 40
+# Глубина стека для tracemalloc
+TRACEMALLOC_FRAMES = 10
+
+# Одновременно снимается не больше одного профиля (cProfile и tracemalloc глобальны)
+_lock = asyncio.Lock()
+
+
+def _header(kind: str, worker: str, seconds: float) -> str:
+    header = (
+        f"Профиль: {PROFILE_KINDS.get(kind, kind)}\n"
+        f"Воркер: {worker}\n"
+        f"Окно: {seconds:g} с, снят {time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    )
+    if resource is not None:
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        header += f"Пиковая память процесса (maxrss): {rss_mb:.1f} МБ\n"
+    return header + "\n"
+
+
+async def profile_cpu(seconds: float) -> str:
+    """Снять cProfile цикла событий за seconds секунд."""
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    out.write("=== По собственному времени (tottime) ===\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_LIMIT)
+    out.write("\n=== По общему времени (cumtime) ===\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_LIMIT)
+    return out.getvalue()
+
+
+async def profile_sample(seconds: float, interval: float = config.PROFILE_SAMPLE_INTERVAL) -> str:
+    """Статистическая выборка стека потока цикла событий за seconds секунд."""
+    loop_thread_id = threading.get_ident()
+    own: Counter = Counter()
+    total: Counter = Counter()
+    samples = 0
+    stop = threading.Event()
+
+    def sample():
+        nonlocal samples
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is None:
+                continue
+            samples += 1
+            seen = set()
+            own[_frame_key(frame)] += 1
+            while frame is not None:
+                key = _frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    total[key] += 1
+                frame = frame.f_back
+
+    thread = threading.Thread(target=sample, name="profile-sampler", daemon=True)
+    thread.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop.set()
+        await asyncio.to_thread(thread.join)
+
+    out = io.StringIO()
+    out.write(f"Выборок: {samples} (каждые {interval * 1000:g} мс)\n")
+    out.write("Большая доля в asyncio select/run_once — цикл простаивает в ожидании событий.\n")
+    for title, counter in (("собственное время", own), ("вместе с вызванными", total)):
+        out.write(f"\n=== Доля выборок: {title} ===\n")
+        for key, count in counter.most_common(TOP_LIMIT):
+            out.write(f"{count / max(samples, 1) * 100:6.2f}%  {count:6d}  {key}\n")
+    return out.getvalue()
+
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+
+async def profile_memory(seconds: float) -> str:
+    """Разница снимков tracemalloc в начале и в конце окна."""
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    out = io.StringIO()
+    out.write(f"Отслежено за окно: сейчас {current / 1024 / 1024:.1f} МБ, пик {peak / 1024 / 1024:.1f} МБ\n")
+    out.write("\n=== Рост памяти по строкам ===\n")
+    for stat in after.compare_to(before, 'lineno')[:TOP_LIMIT]:
+        out.write(f"{stat}\n")
+    out.write("\n=== Крупнейшие места роста (стек) ===\n")
+    for stat in after.compare_to(before, 'traceback')[:5]:
+        out.write(f"\n{stat.size_diff / 1024:+.1f} КиБ, {stat.count_diff:+d} блоков\n")
+        out.write("\n".join(stat.traceback.format(limit=TRACEMALLOC_FRAMES)) + "\n")
+    return out.getvalue()
+
+
+async def capture(kind: str, seconds: float, worker: str) -> str:
+    """
+    Снять профиль и вернуть текстовый отчёт.
+
+    Args:
+        kind: Режим (см. PROFILE_KINDS)
+        seconds: Длительность окна
+        worker: Имя воркера (для заголовка отчёта)
+
+    Returns:
+        Текст отчёта
+    """
+    profilers = {'cpu': profile_cpu, 'sample': profile_sample, 'memory': profile_memory}
+    if kind not in profilers:
+        raise ValueError(f"Неизвестный режим профилирования: {kind}")
+    seconds = max(1.0, min(float(seconds), config.PROFILE_MAX_SECONDS))
+    async with _lock:
+        logger.info(f"Профилирование ({kind}) на {seconds:g} с")
+        report = await profilers[kind](seconds)
+    return _header(kind, worker, seconds) + report
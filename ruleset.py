@@ -0,0 +1,146 @@
+"""
+Снимок правил всех профилей (тенантов): ключевые слова, стоп-слова и чёрные списки.
+
+Не зависит от Telethon и базы — снимок передаётся готовым
+(Database.get_rules_snapshot), поэтому RuleSet используют и воркер,
+и бот («Проверить текст»), и бэктест в отдельных процессах.
+"""
+
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import matcher
+import morphology
+from normalizer import NormalizedText
+
+
+class RuleSet:
+    """
+    Снимок правил всех профилей (тенантов).
+    
+    Ключевые слова и стоп-слова всех профилей компилируются в два общих индекса,
+    поэтому сообщение проверяется один раз, а сработавшие правила
+    раздаются профилям, которым они принадлежат.
+    """
+    
+    def __init__(self, snapshot: Dict[int, Dict], use_lemmas: bool = False):
+        """
+        Args:
+            snapshot: Результат Database.get_rules_snapshot()
+            use_lemmas: Режим поиска по леммам
+        """
+        self.tenants: Dict[int, Dict] = {tid: data['tenant'] for tid, data in snapshot.items()}
+        self.blacklists: Dict[int, Set[int]] = {tid: data['blacklist'] for tid, data in snapshot.items()}
+        self._keyword_owners: Dict[str, Set[int]] = {}
+        self._stopword_owners: Dict[str, Set[int]] = {}
+        for tid, data in snapshot.items():
+            for rule in data['keywords']:
+                self._keyword_owners.setdefault(rule, set()).add(tid)
+            for rule in data['stopwords']:
+                self._stopword_owners.setdefault(rule, set()).add(tid)
+        use_lemmas = use_lemmas and morphology.is_available()
+        self.keywords = matcher.RuleMatcher(list(self._keyword_owners), use_lemmas)
+        self.stopwords = matcher.RuleMatcher(list(self._stopword_owners), use_lemmas)
+    
+    def match(self, normalized: NormalizedText, sender_id: int,
+              timings: Optional[Dict[str, int]] = None) -> Tuple[Dict[int, List[str]], str]:
+        """
+        Определить профили, для которых сообщение является лидом (без проверки дублей).
+        
+        Args:
+            normalized: Нормализованный текст сообщения
+            sender_id: ID отправителя
+            timings: Если передан — сюда пишется время проверки ключевых слов (нс)
+            
+        Returns:
+            Tuple (ID профиля → сработавшие ключевые слова, причина отказа или "Прошел фильтры")
+        """
+        if timings is None:
+            matched = self.keywords.matches(normalized)
+        else:
+            matched, rule_timings = self.keywords.matches_timed(normalized)
+            timings.update(rule_timings)
+        
+        hits = self._keyword_hits(matched)
+        if not hits:
+            return hits, "Ключевые слова не найдены"
+        
+        hits = self._drop_blacklisted(hits, sender_id)
+        if not hits:
+            return hits, "Отправитель в черном списке"
+        
+        hits = self._drop_stopwords(hits, self.stopwords.matches(normalized))
+        if not hits:
+            return hits, "Найдены стоп-слова"
+        
+        return hits, "Прошел фильтры"
+    
+    def explain(self, normalized: NormalizedText, sender_id: int) -> Dict:
+        """
+        Разобрать проверку сообщения по шагам (режим «Проверить текст» в боте).
+        
+        Шаги те же, что в match, и так же останавливаются на первом отказе;
+        дополнительно собираются позиции совпадений и время каждого шага.
+        
+        Returns:
+            Словарь: keywords / stopwords (правило → позиции слов), keyword_timings
+            (правило → нс), blacklisted (ID профилей), hits, reason, stages [(шаг, нс)]
+        """
+        report = {'keywords': {}, 'keyword_timings': {}, 'blacklisted': [], 'stopwords': {},
+                  'hits': {}, 'reason': "Прошел фильтры", 'stages': []}
+        
+        started = time.perf_counter_ns()
+        matched, report['keyword_timings'] = self.keywords.matches_timed(normalized)
+        hits = self._keyword_hits(matched)
+        report['stages'].append(("Ключ-слова", time.perf_counter_ns() - started))
+        report['keywords'] = self.keywords.match_spans(normalized, matched)
+        if not hits:
+            report['reason'] = "Ключевые слова не найдены"
+            return report
+        
+        started = time.perf_counter_ns()
+        allowed = self._drop_blacklisted(hits, sender_id)
+        report['stages'].append(("Чёрный список", time.perf_counter_ns() - started))
+        report['blacklisted'] = [tid for tid in hits if tid not in allowed]
+        hits = allowed
+        if not hits:
+            report['reason'] = "Отправитель в черном списке"
+            return report
+        
+        started = time.perf_counter_ns()
+        stopwords = self.stopwords.matches(normalized)
+        allowed = self._drop_stopwords(hits, stopwords)
+        report['stages'].append(("Стоп-слова", time.perf_counter_ns() - started))
+        report['stopwords'] = self.stopwords.match_spans(normalized, [
+            rule for rule in stopwords if self._stopword_owners[rule] & set(hits)
+        ])
+        report['hits'] = hits = allowed
+        if not hits:
+            report['reason'] = "Найдены стоп-слова"
+        return report
+    
+    def _keyword_hits(self, matched: List[str]) -> Dict[int, List[str]]:
+        """Раздать сработавшие ключевые слова профилям-владельцам."""
+        hits: Dict[int, List[str]] = {}
+        for rule in matched:
+            for tid in self._keyword_owners[rule]:
+                hits.setdefault(tid, []).append(rule)
+        return hits
+    
+    def _drop_blacklisted(self, hits: Dict[int, List[str]], sender_id: int) -> Dict[int, List[str]]:
+        """Убрать профили, у которых отправитель в черном списке."""
+        return {tid: rules for tid, rules in hits.items() if sender_id not in self.blacklists.get(tid, ())}
+    
+    def _drop_stopwords(self, hits: Dict[int, List[str]], stopwords: List[str]) -> Dict[int, List[str]]:
+        """Убрать профили, чьи стоп-слова нашлись в тексте."""
+        if not stopwords:
+            return hits
+        hits = dict(hits)
+        for rule in stopwords:
+            for tid in self._stopword_owners[rule]:
+                hits.pop(tid, None)
+        return hits
+    
+    def keyword_owners(self, rule: str) -> Set[int]:
+        """Профили, у которых есть ключевое слово."""
+        return self._keyword_owners.get(rule, set())
@@ -1,6 +1,9 @@
 """
 Скрипт для одновременного запуска бота и парсера.
 Удобно для продакшн использования.
+
+Родительский процесс не импортирует ни бота (aiogram), ни воркер (Telethon):
+каждый дочерний процесс загружает только свои модули и сам открывает базу.
 """
 
 import asyncio
@@ -9,21 +12,19 @@ import signal
 import sys
 from multiprocessing import Process
 
-import bot
-import worker
+import config
 from accounts import AccountStore
+from logsetup import setup_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
 def run_bot():
     """Запустить админ-панель (бота)."""
+    setup_logging("bot")
     try:
         logger.info("Запуск админ-панели...")
+        import bot
         asyncio.run(bot.main())
     except KeyboardInterrupt:
         logger.info("Админ-панель остановлена")
@@ -33,8 +34,10 @@ def run_bot():
 
 def run_worker_for_account(session_name: str):
     """Запустить парсер для конкретного аккаунта."""
+    setup_logging(session_name)
     try:
         logger.info(f"Запуск парсера для сессии: {session_name}")
+        import worker
         asyncio.run(worker.main(session_name))
     except KeyboardInterrupt:
         logger.info("Парсер остановлен")
@@ -42,8 +45,21 @@ def run_worker_for_account(session_name: str):
         logger.error(f"Ошибка в парсере {session_name}: {e}")
 
 
+def run_api():
+    """Запустить локальный HTTP API."""
+    setup_logging("api")
+    try:
+        import api
+        asyncio.run(api.main())
+    except KeyboardInterrupt:
+        logger.info("API остановлен")
+    except Exception as e:
+        logger.error(f"Ошибка в API: {e}")
+
+
 def main():
     """Главная функция запуска обоих процессов."""
+    setup_logging("run", "INFO")
     logger.info("="*50)
     logger.info("Запуск Telegram-парсера лидов")
     logger.info("="*50)
@@ -53,6 +69,9 @@ def main():
     # Один процесс бота + N процессов парсеров по активным аккаунтам
     active_accounts = AccountStore.active_accounts()
     worker_processes = [Process(target=run_worker_for_account, args=(a.get("session_file") or 'parser_session',), name=f"Parser-{a.get('id')}") for a in active_accounts]
+    # Локальный API (если задан API_PORT)
+    if config.API_PORT:
+        worker_processes.append(Process(target=run_api, name="API"))
     
     # Обработчик сигнала завершения
     def signal_handler(sig, frame):
@@ -76,10 +95,9 @@ def main():
         
         if not active_accounts:
             logger.info("Активных аккаунтов нет. Откройте 'Мои аккаунты' в боте и включите нужные.")
-        else:
-            for p in worker_processes:
-                logger.info(f"Запуск парсера процесса: {p.name}")
-                p.start()
+        for p in worker_processes:
+            logger.info(f"Запуск процесса: {p.name}")
+            p.start()
         
         logger.info("\n" + "="*50)
         logger.info("Все сервисы запущены!")
@@ -0,0 +1,288 @@
+"""
+Приёмники лидов (sinks).
+
+Каждый найденный лид передаётся во все включённые приёмники (LEAD_SINKS):
+- telegram — уведомление в чат профиля через очередь уведомлений в базе;
+- webhook — POST пачками на HTTP-адрес (например, в CRM) с переиспользованием соединений;
+- jsonl — файл-журнал из сегментов JSONL только на дозапись, который можно читать
+  с запомненного смещения (см. read_segment).
+
+У каждого приёмника своя очередь и свои повторы: медленная CRM не задерживает
+уведомления в Telegram.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class LeadSink:
+    """Базовый приёмник: очередь в памяти, фоновая задача, пачки и повторы с задержкой."""
+
+    name = "base"
+
+    def __init__(self, batch_size: int = 1, batch_delay: float = 0.0,
+                 max_retries: int = 5, max_queue: int = 10000):
+        """
+        Args:
+            batch_size: Максимум лидов в одной записи
+            batch_delay: Сколько секунд ждать, чтобы набрать пачку
+            max_retries: Сколько раз повторять запись пачки при ошибке
+            max_queue: Размер очереди; при переполнении самые старые лиды отбрасываются
+        """
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Запустить фоновую запись."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Дописать очередь (не дольше timeout секунд) и остановиться."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Приёмник %s: не записано лидов при остановке: %s", self.name, self._queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def submit(self, lead: Dict):
+        """Поставить лид в очередь приёмника (не ждёт записи)."""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            logger.warning("Приёмник %s: очередь переполнена, старый лид отброшен", self.name)
+        self._queue.put_nowait(lead)
+
+    def pending(self) -> int:
+        """Количество лидов в очереди."""
+        return self._queue.qsize()
+
+    async def write(self, batch: List[Dict]):
+        """Записать пачку лидов (исключение — повтор)."""
+        raise NotImplementedError
+
+    async def _next_batch(self) -> List[Dict]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write_with_retries(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_with_retries(self, batch: List[Dict]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.write(batch)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("Приёмник %s: не записано лидов: %s (%s)", self.name, len(batch), e)
+                    return
+                delay = min(60, 2 ** attempt)
+                logger.warning("Приёмник %s: ошибка записи, повтор через %s с: %s", self.name, delay, e)
+                await asyncio.sleep(delay)
+
+
+class TelegramSink(LeadSink):
+    """Уведомления в Telegram: очередь и повторы — в базе (notification_queue)."""
+
+    name = "telegram"
+
+    def __init__(self, enqueue: Callable[[Dict], None]):
+        """
+        Args:
+            enqueue: Функция постановки лида в очередь уведомлений
+        """
+        super().__init__()
+        self._enqueue = enqueue
+
+    async def start(self):
+        pass
+
+    async def stop(self, timeout: float = 5.0):
+        pass
+
+    def submit(self, lead: Dict):
+        self._enqueue(lead)
+
+
+class WebhookSink(LeadSink):
+    """POST пачек лидов на HTTP-адрес: {"leads": [...]}."""
+
+    name = "webhook"
+
+    def __init__(self, url: str, token: str = "",
+                 batch_size: int = config.WEBHOOK_BATCH_SIZE,
+                 batch_delay: float = config.WEBHOOK_BATCH_DELAY,
+                 timeout: float = config.WEBHOOK_TIMEOUT):
+        super().__init__(batch_size=batch_size, batch_delay=batch_delay,
+                         max_retries=config.WEBHOOK_MAX_RETRIES)
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._session = None
+
+    async def start(self):
+        import aiohttp
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        # Одна сессия на приёмник — соединения с CRM переиспользуются (keep-alive)
+        self._session = aiohttp.ClientSession(
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=4)
+        )
+        await super().start()
+
+    async def stop(self, timeout: float = 5.0):
+        await super().stop(timeout)
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def write(self, batch: List[Dict]):
+        async with self._session.post(self.url, json={"leads": batch}) as response:
+            if response.status >= 400:
+                raise RuntimeError(f"HTTP {response.status}")
+
+
+class JsonlSegmentSink(LeadSink):
+    """
+    Журнал лидов: файлы leads-000001.jsonl, leads-000002.jsonl, ...
+
+    В сегмент только дописываются строки; при превышении размера открывается
+    следующий. Читатель хранит (номер сегмента, смещение в байтах) и продолжает
+    с него через read_segment.
+    """
+
+    name = "jsonl"
+    PREFIX = "leads-"
+    SUFFIX = ".jsonl"
+
+    def __init__(self, directory: str,
+                 segment_bytes: int = config.LEAD_LOG_SEGMENT_MB * 1024 * 1024,
+                 max_segments: int = config.LEAD_LOG_MAX_SEGMENTS):
+        super().__init__(batch_size=100, batch_delay=0.5)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+        segments = list_segments(directory)
+        self.segment = segments[-1][0] if segments else 1
+
+    def _append(self, lines: List[bytes]):
+        path = segment_path(self.directory, self.segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+            self.segment += 1
+            path = segment_path(self.directory, self.segment)
+            self._drop_old_segments()
+        with open(path, "ab") as f:
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _drop_old_segments(self):
+        if self.max_segments <= 0:
+            return
+        for _, path in list_segments(self.directory)[:-self.max_segments]:
+            os.remove(path)
+            logger.info("Удалён старый сегмент журнала лидов: %s", path)
+
+    async def write(self, batch: List[Dict]):
+        lines = [json.dumps(lead, ensure_ascii=False).encode("utf-8") + b"\n" for lead in batch]
+        await asyncio.to_thread(self._append, lines)
+
+
+def segment_path(directory: str, segment: int) -> str:
+    """Путь к сегменту журнала лидов."""
+    return os.path.join(directory, f"{JsonlSegmentSink.PREFIX}{segment:06d}{JsonlSegmentSink.SUFFIX}")
+
+
+def list_segments(directory: str) -> List[Tuple[int, str]]:
+    """Сегменты журнала лидов по возрастанию номера: [(номер, путь)]."""
+    segments = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.startswith(JsonlSegmentSink.PREFIX) and name.endswith(JsonlSegmentSink.SUFFIX):
+            number = name[len(JsonlSegmentSink.PREFIX):-len(JsonlSegmentSink.SUFFIX)]
+            if number.isdigit():
+                segments.append((int(number), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_segment(directory: str, segment: int, offset: int = 0) -> Tuple[List[Dict], int]:
+    """
+    Прочитать лиды сегмента с указанного смещения.
+
+    Args:
+        directory: Каталог журнала
+        segment: Номер сегмента
+        offset: Смещение в байтах (из предыдущего вызова)
+
+    Returns:
+        (лиды, новое смещение); недописанная последняя строка не читается
+    """
+    with open(segment_path(directory, segment), "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    leads = [json.loads(line) for line in data[:end].splitlines() if line]
+    return leads, offset + end
+
+
+def build_sinks(enqueue_telegram: Callable[[Dict], None], worker_name: str) -> List[LeadSink]:
+    """
+    Создать приёмники из настройки LEAD_SINKS.
+
+    Args:
+        enqueue_telegram: Постановка лида в очередь уведомлений Telegram
+        worker_name: Имя воркера (у каждого воркера свой каталог журнала)
+
+    Returns:
+        Список приёмников
+    """
+    sinks: List[LeadSink] = []
+    for name in config.LEAD_SINKS:
+        if name == "telegram":
+            sinks.append(TelegramSink(enqueue_telegram))
+        elif name == "webhook":
+            if not config.WEBHOOK_URL:
+                logger.warning("Приёмник webhook включён, но WEBHOOK_URL не задан")
+                continue
+            sinks.append(WebhookSink(config.WEBHOOK_URL, config.WEBHOOK_TOKEN))
+        elif name == "jsonl":
+            sinks.append(JsonlSegmentSink(os.path.join(config.LEAD_LOG_DIR, worker_name)))
+        else:
+            logger.warning("Неизвестный приёмник лидов: %s", name)
+    return sinks
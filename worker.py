@@ -1,102 +1,77 @@
 """
 Worker - парсер сообщений на Telethon.
 Слушает группы, каналы и диалоги, фильтрует по ключевым словам.
+
+Импорт модуля ничего не открывает и не подключает: база открывается в init()
+(её вызывает TelegramParser), логирование настраивает запускающий процесс,
+а Telethon загружается при подключении клиента — поэтому бот («Проверить
+текст») и бенчмарки импортируют воркер без Telethon и без второй базы.
 """
 
 import asyncio
+import functools
 import logging
-import re
 import html
-import inspect
-from collections import namedtuple
+import time
+from collections import Counter
 from typing import Optional as _OptionalStr
 import os
 from accounts import AccountStore
 
-# Совместимость с Python 3.11+: в стандартной библиотеке удалён inspect.getargspec,
-# а pymorphy2 всё ещё его использует. Добавляем полифилл поверх inspect.
-if not hasattr(inspect, 'getargspec'):
-    def _getargspec_compat(func):
-        fs = inspect.getfullargspec(func)
-        ArgSpec = namedtuple('ArgSpec', 'args varargs keywords defaults')
-        return ArgSpec(fs.args, fs.varargs, fs.varkw, fs.defaults)
-    inspect.getargspec = _getargspec_compat  # type: ignore[attr-defined]
-
-from typing import List, Optional
-
-from telethon import TelegramClient, events
-from telethon.tl.types import User, Channel, Chat
-from telethon.sessions import StringSession
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 import config
-from database import Database
+from database import NOTIFICATION_CROSSPOST, Database
+import morphology
+import matcher
+import profiler
+from albums import AlbumCollector
+from catchup import CatchUp, Watermarks
+from crosspost import CrossPost, CrossPostAggregator
+from dispatcher import NotificationDispatcher
+from entitycache import EntityCache
+from loopmon import LoopMonitor
+from logsetup import correlation, dropped_records, setup_logging
+from metrics import Metrics
+from ruleset import RuleSet
+from sinks import build_sinks
+from normalizer import NormalizedText, ensure_normalized, fold_text, normalize_message
 
-# Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# Инициализация базы данных
-db = Database(config.DATABASE_PATH)
+# База данных процесса (открывается в init)
+db: Optional[Database] = None
+
+
+def init(database: Optional[Database] = None) -> Database:
+    """
+    Открыть базу данных воркера (повторный вызов возвращает уже открытую).
+    
+    Args:
+        database: Готовая база процесса (бот передаёт свою); по умолчанию — DATABASE_PATH
+        
+    Returns:
+        База данных воркера
+    """
+    global db
+    if db is None:
+        db = database or Database(config.DATABASE_PATH)
+    return db
 
 
 class MessageFilter:
     """Класс для фильтрации сообщений по ключевым словам и стоп-словам."""
     
-    # Буквенные правила без морфологии
-    VERB_BASE_SUFFIXES = ("ть", "ти")  # инфинитив
-    ADJ_BASE_SUFFIXES = ("ый", "ий", "ой")
-    ADJ_ALLOWED_ENDINGS = ("ый", "ая", "ое", "ие", "ые", "ой", "ем", "ими", "его", "ею")
-    NOUN_ALLOWED_ENDINGS = ("а", "у", "ом", "е", "и", "ов", "ам", "ах", "ы")
-
-    # Частые приставки русских глаголов (для учёта производных форм)
-    VERB_PREFIXES = {
-        "по", "пере", "вы", "в", "за", "на", "с", "со", "под", "подо",
-        "над", "от", "ото", "об", "обо", "про", "при", "у", "до", "раз",
-        "рас", "воз", "вз", "из", "ис", "без", "через", "пере", "перео"
-    }
+    # Буквенные правила без морфологии (см. matcher)
+    VERB_BASE_SUFFIXES = matcher.VERB_BASE_SUFFIXES
+    ADJ_BASE_SUFFIXES = matcher.ADJ_BASE_SUFFIXES
+    ADJ_ALLOWED_ENDINGS = matcher.ADJ_ALLOWED_ENDINGS
+    NOUN_ALLOWED_ENDINGS = matcher.NOUN_ALLOWED_ENDINGS
+    VERB_PREFIXES = matcher.VERB_PREFIXES
 
     @staticmethod
     def detect_pos_simple(keyword: str) -> str:
-        k = keyword.lower()
-        if any(k.endswith(suf) for suf in MessageFilter.VERB_BASE_SUFFIXES):
-            return "verb"
-        if any(k.endswith(suf) for suf in MessageFilter.ADJ_BASE_SUFFIXES):
-            return "adj"
-        # Простая эвристика для наречий: окончание на "о" (и не попали в adj/verb)
-        if k.endswith("о"):
-            return "adv"
-        return "noun"
-
-    @staticmethod
-    def build_keyword_pattern(raw_keyword: str) -> re.Pattern:
-        """Построить регекс по буквальным правилам (без морфологии)."""
-        k = raw_keyword.strip()
-        pos = MessageFilter.detect_pos_simple(k)
-        if pos == "verb":
-            # Разрешаем приставки, но запрещаем иные окончания/изменения
-            prefixes = "|".join(sorted(MessageFilter.VERB_PREFIXES, key=len, reverse=True))
-            prefix_group = f"(?:{prefixes})?" if prefixes else ""
-            pattern = rf"(?i)\b{prefix_group}{re.escape(k)}\b"
-            return re.compile(pattern)
-        if pos == "adj":
-            base = k
-            for suf in MessageFilter.ADJ_BASE_SUFFIXES:
-                if k.endswith(suf):
-                    base = k[: -len(suf)]
-                    break
-            endings = "|".join(MessageFilter.ADJ_ALLOWED_ENDINGS)
-            pattern = rf"(?i)\b{re.escape(base)}(?:{endings})\b"
-            return re.compile(pattern)
-        if pos == "adv":
-            pattern = rf"(?i)\b{re.escape(k)}\b"
-            return re.compile(pattern)
-        # Существительное по умолчанию
-        endings = "|".join(MessageFilter.NOUN_ALLOWED_ENDINGS)
-        pattern = rf"(?i)\b{re.escape(k)}(?:{endings})?\b"
-        return re.compile(pattern)
+        return matcher.detect_pos_simple(keyword)
 
     @staticmethod
     def normalize_text(text: str) -> str:
@@ -109,56 +84,48 @@ class MessageFilter:
         Returns:
             Нормализованный текст
         """
-        return text.lower().strip()
+        return fold_text(text).strip()
     
     @staticmethod
-    def check_keyword(text: str, keyword: str) -> bool:
+    def get_matcher(rules: List[str], use_lemmas: bool = False) -> matcher.RuleMatcher:
+        """Получить скомпилированный набор правил (режим лемм — только если доступен pymorphy2)."""
+        return matcher.get_matcher(tuple(rules), use_lemmas and morphology.is_available())
+    
+    @staticmethod
+    def check_keyword(text: Union[str, NormalizedText], keyword: str) -> bool:
         """
         Проверить наличие ключевого слова в тексте.
         
         Поддерживает:
         - _слово_ — строгое слово по границе (без окончаний)
         - слово1+слово2 — все слова (каждое по границе с разрешенными окончаниями)
+        - "фраза" — слова подряд
+        - слово1 NEAR/3 слово2 — слова на расстоянии не более 3 слов
         - обычное слово — по границе слова с простыми окончаниями
         
         Args:
-            text: Текст для проверки
+            text: Текст для проверки (строка или результат normalizer.normalize_text)
             keyword: Ключевое слово с возможными модификаторами
             
         Returns:
             True если ключевое слово найдено
         """
         keyword = keyword.strip()
-        
-        # Проверка на комбинацию слов (слово1+слово2)
-        if '+' in keyword:
-            words = [w.strip() for w in keyword.split('+') if w.strip()]
-            if not words:
-                return False
-            return all(MessageFilter.check_keyword(text, w) for w in words)
-        
-        # Проверка на точное слово (_слово_)
-        if keyword.startswith('_') and keyword.endswith('_'):
-            word = keyword[1:-1].strip()
-            if not word:
-                return False
-            # Строгое слово без окончаний
-            return bool(re.search(rf"(?i)\b{re.escape(word)}\b", text))
-        
-        # Буквальная проверка по регексу
         if not keyword:
             return False
-        pattern = MessageFilter.build_keyword_pattern(keyword)
-        return bool(pattern.search(text))
+        normalized = ensure_normalized(text)
+        return MessageFilter.get_matcher([keyword]).first_match(normalized) is not None
     
     @staticmethod
-    def check_keywords(text: str, keywords: List[str]) -> bool:
+    def check_keywords(text: Union[str, NormalizedText], keywords: List[str],
+                       use_lemmas: bool = False) -> bool:
         """
         Проверить, содержит ли текст хотя бы одно ключевое слово.
         
         Args:
-            text: Текст для проверки
+            text: Текст для проверки (строка или NormalizedText)
             keywords: Список ключевых слов
+            use_lemmas: Сравнивать нормальные формы слов (pymorphy2)
             
         Returns:
             True если найдено хотя бы одно ключевое слово
@@ -166,20 +133,19 @@ class MessageFilter:
         if not keywords:
             return False
         
-        for keyword in keywords:
-            if MessageFilter.check_keyword(text, keyword):
-                return True
-        
-        return False
+        normalized = ensure_normalized(text)
+        return MessageFilter.get_matcher(keywords, use_lemmas).first_match(normalized) is not None
     
     @staticmethod
-    def check_stopwords(text: str, stopwords: List[str]) -> bool:
+    def check_stopwords(text: Union[str, NormalizedText], stopwords: List[str],
+                        use_lemmas: bool = False) -> bool:
         """
         Проверить, содержит ли текст стоп-слова.
         
         Args:
-            text: Текст для проверки
+            text: Текст для проверки (строка или NormalizedText)
             stopwords: Список стоп-слов
+            use_lemmas: Сравнивать нормальные формы слов (pymorphy2)
             
         Returns:
             True если найдено стоп-слово
@@ -187,11 +153,102 @@ class MessageFilter:
         if not stopwords:
             return False
         
-        for stopword in stopwords:
-            if MessageFilter.check_keyword(text, stopword):
-                return True
+        normalized = ensure_normalized(text)
+        return MessageFilter.get_matcher(stopwords, use_lemmas).first_match(normalized) is not None
+
+
+def drop_duplicates(text: str, normalized: NormalizedText,
+                    hits: Dict[int, List[str]]) -> Dict[int, List[str]]:
+    """Убрать профили, которым это сообщение уже приходило за последние 24 часа."""
+    return {
+        tid: rules for tid, rules in hits.items()
+        if not db.check_duplicate(text, hours=24, fingerprint=normalized.fingerprint, tenant_id=tid)
+    }
+
+
+def explain_text(text: str, sender_id: int, conf: Dict[str, str], rules: RuleSet) -> Dict:
+    """
+    Прогнать текст через те же шаги, что и сообщение в воркере, с разбором.
+    
+    Args:
+        text: Текст сообщения
+        sender_id: ID автора (0 — неизвестен)
+        conf: Текущий конфиг
+        rules: Снимок правил
+        
+    Returns:
+        Отчёт RuleSet.explain, дополненный шагами нормализации и проверки дублей
+        (normalized — нормализованный текст, duplicates — ID профилей с дублем)
+    """
+    started = time.perf_counter_ns()
+    normalized = ensure_normalized(text)
+    normalize_ns = time.perf_counter_ns() - started
+    
+    report = rules.explain(normalized, sender_id)
+    report['stages'].insert(0, ("Нормализация", normalize_ns))
+    report['normalized'] = normalized.text
+    report['duplicates'] = []
+    
+    if report['hits'] and conf.get('ignore_duplicates') == 'true':
+        started = time.perf_counter_ns()
+        hits = drop_duplicates(text, normalized, report['hits'])
+        report['stages'].append(("Дубли", time.perf_counter_ns() - started))
+        report['duplicates'] = [tid for tid in report['hits'] if tid not in hits]
+        report['hits'] = hits
+        if not hits:
+            report['reason'] = "Дубликат"
+    return report
+
+
+class SourceFilter:
+    """
+    Списки разрешённых и исключённых чатов (по peer id).
+    
+    Проверка выполняется в фильтре события Telethon (events.NewMessage(func=...)),
+    поэтому сообщения из исключённых чатов отбрасываются до вызова обработчика.
+    """
+    
+    # Как часто воркер проверяет, не изменились ли источники в боте
+    REFRESH_INTERVAL = 10
+    # Как часто повторять поиск чатов, которые не удалось найти
+    RETRY_INTERVAL = 300
+    
+    def __init__(self, include: Optional[Set[int]] = None, exclude: Optional[Set[int]] = None):
+        """
+        Args:
+            include: Разрешённые чаты (None — слушать все)
+            exclude: Исключённые чаты
+        """
+        self.include = include
+        self.exclude = exclude or set()
+    
+    def allows(self, chat_id: Optional[int]) -> bool:
+        """Проверить, нужно ли слушать чат."""
+        if chat_id in self.exclude:
+            return False
+        return self.include is None or chat_id in self.include
+    
+    @staticmethod
+    def parse_link(link: str) -> Union[int, str]:
+        """
+        Привести ссылку источника к виду, который понимает Telethon.
         
-        return False
+        Args:
+            link: @username, t.me/username, t.me/c/123/45 или ID чата
+            
+        Returns:
+            ID чата (int) или строка для get_input_entity
+        """
+        link = link.strip()
+        if link.lstrip('-').isdigit():
+            return int(link)
+        path = link.split('://', 1)[-1]
+        if path.startswith('t.me/c/'):
+            # Приватная ссылка: t.me/c/<id канала>/<id сообщения>
+            return int(f"-100{path.split('/')[2]}")
+        if path.startswith('t.me/') and not path.startswith('t.me/+'):
+            return path.split('/')[1]
+        return link
 
 
 class TelegramParser:
@@ -202,13 +259,65 @@ class TelegramParser:
         Args:
             session_name: имя файла сессии Telethon (без .session). Если None, берется из config/по умолчанию
         """
-        self.client: Optional[TelegramClient] = None
-        self.bot_client: Optional[TelegramClient] = None
+        init()
+        # Клиенты Telethon создаются в init_client
+        self.client = None
+        self.bot_client = None
         self.me = None
         self._session_name = session_name
+        # Скомпилированные правила и версия, по которой они построены
+        self._rules: Optional[RuleSet] = None
+        self._rules_key: Optional[tuple] = None
+        # Источники: фильтр чатов и версия, по которой он построен
+        self.sources = SourceFilter()
+        self._sources_version: Optional[str] = None
+        # Источники, чат которых не найден, и когда последний раз перечитывали список
+        self._unresolved_sources = 0
+        self._sources_refreshed = 0.0
+        self._sources_task: Optional[asyncio.Task] = None
+        # Отправка уведомлений идёт в фоне, с ограничением скорости по чатам
+        self.dispatcher = NotificationDispatcher(self._send_notification)
+        # Очередь уведомлений в базе: имя воркера, уведомления в отправке, пробуждение
+        self.worker_name = session_name or 'parser_session'
+        self._in_flight: Set[int] = set()
+        self._outbox_wakeup = asyncio.Event()
+        self._outbox_task: Optional[asyncio.Task] = None
+        # Повторы одного объявления в разных чатах склеиваются в одно уведомление
+        self.crossposts = CrossPostAggregator(self._send_crosspost_followup)
+        # Части альбома (общий grouped_id) обрабатываются одним сообщением
+        self.albums = AlbumCollector(self._handle_album)
+        # Приёмники лидов (Telegram, webhook, журнал JSONL) — у каждого своя очередь
+        self.sinks = build_sinks(self._enqueue_telegram, self.worker_name)
+        # Счётчики воркера: периодически сохраняются в базу (видны в API)
+        self.counters: Counter = Counter()
+        self.started_at = time.time()
+        # Почасовые счётчики: (час, чат) → [просмотрено, отклонено], (час, профиль, слово) → срабатывания
+        self._traffic: Dict[Tuple[str, int], List[int]] = {}
+        self._keyword_hits: Counter = Counter()
+        # Статистика правил: (профиль, слово) → [срабатывания, лиды, замеры, время замеров нс]
+        self._rule_stats: Dict[Tuple[int, str], List[int]] = {}
+        self._profile_countdown = config.RULE_PROFILE_SAMPLE
+        # Длительность этапов обработки (гистограммы сохраняются вместе со счётчиками)
+        self.metrics = Metrics()
+        # Задержка цикла событий и шаги, которые его блокируют
+        self.loop_monitor = LoopMonitor(self.metrics)
+        # Профилирование по запросу из бота (/profile)
+        self._profile_task: Optional[asyncio.Task] = None
+        self._stats_task: Optional[asyncio.Task] = None
+        # Последние обработанные сообщения чатов и догрузка пропущенного после простоя
+        self.watermarks = Watermarks()
+        self._catchup_task: Optional[asyncio.Task] = None
+        # Чаты и авторы (сохраняются между перезапусками, обновляются в фоне после запуска)
+        self.entities = EntityCache(
+            os.path.join(config.ENTITY_CACHE_DIR, f"{os.path.basename(self.worker_name)}.json")
+        )
+        self._warmup_task: Optional[asyncio.Task] = None
     
     async def init_client(self):
         """Инициализировать Telegram клиент."""
+        from telethon import TelegramClient
+        from telethon.sessions import StringSession
+        
         try:
             # Основной клиент для парсинга (user-mode)
             if config.SESSION_STRING:
@@ -260,6 +369,55 @@ class TelegramParser:
             logger.error(f"Ошибка при инициализации клиента: {e}")
             raise
     
+    async def refresh_sources(self):
+        """Перечитать источники из БД, разрешив новые ссылки в peer id (один раз на ссылку)."""
+        include: Set[int] = set()
+        exclude: Set[int] = set()
+        unresolved = 0
+        for source in db.get_sources():
+            if source.get('status') != 'active':
+                continue
+            peer_id = source.get('peer_id')
+            if peer_id is None:
+                try:
+                    peer_id = await self.client.get_peer_id(SourceFilter.parse_link(source['link']))
+                    db.set_source_peer(source['id'], peer_id)
+                except Exception as e:
+                    unresolved += 1
+                    db.set_source_error(source['id'], str(e) or type(e).__name__)
+                    logger.warning(f"Не удалось найти источник {source['link']}: {e}")
+                    continue
+            if source.get('mode') == 'exclude':
+                exclude.add(peer_id)
+            else:
+                include.add(peer_id)
+        # Если найден хоть один разрешённый источник — слушаем только разрешённые.
+        # Ненайденные (ссылка-приглашение, опечатка, аккаунт не в чате) не учитываются:
+        # иначе пустой список разрешённых молча отсекал бы все чаты
+        self.sources = SourceFilter(include or None, exclude)
+        self._unresolved_sources = unresolved
+        self._sources_refreshed = time.monotonic()
+        logger.info(f"Источники обновлены: разрешено {len(include) or 'все'}, "
+                    f"исключено {len(exclude)}, не найдено {unresolved}")
+    
+    async def watch_sources(self):
+        """Фоновая задача: применять изменения источников из бота без перезапуска."""
+        while True:
+            try:
+                version = db.get_config('sources_version')
+                retry = (self._unresolved_sources and
+                         time.monotonic() - self._sources_refreshed >= SourceFilter.RETRY_INTERVAL)
+                if version != self._sources_version or retry:
+                    self._sources_version = version
+                    await self.refresh_sources()
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении источников: {e}")
+            await asyncio.sleep(SourceFilter.REFRESH_INTERVAL)
+    
+    def accepts_chat(self, event) -> bool:
+        """Фильтр события Telethon: отбросить сообщения из неразрешённых чатов."""
+        return self.sources.allows(event.chat_id)
+    
     async def should_process_message(self, event) -> bool:
         """
         Проверить, нужно ли обрабатывать сообщение.
@@ -277,190 +435,491 @@ class TelegramParser:
         if conf.get('working_status') != 'true':
             return False
         
+        self.dispatcher.digest_enabled = conf.get('digest_enabled') == 'true'
+        
         # Проверка на бота
-        sender = await event.get_sender()
-        if sender and getattr(sender, 'bot', False):
+        sender = await self.entities.sender(event)
+        if sender and sender.bot:
             logger.debug("Пропуск сообщения от бота")
             return False
         
         # Проверка типа чата
-        chat = await event.get_chat()
+        chat = await self.entities.chat(event)
+        kind = chat.kind if chat else None
         
-        if isinstance(chat, Channel):
+        if kind == 'channel':
             # Канал
-            if chat.broadcast:
-                if conf.get('channels_enabled') != 'true':
-                    return False
-            # Супергруппа
-            else:
-                if conf.get('groups_enabled') != 'true':
-                    return False
-        elif isinstance(chat, Chat):
-            # Обычная группа
+            if conf.get('channels_enabled') != 'true':
+                return False
+        elif kind in ('megagroup', 'chat'):
+            # Супергруппа или обычная группа
             if conf.get('groups_enabled') != 'true':
                 return False
-        elif isinstance(chat, User):
+        elif kind in ('user', 'bot'):
             # Личный диалог
             if conf.get('dialogs_enabled') != 'true':
                 return False
         
         return True
     
-    async def filter_message(self, text: str, sender_id: int) -> tuple[bool, str]:
+    def get_rules(self, conf: Dict[str, str]) -> RuleSet:
+        """
+        Получить снимок правил, перечитав его из БД только после изменений в боте.
+        
+        Args:
+            conf: Текущий конфиг (rules_version увеличивается при каждом изменении правил)
+            
+        Returns:
+            RuleSet
+        """
+        key = (conf.get('rules_version'), conf.get('morphology_enabled'))
+        if self._rules is None or key != self._rules_key:
+            self._rules = RuleSet(db.get_rules_snapshot(), conf.get('morphology_enabled') == 'true')
+            self._rules_key = key
+            logger.info(f"Правила загружены: профилей {len(self._rules.tenants)}, "
+                        f"ключевых слов {len(self._rules.keywords.rules)}, "
+                        f"стоп-слов {len(self._rules.stopwords.rules)}")
+        return self._rules
+    
+    async def filter_message(self, text: str, sender_id: int,
+                             normalized: Optional[NormalizedText] = None) -> Tuple[Dict[int, List[str]], str]:
         """
-        Фильтровать сообщение по ключевым словам и правилам.
+        Фильтровать сообщение по ключевым словам и правилам всех профилей.
         
         Args:
             text: Текст сообщения
             sender_id: ID отправителя
+            normalized: Нормализованный текст (если уже посчитан для сообщения)
             
         Returns:
-            Tuple (should_forward, reason)
+            Tuple (ID профиля, которому нужно отправить лид → сработавшие ключевые слова, reason)
         """
         if not text:
-            return False, "Пустое сообщение"
+            return {}, "Пустое сообщение"
         
-        # Проверка черного списка
-        if db.is_blacklisted(sender_id):
-            logger.debug(f"Отправитель {sender_id} в черном списке")
-            return False, "Отправитель в черном списке"
+        if normalized is None:
+            normalized = ensure_normalized(text)
         
-        # Получаем ключевые слова и стоп-слова
-        keywords = db.get_keywords()
-        stopwords = db.get_stopwords()
+        started = time.perf_counter()
+        conf = db.get_all_config()
+        rules = self.get_rules(conf)
+        self.metrics.observe('config', time.perf_counter() - started)
         
-        # Проверка ключевых слов
-        if not MessageFilter.check_keywords(text, keywords):
-            logger.debug("Ключевые слова не найдены")
-            return False, "Ключевые слова не найдены"
+        # Время проверки правил замеряется на каждом N-м сообщении
+        timings: Optional[Dict[str, int]] = None
+        self._profile_countdown -= 1
+        if config.RULE_PROFILE_SAMPLE > 0 and self._profile_countdown <= 0:
+            self._profile_countdown = config.RULE_PROFILE_SAMPLE
+            timings = {}
         
-        # Проверка стоп-слов
-        if MessageFilter.check_stopwords(text, stopwords):
-            logger.debug("Найдены стоп-слова")
-            return False, "Найдены стоп-слова"
+        started = time.perf_counter()
+        hits, reason = rules.match(normalized, sender_id, timings)
+        self.metrics.observe('rules', time.perf_counter() - started)
+        if timings:
+            for rule, ns in timings.items():
+                for tid in rules.keyword_owners(rule):
+                    stat = self._rule_stats.setdefault((tid, rule), [0, 0, 0, 0])
+                    stat[2] += 1
+                    stat[3] += ns
+        for tid, matched in hits.items():
+            for rule in matched:
+                self._rule_stats.setdefault((tid, rule), [0, 0, 0, 0])[0] += 1
+        if not hits:
+            logger.debug(reason)
+            return {}, reason
         
-        # Проверка дубликатов
-        conf = db.get_all_config()
+        # Проверка дубликатов (отдельно для каждого профиля)
         if conf.get('ignore_duplicates') == 'true':
-            if db.check_duplicate(text, hours=24):
+            started = time.perf_counter()
+            hits = drop_duplicates(text, normalized, hits)
+            self.metrics.observe('dedupe', time.perf_counter() - started)
+            if not hits:
                 logger.debug("Дубликат сообщения")
-                return False, "Дубликат"
+                return {}, "Дубликат"
+        
+        hour = db.current_hour()
+        for tid, matched in hits.items():
+            for rule in matched:
+                self._keyword_hits[(hour, tid, rule)] += 1
+                self._rule_stats[(tid, rule)][1] += 1
         
-        return True, "Прошел фильтры"
+        return hits, "Прошел фильтры"
+    
+    @staticmethod
+    def _message_link(chat, chat_id: int, message_id: int) -> str:
+        """Создать ссылку на сообщение."""
+        if hasattr(chat, 'username') and chat.username:
+            return f"https://t.me/{chat.username}/{message_id}"
+        # Для приватных чатов/групп
+        return f"https://t.me/c/{str(chat_id)[4:]}/{message_id}"
     
-    async def send_lead_notification(self, event, reason: str = ""):
+    async def _send_notification(self, chat_id: int, text: str):
+        """Отправить текст уведомления (через бота, если он подключён)."""
+        client = self.bot_client or self.client
+        started = time.perf_counter()
+        try:
+            await client.send_message(chat_id, text, parse_mode='html', link_preview=False)
+        finally:
+            self.metrics.observe('send', time.perf_counter() - started)
+    
+    async def send_lead_notification(self, event, hits: Dict[int, List[str]], reason: str = ""):
         """
-        Отправить уведомление о новом лиде.
+        Передать лид во все приёмники (очередь уведомлений, webhook, журнал).
         
         Args:
             event: Событие сообщения
+            hits: ID профиля, правила которого сработали → сработавшие ключевые слова
             reason: Причина выбора (опционально)
         """
         try:
-            conf = db.get_all_config()
-            notification_chat_id = conf.get('notification_chat_id', '')
-            
-            if not notification_chat_id:
-                logger.warning("ID чата для уведомлений не установлен")
-                return
-            
             # Получаем информацию о сообщении
-            sender = await event.get_sender()
-            chat = await event.get_chat()
+            sender = await self.entities.sender(event)
+            chat = await self.entities.chat(event)
             
-            sender_id = sender.id if sender else 0
-            chat_title = getattr(chat, 'title', getattr(chat, 'first_name', 'Неизвестно'))
             chat_id = event.chat_id
             message_id = event.message.id
-            text = event.message.text or "[медиа]"
-            safe_text = html.escape(text)
-            
-            # Создаем ссылку на сообщение
-            if hasattr(chat, 'username') and chat.username:
-                message_link = f"https://t.me/{chat.username}/{message_id}"
-            else:
-                # Для приватных чатов/групп
-                message_link = f"https://t.me/c/{str(chat_id)[4:]}/{message_id}"
-            
-            # Формируем текст уведомления
-            notification_text = (
-                "🔥 <b>Новое сообщение</b>\n\n"
-                f"ID пользователя: <code>{sender_id}</code>\n"
-                f"Сообщение переслано из чата: <b>{chat_title}</b>\n"
-                f"ID чата: <code>{chat_id}</code>\n"
-                f"<a href=\"{message_link}\">Ссылка на сообщение</a>\n\n"
-                "<b>Текст сообщения</b>\n"
-                f"{safe_text}"
-            )
-            
-            # Отправляем уведомление
-            notification_chat_id_int = int(notification_chat_id)
-            
-            # Отправляем текст уведомления
-            if self.bot_client:
-                await self.bot_client.send_message(
-                    notification_chat_id_int,
-                    notification_text,
-                    parse_mode='html',
-                    link_preview=False
-                )
-            else:
-                await self.client.send_message(
-                    notification_chat_id_int,
-                    notification_text,
-                    parse_mode='html',
-                    link_preview=False
+            lead = {
+                'tenant_ids': list(hits),
+                'keywords': {tid: list(rules) for tid, rules in hits.items()},
+                'chat_id': chat_id,
+                'chat_title': chat.title if chat else 'Неизвестно',
+                'message_id': message_id,
+                'message_link': self._message_link(chat, chat_id, message_id),
+                'sender_id': sender.id if sender else 0,
+                'text': event.message.text or "[медиа]",
+                'fingerprint': normalize_message(event.message).fingerprint,
+                'reason': reason,
+                'date': event.message.date.isoformat() if getattr(event.message, 'date', None) else None,
+                'worker': self.worker_name,
+            }
+        except Exception as e:
+            logger.error("Ошибка при отправке уведомления: %s", e)
+            return
+        
+        for sink in self.sinks:
+            try:
+                sink.submit(lead)
+            except Exception as e:
+                logger.error("Ошибка приёмника %s: %s", sink.name, e)
+    
+    def _enqueue_telegram(self, lead: Dict):
+        """Записать лид в очередь уведомлений для чатов профилей."""
+        rules = self._rules
+        
+        # Формируем текст уведомления
+        notification_text = (
+            "🔥 <b>Новое сообщение</b>\n\n"
+            f"ID пользователя: <code>{lead['sender_id']}</code>\n"
+            f"Сообщение переслано из чата: <b>{lead['chat_title']}</b>\n"
+            f"ID чата: <code>{lead['chat_id']}</code>\n"
+            f"<a href=\"{lead['message_link']}\">Ссылка на сообщение</a>\n\n"
+            "<b>Текст сообщения</b>\n"
+            f"{html.escape(lead['text'])}"
+        )
+        
+        for tenant_id in lead['tenant_ids']:
+            try:
+                tenant = rules.tenants.get(tenant_id) if rules else db.get_tenant(tenant_id)
+                notification_chat_id = (tenant or {}).get('notification_chat_id') or ''
+                
+                if not notification_chat_id:
+                    logger.warning("ID чата для уведомлений не установлен (профиль %s)", tenant_id)
+                    continue
+                
+                # Сначала лид сохраняется в базе, отправляет его фоновая задача
+                db.enqueue_notification(
+                    tenant_id=tenant_id,
+                    chat_id=lead['chat_id'],
+                    message_id=lead['message_id'],
+                    notification_chat_id=int(notification_chat_id),
+                    notification_text=notification_text,
+                    source_chat=lead['chat_title'],
+                    text=lead['text'],
+                    user_id=lead['sender_id'],
+                    fingerprint=lead['fingerprint'],
+                    keywords=lead.get('keywords', {}).get(tenant_id, [])
                 )
-            
-            # Пересылка оригинального сообщения убрана, все сведения собраны в одном тексте
-            
-            # Сохраняем в историю
-            db.add_log(
-                source_chat=chat_title,
-                message_id=message_id,
-                text=text,
-                user_id=sender_id,
-                chat_id=chat_id
+                
+            except Exception as e:
+                logger.error("Ошибка при отправке уведомления (профиль %s): %s", tenant_id, e)
+        
+        self._outbox_wakeup.set()
+    
+    async def _send_crosspost_followup(self, entry: CrossPost):
+        """Поставить в очередь уведомление со списком чатов, куда повторно отправлено объявление."""
+        rules = self._rules
+        # Только чаты, появившиеся после прошлого уведомления
+        new_chats = entry.chats[entry.notified:]
+        if not new_chats:
+            return
+        entry.notified = len(entry.chats)
+        # Список чатов ограничен, чтобы уложиться в длину сообщения Telegram
+        shown = new_chats[:50]
+        lines = [f"• <a href=\"{link}\">{html.escape(title)}</a>" for title, link in shown]
+        if len(new_chats) > len(shown):
+            lines.append(f"… и ещё {len(new_chats) - len(shown)}")
+        text = (
+            f"🔁 <b>Тот же лид в новых чатах: {len(new_chats)}</b> (всего {len(entry.chats)})\n\n"
+            f"ID пользователя: <code>{entry.sender_id}</code>\n\n"
+            + "\n".join(lines)
+        )
+        last_title = entry.chats[-1][0]
+        for tenant_id in entry.tenant_ids:
+            tenant = rules.tenants.get(tenant_id) if rules else db.get_tenant(tenant_id)
+            notification_chat_id = (tenant or {}).get('notification_chat_id') or ''
+            if not notification_chat_id:
+                continue
+            db.enqueue_notification(
+                tenant_id=tenant_id,
+                chat_id=entry.last_chat_id,
+                message_id=entry.last_message_id,
+                notification_chat_id=int(notification_chat_id),
+                notification_text=text,
+                source_chat=last_title,
+                text=f"[кросс-пост: {len(entry.chats)} чатов]",
+                user_id=entry.sender_id,
+                fingerprint=entry.fingerprint,
+                kind=NOTIFICATION_CROSSPOST
             )
-            
-            logger.info(f"Лид отправлен: {chat_title} - {sender_id}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления: {e}")
+        self._outbox_wakeup.set()
+        logger.info("Кросс-пост от %s: %s чатов", entry.sender_id, len(entry.chats))
+    
+    async def deliver_outbox(self):
+        """Фоновая доставка очереди уведомлений из базы (в том числе после перезапуска)."""
+        released = db.release_notifications(self.worker_name)
+        if released:
+            logger.info(f"Возвращено в очередь неподтверждённых уведомлений: {released}")
+        last_purge = 0.0
+        while True:
+            try:
+                # Аренду ждущих у диспетчера продлеваем, новые забираем только до лимита:
+                # иначе при всплеске аренда истечёт и уведомления уйдут повторно
+                if self._in_flight:
+                    db.renew_notifications(self.worker_name, list(self._in_flight))
+                free = config.OUTBOX_MAX_IN_FLIGHT - len(self._in_flight)
+                rows = db.claim_notifications(
+                    self.worker_name, limit=min(50, free), lease=config.OUTBOX_LEASE_SECONDS
+                ) if free > 0 else []
+                for row in rows:
+                    if row['id'] in self._in_flight:
+                        continue
+                    self._in_flight.add(row['id'])
+                    self.dispatcher.submit(
+                        row['notification_chat_id'],
+                        row['notification_text'],
+                        on_sent=functools.partial(self._on_notification_sent, row),
+                        on_failed=functools.partial(self._on_notification_failed, row)
+                    )
+                if time.monotonic() - last_purge > 3600:
+                    db.purge_sent_notifications()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                logger.error(f"Ошибка очереди уведомлений: {e}")
+            try:
+                await asyncio.wait_for(self._outbox_wakeup.wait(), config.OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._outbox_wakeup.clear()
+    
+    def _on_notification_sent(self, row: Dict):
+        """Подтвердить отправку и записать лид в историю."""
+        self._in_flight.discard(row['id'])
+        self.counters['sent'] += 1
+        if not db.complete_notification(row['id'], self.worker_name):
+            logger.warning("Уведомление %s отправлено после истечения аренды", row['id'])
+            return
+        logger.info("Лид отправлен: %s - %s (профиль %s)", row['source_chat'], row['user_id'], row['tenant_id'])
+    
+    def _on_notification_failed(self, row: Dict, error: str):
+        """Вернуть уведомление в очередь с задержкой или пометить ошибочным."""
+        self._in_flight.discard(row['id'])
+        self.counters['send_errors'] += 1
+        if not db.fail_notification(row['id'], error, config.OUTBOX_MAX_ATTEMPTS, self.worker_name):
+            logger.error("Уведомление %s не доставлено после %s попыток", row['id'], config.OUTBOX_MAX_ATTEMPTS)
     
     async def handle_new_message(self, event):
         """
         Обработать новое сообщение.
         
+        Записи лога во время обработки помечаются идентификатором chat_id:message_id.
+        Части альбома откладываются и обрабатываются вместе (_handle_album).
+        
         Args:
             event: Событие нового сообщения
         """
+        if self.albums.add(event):
+            return
+        with correlation(f"{event.chat_id}:{event.message.id}"):
+            await self._handle_message(event)
+    
+    async def _handle_album(self, event):
+        """Обработать альбом одним сообщением с объединённой подписью."""
+        self.counters['album_parts'] += len(event.message.parts)
+        with correlation(f"{event.chat_id}:{event.message.id}"):
+            await self._handle_message(event)
+    
+    async def _handle_message(self, event):
+        """Проверить сообщение фильтрами и правилами и передать лид в приёмники."""
+        self.counters['messages'] += 1
+        traffic = self._traffic.setdefault((db.current_hour(), event.chat_id or 0), [0, 0])
+        traffic[0] += 1
+        observe = self.metrics.observe
+        received = time.perf_counter()
         try:
             # Проверяем, нужно ли обрабатывать
-            if not await self.should_process_message(event):
+            processed = await self.should_process_message(event)
+            observe('prefilter', time.perf_counter() - received)
+            if not processed:
+                self.counters['skipped'] += 1
                 return
             
             # Получаем текст и отправителя
             text = event.message.text
             if not text:
+                self.counters['skipped'] += 1
                 return
             
-            sender = await event.get_sender()
+            started = time.perf_counter()
+            sender = await self.entities.sender(event)
             sender_id = sender.id if sender else 0
+            chat = await self.entities.chat(event)
+            chat_title = chat.title if chat else 'Неизвестно'
+            message_link = self._message_link(chat, event.chat_id, event.message.id)
+            observe('entities', time.perf_counter() - started)
+            
+            # Нормализуем текст один раз (кэшируется на объекте сообщения)
+            started = time.perf_counter()
+            normalized = normalize_message(event.message, text)
+            observe('normalize', time.perf_counter() - started)
+            
+            # Повтор недавно отправленного лида в другом чате — только дописываем чат
+            if self.crossposts.fold(sender_id, normalized.fingerprint, event.chat_id,
+                                    event.message.id, chat_title, message_link):
+                logger.debug("Кросс-пост в %s склеен с отправленным лидом", chat_title)
+                self.counters['crossposts'] += 1
+                return
             
             # Фильтруем сообщение
-            should_forward, reason = await self.filter_message(text, sender_id)
+            hits, reason = await self.filter_message(text, sender_id, normalized)
             
-            if should_forward:
-                chat = await event.get_chat()
-                chat_title = getattr(chat, 'title', getattr(chat, 'first_name', 'Неизвестно'))
-                logger.info(f"Найден лид в {chat_title}: {text[:50]}...")
+            if not hits:
+                self.counters['rejected'] += 1
+                self.counters[f'rejected:{reason}'] += 1
+                traffic[1] += 1
+            else:
+                self.counters['leads'] += 1
+                logger.info("Найден лид в %s: %.50s...", chat_title, text)
+                
+                # Запоминаем до отправки, чтобы склеить повторы, пришедшие во время неё
+                self.crossposts.remember(sender_id, normalized.fingerprint, list(hits),
+                                         chat_title, message_link)
                 
                 # Отправляем уведомление
-                await self.send_lead_notification(event, reason)
+                started = time.perf_counter()
+                await self.send_lead_notification(event, hits, reason)
+                observe('enqueue', time.perf_counter() - started)
             
         except Exception as e:
-            logger.error(f"Ошибка при обработке сообщения: {e}")
+            self.counters['errors'] += 1
+            logger.error("Ошибка при обработке сообщения: %s", e)
+        finally:
+            observe('total', time.perf_counter() - received)
+    
+    async def warm_up_entities(self):
+        """Обновить кэш сущностей: диалоги аккаунта и участники чатов с лидами."""
+        started = time.monotonic()
+        try:
+            leads = db.get_chat_lead_counts()
+            top = sorted(leads, key=leads.get, reverse=True)[:config.ENTITY_WARMUP_CHATS]
+            count = await self.entities.warm_up(self.client, top)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки сущностей: {e}")
+            return
+        logger.info(f"Кэш сущностей обновлён: {count} за {time.monotonic() - started:.1f} с")
+    
+    async def catch_up(self):
+        """Догрузить сообщения, пропущенные за время простоя (в фоне, новые сообщения не ждут)."""
+        chats = [chat_id for chat_id in self.watermarks.marks if self.sources.allows(chat_id)]
+        if not chats or not config.CATCHUP_MAX_MESSAGES:
+            return
+        # Чаты без сохранённой сущности находятся только после загрузки диалогов
+        if self._warmup_task and any(self.entities.input_peer(chat_id) is None for chat_id in chats):
+            await asyncio.shield(self._warmup_task)
+        # Сначала чаты, откуда за неделю пришло больше лидов
+        leads = db.get_chat_lead_counts()
+        chats.sort(key=lambda chat_id: leads.get(chat_id, 0), reverse=True)
+        logger.info(f"Догрузка пропущенного: чатов {len(chats)}")
+        started = time.monotonic()
+        try:
+            count = await CatchUp(self.client, self.watermarks, self.handle_new_message,
+                                  input_peer=self.entities.input_peer).run(chats)
+        except Exception as e:
+            logger.error(f"Ошибка догрузки пропущенного: {e}")
+            return
+        self.counters['catchup'] += count
+        logger.info(f"Догрузка завершена: {count} сообщений за {time.monotonic() - started:.0f} с")
+    
+    async def flush_stats(self):
+        """Периодически сохранять счётчики воркера и почасовую статистику в базу."""
+        last_entities_save = time.monotonic()
+        while True:
+            await asyncio.sleep(config.STATS_FLUSH_INTERVAL)
+            self.save_stats()
+            self.check_profile_requests()
+            if time.monotonic() - last_entities_save >= config.ENTITY_CACHE_SAVE_INTERVAL:
+                last_entities_save = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.entities.save)
+                except Exception as e:
+                    logger.error(f"Ошибка сохранения кэша сущностей: {e}")
+    
+    def check_profile_requests(self):
+        """Начать профилирование, если бот его запросил (не больше одного одновременно)."""
+        if self._profile_task and not self._profile_task.done():
+            return
+        try:
+            request = db.claim_profile_request(self.worker_name)
+        except Exception as e:
+            logger.error(f"Ошибка чтения запросов профилирования: {e}")
+            return
+        if request:
+            self._profile_task = asyncio.create_task(self.run_profile(request))
+    
+    async def run_profile(self, request: Dict):
+        """Снять профиль по запросу и записать отчёт в базу (бот отправит его документом)."""
+        try:
+            report = await profiler.capture(request['kind'], request['seconds'], self.worker_name)
+        except asyncio.CancelledError:
+            db.finish_profile_request(request['id'], error="Воркер остановлен")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка профилирования: {e}")
+            db.finish_profile_request(request['id'], error=str(e))
+            return
+        db.finish_profile_request(request['id'], result=report)
+        logger.info(f"Профиль ({request['kind']}) снят и передан боту")
+    
+    def save_stats(self):
+        """Сохранить счётчики воркера и прибавить накопленное к почасовой статистике."""
+        traffic, self._traffic = self._traffic, {}
+        keyword_hits, self._keyword_hits = self._keyword_hits, Counter()
+        rule_stats, self._rule_stats = self._rule_stats, {}
+        try:
+            self.counters['flood_waits'] = self.dispatcher.flood_waits
+            self.counters['slow_callbacks'] = self.loop_monitor.slow_callbacks
+            self.counters['entity_hits'] = self.entities.hits
+            self.counters['entity_misses'] = self.entities.misses
+            self.counters['log_dropped'] = dropped_records()
+            db.save_worker_stats(self.worker_name, self.started_at, dict(self.counters),
+                                 self.metrics.to_dict())
+            db.add_hourly_counters(
+                {key: tuple(value) for key, value in traffic.items()},
+                dict(keyword_hits)
+            )
+            db.add_keyword_stats({key: tuple(value) for key, value in rule_stats.items()})
+            db.save_watermarks(self.worker_name, self.watermarks.take_dirty())
+        except Exception as e:
+            logger.error(f"Ошибка сохранения счётчиков: {e}")
     
     async def start(self):
         """Запустить парсер."""
@@ -469,13 +928,42 @@ class TelegramParser:
         # Инициализируем клиент
         await self.init_client()
         
-        # Регистрируем обработчик новых сообщений
-        @self.client.on(events.NewMessage)
+        # Сущности с прошлого запуска: первые сообщения чатов обходятся без запросов
+        loaded = self.entities.load()
+        if loaded:
+            logger.info(f"Кэш сущностей загружен: {loaded}")
+        
+        # Морфологический анализатор грузим заранее, а не на первом сообщении
+        if db.get_config('morphology_enabled') == 'true':
+            morphology.get_analyzer()
+        
+        # Источники читаем до регистрации обработчика, дальше следим за изменениями
+        self._sources_version = db.get_config('sources_version')
+        await self.refresh_sources()
+        self._sources_task = asyncio.create_task(self.watch_sources())
+        self.watermarks = Watermarks(db.get_watermarks(self.worker_name))
+        
+        # Доставка уведомлений, включая оставшиеся с прошлого запуска
+        self._outbox_task = asyncio.create_task(self.deliver_outbox())
+        for sink in self.sinks:
+            await sink.start()
+        self._stats_task = asyncio.create_task(self.flush_stats())
+        self.loop_monitor.start()
+        
+        # Регистрируем обработчик новых сообщений (чаты фильтруются ещё в Telethon)
+        from telethon import events
+        
+        @self.client.on(events.NewMessage(func=self.accepts_chat))
         async def message_handler(event):
-            await self.handle_new_message(event)
+            if self.watermarks.live(event.chat_id, event.message.id):
+                await self.handle_new_message(event)
         
         logger.info("Парсер запущен и слушает сообщения")
         
+        # Пропущенное за время простоя догружается после регистрации обработчика
+        self._warmup_task = asyncio.create_task(self.warm_up_entities())
+        self._catchup_task = asyncio.create_task(self.catch_up())
+        
         # Запускаем клиент
         await self.client.run_until_disconnected()
     
@@ -483,6 +971,24 @@ class TelegramParser:
         """Остановить парсер."""
         logger.info("Остановка парсера...")
         
+        for task in (self._sources_task, self._outbox_task, self._stats_task, self._profile_task,
+                     self._catchup_task, self._warmup_task):
+            if task:
+                task.cancel()
+        await self.loop_monitor.stop()
+        # Накопленные альбомы обрабатываются до остановки диспетчера
+        await self.albums.stop()
+        await self.dispatcher.stop()
+        for sink in self.sinks:
+            await sink.stop()
+        self.save_stats()
+        try:
+            self.entities.save()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша сущностей: {e}")
+        # Неотправленное вернётся в очередь при следующем запуске
+        db.release_notifications(self.worker_name)
+        
         if self.client:
             await self.client.disconnect()
         
@@ -511,6 +1017,7 @@ async def main(session_name: str | None = None):
 if __name__ == "__main__":
     try:
         sess = os.environ.get("ACC_SESSION_NAME")
+        setup_logging(sess or "worker")
         asyncio.run(main(sess))
     except KeyboardInterrupt:
         logger.info("Парсер остановлен пользователем")